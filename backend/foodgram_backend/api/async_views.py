@@ -0,0 +1,411 @@
+"""
+Асинхронные представления только для чтения. Отдают те же данные,
+что и синхронные маршруты, и подключаются под префиксом /api/async/.
+
+Представления работают через асинхронный ORM и не занимают поток
+на время ожидания БД, поэтому под ASGI-сервером один воркер
+обслуживает много одновременных медленных запросов. Обходятся без
+APIView: в Django 4.1 DRF синхронен и под ASGI выполнялся бы в общем
+потоке sync_to_async. Связи, которые в синхронных представлениях
+загружает prefetch_related, здесь загружаются отдельными
+асинхронными запросами. Сырые запросы (RawQuerySet) и валидация
+фильтров не имеют асинхронного API и выполняются в sync_to_async.
+"""
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import exceptions, status
+from rest_framework.pagination import (
+    LimitOffsetPagination,
+    PageNumberPagination,
+)
+from rest_framework.permissions import (
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import CachedTokenAuthentication
+from .cache import (
+    BASE_INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    aget_version,
+    get_version_timestamp,
+)
+from .filter import BaseIngredientFilter, RecipeFilter
+from .membership import RecipeMembership
+from .metrics import measure_serialization
+from .permissions import IsAdminOrReadOnlyPermission, IsNotBanPermission
+from .recipe_cache import (
+    acache_recipe_detail,
+    add_user_fields,
+    aget_cached_recipe_detail,
+    aget_recipe_detail_key,
+    ais_subscribed,
+)
+from .replicas import read_from_primary
+from .serializers import (
+    RECIPES_LIMIT_DEFAULT,
+    AuthorSubscriptionSerializer,
+    BaseIngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from .validators import validate_recipes_limit
+from .views import GetAuthorSubscriptionViewSet
+from recipes.models import BaseIngredient, Ingredient, Recipe, Tag
+from users.models import Subscription
+
+SAFE_METHODS = ("GET", "HEAD")
+PAGE_QUERY_PARAM = "page"
+
+authentication = CachedTokenAuthentication()
+renderer = JSONRenderer()
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    with measure_serialization():
+        content = renderer.render(data)
+    return HttpResponse(
+        content, status=status_code, content_type=renderer.media_type
+    )
+
+
+def render_exception(error):
+    """
+    Формирует ответ на исключение DRF так же,
+    как стандартный exception_handler.
+    """
+    if isinstance(error.detail, (list, dict)):
+        data = error.detail
+    else:
+        data = {"detail": error.detail}
+    response = render(data, error.status_code)
+    if isinstance(
+        error, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+    ):
+        response["WWW-Authenticate"] = authentication.authenticate_header(None)
+    return response
+
+
+def check_permissions(request, permission_classes):
+    for permission_class in permission_classes:
+        permission = permission_class()
+        if not permission.has_permission(request, None):
+            if request.user.is_anonymous:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(
+                getattr(permission, "message", None)
+            )
+
+
+async def versioned_response(version_key, view, request, *args, **kwargs):
+    """
+    Отдает справочник с ETag и Last-Modified по версии данных
+    и хранит сериализованные данные в кэше "reference",
+    как VersionedReadOnlyModelViewSet.
+    """
+    version = await aget_version(version_key)
+    etag = quote_etag(version)
+    last_modified = get_version_timestamp(version)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        reference_cache = caches["reference"]
+        key = f"{version_key}:{version}:{request.get_full_path()}"
+        data = await reference_cache.aget(key)
+        if data is None:
+            with read_from_primary():
+                data = await view(request, *args, **kwargs)
+            await reference_cache.aset(key, data)
+        response = render(data)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def api_view(permission_classes, version_key=None):
+    """
+    Оборачивает асинхронное представление, которое возвращает данные
+    ответа: проверяет метод, аутентифицирует пользователя по токену,
+    проверяет права классами разрешений DRF и отдает JSON или ошибку
+    в формате DRF. С version_key ответ кэшируется по версии данных.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # Как у rest_framework.request.Request: его читают
+            # пагинаторы и сериализаторы.
+            request.query_params = request.GET
+            try:
+                if request.method not in SAFE_METHODS:
+                    raise exceptions.MethodNotAllowed(request.method)
+                credentials = await authentication.aauthenticate(request)
+                request.user = (
+                    credentials[0] if credentials else AnonymousUser()
+                )
+                check_permissions(request, permission_classes)
+                if version_key is not None:
+                    return await versioned_response(
+                        version_key, view, request, *args, **kwargs
+                    )
+                return render(await view(request, *args, **kwargs))
+            except Http404:
+                return render_exception(exceptions.NotFound())
+            except exceptions.APIException as error:
+                response = render_exception(error)
+                if isinstance(error, exceptions.MethodNotAllowed):
+                    response["Allow"] = ", ".join(SAFE_METHODS)
+                return response
+        return wrapper
+    return decorator
+
+
+def filter_queryset(filterset):
+    if not filterset.is_valid():
+        raise exceptions.ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Кладет загруженные объекты в кэш связи так же, как это делает
+    prefetch_related, чтобы сериализаторы читали связь без запросов.
+    """
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    if not hasattr(instance, "_prefetched_objects_cache"):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+async def load_recipe_relations(recipes):
+    """
+    Загружает теги и ингредиенты рецептов двумя запросами.
+    """
+    recipe_ids = [recipe.pk for recipe in recipes]
+    tags = defaultdict(list)
+    async for link in (
+        Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+        .select_related("tag")
+        .order_by("tag__name")
+    ):
+        tags[link.recipe_id].append(link.tag)
+    ingredients = defaultdict(list)
+    async for ingredient in Ingredient.objects.filter(
+        to_recipe_id__in=recipe_ids
+    ).select_related("ingredient"):
+        ingredients[ingredient.to_recipe_id].append(ingredient)
+    for recipe in recipes:
+        set_prefetched(recipe, "tags", tags[recipe.pk])
+        set_prefetched(
+            recipe, "ingredient_to_recipe", ingredients[recipe.pk]
+        )
+
+
+def get_recipe_queryset(user):
+    queryset = Recipe.objects.select_related("author")
+    if user.is_anonymous:
+        return queryset.annotate(
+            author_is_subscribed=Value(False, output_field=BooleanField()),
+        )
+    return queryset.annotate(
+        author_is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef("author"))
+        ),
+    )
+
+
+async def serialize_recipes(request, recipes, many):
+    await load_recipe_relations(recipes if many else [recipes])
+    membership = await RecipeMembership(request.user).aload()
+    serializer = RecipeSerializer(
+        recipes,
+        many=many,
+        context={"request": request, "membership": membership},
+    )
+    return serializer.data
+
+
+def get_page_number(request, count, page_size):
+    """
+    Возвращает номер страницы из параметра page. Номер вне диапазона
+    дает 404, как в PageNumberPagination.
+    """
+    number = request.query_params.get(PAGE_QUERY_PARAM, 1)
+    pages = max(1, -(-count // page_size))
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 0
+    if not 1 <= number <= pages:
+        raise exceptions.NotFound(
+            PageNumberPagination.invalid_page_message
+        )
+    return number, pages
+
+
+def get_page_links(request, number, pages):
+    url = request.build_absolute_uri()
+    next_link = None
+    if number < pages:
+        next_link = replace_query_param(url, PAGE_QUERY_PARAM, number + 1)
+    previous_link = None
+    if number == 2:
+        previous_link = remove_query_param(url, PAGE_QUERY_PARAM)
+    elif number > 2:
+        previous_link = replace_query_param(url, PAGE_QUERY_PARAM, number - 1)
+    return next_link, previous_link
+
+
+@api_view((IsAuthenticatedOrReadOnly, IsNotBanPermission))
+async def recipe_list(request):
+    """
+    Список рецептов с фильтрами RecipeFilter
+    и постраничной пагинацией.
+    """
+    queryset = await sync_to_async(filter_queryset)(
+        RecipeFilter(
+            request.query_params,
+            queryset=get_recipe_queryset(request.user),
+            request=request,
+        )
+    )
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    number, pages = get_page_number(request, count, page_size)
+    offset = (number - 1) * page_size
+    recipes = [
+        recipe async for recipe in queryset[offset:offset + page_size]
+    ]
+    next_link, previous_link = get_page_links(request, number, pages)
+    return {
+        "count": count,
+        "next": next_link,
+        "previous": previous_link,
+        "results": await serialize_recipes(request, recipes, many=True),
+    }
+
+
+@api_view((IsAuthenticatedOrReadOnly, IsNotBanPermission))
+async def recipe_detail(request, pk):
+    """
+    Рецепт из общего с RecipeViewSet.retrieve кэша, дополненный
+    флагами текущего пользователя.
+    """
+    key = await aget_recipe_detail_key(pk, request)
+    data = await aget_cached_recipe_detail(key)
+    if data is None:
+        with read_from_primary():
+            recipe = await get_recipe_queryset(request.user).filter(
+                pk=pk
+            ).afirst()
+            if recipe is None:
+                raise Http404
+            data = await serialize_recipes(request, recipe, many=False)
+        await acache_recipe_detail(key, data)
+        return data
+    return add_user_fields(
+        data,
+        await RecipeMembership(request.user).aload(),
+        await ais_subscribed(request.user, data["author"]["id"]),
+    )
+
+
+@api_view((IsAdminOrReadOnlyPermission,), TAGS_VERSION_KEY)
+async def tag_list(request):
+    tags = [tag async for tag in Tag.objects.all()]
+    return TagSerializer(tags, many=True).data
+
+
+@api_view((IsAdminOrReadOnlyPermission,), TAGS_VERSION_KEY)
+async def tag_detail(request, pk):
+    tag = await Tag.objects.filter(pk=pk).afirst()
+    if tag is None:
+        raise Http404
+    return TagSerializer(tag).data
+
+
+@api_view((IsAdminOrReadOnlyPermission,), BASE_INGREDIENTS_VERSION_KEY)
+async def ingredient_list(request):
+    """
+    Автодополнение продуктов с фильтром BaseIngredientFilter.
+    """
+    queryset = await sync_to_async(filter_queryset)(
+        BaseIngredientFilter(
+            request.query_params,
+            queryset=BaseIngredient.objects.all(),
+            request=request,
+        )
+    )
+    ingredients = [ingredient async for ingredient in queryset]
+    return BaseIngredientSerializer(ingredients, many=True).data
+
+
+@api_view((IsAdminOrReadOnlyPermission,), BASE_INGREDIENTS_VERSION_KEY)
+async def ingredient_detail(request, pk):
+    ingredient = await BaseIngredient.objects.filter(pk=pk).afirst()
+    if ingredient is None:
+        raise Http404
+    return BaseIngredientSerializer(ingredient).data
+
+
+@api_view((IsAuthenticated, IsNotBanPermission))
+async def subscription_list(request):
+    """
+    Подписки пользователя с последними рецептами авторов
+    и пагинацией limit/offset.
+    """
+    recipes_limit = validate_recipes_limit(
+        request.query_params.get("recipes_limit"), RECIPES_LIMIT_DEFAULT
+    )
+    paginator = LimitOffsetPagination()
+    paginator.request = request
+    paginator.limit = paginator.get_limit(request)
+    paginator.offset = paginator.get_offset(request)
+    queryset = (
+        Subscription.objects.filter(user=request.user)
+        .select_related("author")
+        .order_by("id")
+    )
+    paginator.count = await queryset.acount()
+    if paginator.limit is None:
+        subscriptions = [subscription async for subscription in queryset]
+    else:
+        subscriptions = [
+            subscription async for subscription in queryset[
+                paginator.offset:paginator.offset + paginator.limit
+            ]
+        ]
+    recipes_by_author = await sync_to_async(
+        GetAuthorSubscriptionViewSet.get_recipes_by_author
+    )(
+        [subscription.author_id for subscription in subscriptions],
+        recipes_limit,
+    )
+    serializer = AuthorSubscriptionSerializer(
+        subscriptions,
+        many=True,
+        context={"request": request, "recipes_by_author": recipes_by_author},
+    )
+    results = serializer.data
+    if paginator.limit is None:
+        return results
+    return {
+        "count": paginator.count,
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+        "results": results,
+    }
@@ -0,0 +1,138 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from .cache import aget_version, get_version, invalidate_versions
+
+User = get_user_model()
+
+TOKEN_VERSION_KEY = "auth_token_version:{digest}"
+TOKEN_USER_KEY = "auth_token_user:{digest}:{version}"
+
+
+def get_token_digest(key):
+    """
+    В ключах кэша хранится хэш токена, а не сам токен.
+    """
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    """
+    После фиксации транзакции сбрасывает закэшированных
+    пользователей для переданных токенов.
+    """
+    invalidate_versions(
+        TOKEN_VERSION_KEY.format(digest=get_token_digest(key))
+        for key in keys
+    )
+
+
+def get_tokens():
+    """
+    Токены вместе с пользователями без полей-счетчиков: счетчики
+    меняются в обход post_save и в закэшированном снимке устарели бы.
+    Отложенные поля читаются из БД при обращении, а save() такого
+    пользователя записывает только загруженные поля.
+    """
+    return Token.objects.select_related("user").defer(
+        *(f"user__{field}" for field in User.denormalized_fields)
+    )
+
+
+def check_token_user(token):
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(
+        Token.objects.filter(user_id=user_id).values_list("key", flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который хранит пользователя и токен в кэше
+    AUTH_TOKEN_CACHE_TIMEOUT секунд и не обращается к БД на каждый
+    запрос.
+
+    Запись сбрасывается сигналами при удалении токена (выход),
+    а также при любом сохранении пользователя: смене пароля,
+    блокировке через is_user_ban или деактивации. Как и в
+    api.membership, запись хранится под версией, поэтому снимок,
+    прочитанный из БД до сброса, не используется после него.
+    Версии создаются и сбрасываются функциями api.cache, как и версии
+    остальных закэшированных данных. Недействительные токены
+    не кэшируются.
+    """
+
+    def authenticate_credentials(self, key):
+        digest = get_token_digest(key)
+        version = get_version(TOKEN_VERSION_KEY.format(digest=digest))
+        cache_key = TOKEN_USER_KEY.format(digest=digest, version=version)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            try:
+                token = get_tokens().get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            check_token_user(token)
+            credentials = (token.user, token)
+            cache.set(
+                cache_key, credentials, settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+        return credentials
+
+    async def aauthenticate(self, request):
+        """
+        Асинхронный вариант authenticate для представлений
+        api.async_views. Принимает HttpRequest и использует
+        те же записи кэша, что и синхронный вариант.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(
+                _("Invalid token header. No credentials provided.")
+            )
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(
+                _("Invalid token header. "
+                  "Token string should not contain spaces.")
+            )
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _("Invalid token header. "
+                  "Token string should not contain invalid characters.")
+            )
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        digest = get_token_digest(key)
+        version = await aget_version(TOKEN_VERSION_KEY.format(digest=digest))
+        cache_key = TOKEN_USER_KEY.format(digest=digest, version=version)
+        credentials = await cache.aget(cache_key)
+        if credentials is None:
+            try:
+                token = await get_tokens().aget(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            check_token_user(token)
+            credentials = (token.user, token)
+            await cache.aset(
+                cache_key, credentials, settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+        return credentials
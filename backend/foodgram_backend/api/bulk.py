@@ -0,0 +1,148 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .cache import invalidate_shopping_carts
+from .counters import defer_counter_changes, recount
+from .membership import (
+    FAVORITES,
+    MEMBERSHIP_MODELS,
+    SHOPPING_CART,
+    invalidate_membership,
+)
+from .shopping_cart import (
+    apply_recipe_changes,
+    defer_cart_changes,
+    lock_shopping_cart,
+)
+from recipes.models import Recipe
+
+ADDED = "added"
+ALREADY_ADDED = "already_added"
+REMOVED = "removed"
+NOT_ADDED = "not_added"
+NOT_FOUND = "not_found"
+
+MEMBERSHIP_COUNTERS = {
+    FAVORITES: "favorites_count",
+    SHOPPING_CART: "in_carts_count",
+}
+
+
+def get_recipe_states(user, kind, recipe_ids):
+    """
+    Одним запросом возвращает для существующих рецептов из recipe_ids,
+    добавлены ли они в избранное или список покупок пользователя.
+    """
+    return dict(
+        Recipe.objects.filter(pk__in=recipe_ids)
+        .annotate(
+            is_added=Exists(
+                MEMBERSHIP_MODELS[kind].objects.filter(
+                    subscriber=user, subscribed_recipe=OuterRef("pk")
+                )
+            )
+        )
+        .values_list("pk", "is_added")
+    )
+
+
+def get_results(recipe_ids, statuses):
+    return [
+        {"id": recipe_id, "status": statuses[recipe_id]}
+        for recipe_id in recipe_ids
+    ]
+
+
+def invalidate(user, kind):
+    invalidate_membership(user.id, kind)
+    if kind == SHOPPING_CART:
+        invalidate_shopping_carts((user.id,))
+
+
+def add_recipes(user, kind, recipe_ids):
+    """
+    Добавляет рецепты в избранное или список покупок одним INSERT
+    и возвращает результат для каждого id. Строки, которые успел
+    добавить параллельный запрос, пропускаются (ignore_conflicts).
+
+    bulk_create не отправляет post_save, поэтому счетчики добавленных
+    рецептов пересчитываются одним UPDATE, продукты добавленных
+    рецептов прибавляются к строкам списка покупок пользователя,
+    а кэши сбрасываются один раз на весь запрос. Список покупок
+    блокируется до чтения состояния, поэтому добавленными считаются
+    ровно те рецепты, которые вставил этот запрос.
+    """
+    model = MEMBERSHIP_MODELS[kind]
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        if kind == SHOPPING_CART:
+            lock_shopping_cart(user.id)
+        states = get_recipe_states(user, kind, recipe_ids)
+        to_add = [
+            recipe_id for recipe_id, is_added in states.items()
+            if not is_added
+        ]
+        if to_add:
+            model.objects.bulk_create(
+                [
+                    model(subscriber=user, subscribed_recipe_id=recipe_id)
+                    for recipe_id in to_add
+                ],
+                ignore_conflicts=True,
+            )
+            recount(
+                Recipe,
+                MEMBERSHIP_COUNTERS[kind],
+                model,
+                "subscribed_recipe",
+                pks=to_add,
+            )
+            if kind == SHOPPING_CART:
+                apply_recipe_changes(
+                    {(user.id, recipe_id): 1 for recipe_id in to_add}
+                )
+    if to_add:
+        invalidate(user, kind)
+    return get_results(
+        recipe_ids,
+        {
+            recipe_id: NOT_FOUND if recipe_id not in states
+            else ALREADY_ADDED if states[recipe_id]
+            else ADDED
+            for recipe_id in recipe_ids
+        },
+    )
+
+
+def remove_recipes(user, kind, recipe_ids):
+    """
+    Удаляет рецепты из избранного или списка покупок одним DELETE
+    и возвращает результат для каждого id. Изменения счетчиков
+    и списка покупок из сигналов post_delete применяются разом.
+    """
+    model = MEMBERSHIP_MODELS[kind]
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    with (
+        transaction.atomic(),
+        defer_counter_changes(),
+        defer_cart_changes(),
+    ):
+        if kind == SHOPPING_CART:
+            lock_shopping_cart(user.id)
+        states = get_recipe_states(user, kind, recipe_ids)
+        model.objects.filter(
+            subscriber=user,
+            subscribed_recipe_id__in=[
+                recipe_id for recipe_id, is_added in states.items()
+                if is_added
+            ],
+        ).delete()
+    return get_results(
+        recipe_ids,
+        {
+            recipe_id: NOT_FOUND if recipe_id not in states
+            else REMOVED if states[recipe_id]
+            else NOT_ADDED
+            for recipe_id in recipe_ids
+        },
+    )
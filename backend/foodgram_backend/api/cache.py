@@ -0,0 +1,321 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from threading import local
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .util import render_shopping_list
+from recipes.models import ShoppingList
+
+BASE_INGREDIENTS_VERSION_KEY = "base_ingredients_version"
+TAGS_VERSION_KEY = "tags_version"
+CART_VERSION_KEY = "shopping_cart_version:{user_id}"
+CARTS_GENERATION_KEY = "shopping_cart_generation"
+CART_DIGEST_KEY = "shopping_cart_digest:{user_id}:{version}"
+SHOPPING_LIST_HITS_KEY = "shopping_list_cache:hits"
+SHOPPING_LIST_MISSES_KEY = "shopping_list_cache:misses"
+SHOPPING_LIST_SUFFIX = ".pdf"
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+deferred_invalidation = local()
+
+
+def get_process_local_caches():
+    """
+    Возвращает алиасы кэшей с версиями данных, токенами и множествами
+    избранного, которые хранятся в памяти процесса и не видны
+    остальным воркерам.
+    """
+    aliases = {"default", settings.MEMBERSHIP_CACHE_ALIAS}
+    return sorted(
+        alias for alias in aliases
+        if settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_CACHE_BACKENDS
+    )
+
+
+def check_shared_cache():
+    """
+    Не дает запустить несколько воркеров с кэшем в памяти процесса.
+    Сброс версии, выход пользователя или его блокировка видны только
+    воркеру, который их обработал, поэтому остальные продолжали бы
+    отдавать устаревшие данные и принимать отозванный токен.
+    """
+    processes = settings.WEB_CONCURRENCY * settings.WEB_SERVICES
+    if processes <= 1:
+        return
+    aliases = get_process_local_caches()
+    if aliases:
+        raise ImproperlyConfigured(
+            f"Процессов бэкенда: {processes} (WEB_CONCURRENCY="
+            f"{settings.WEB_CONCURRENCY}, WEB_SERVICES="
+            f"{settings.WEB_SERVICES}). Им нужен общий кэш, а кэши "
+            f"{', '.join(aliases)} хранятся в памяти процесса. "
+            "Укажите CACHE_BACKEND, например "
+            "django.core.cache.backends.redis.RedisCache."
+        )
+
+
+def new_version():
+    """
+    Возвращает новую версию набора данных. Версия начинается
+    с времени своего создания в секундах, см. get_version_timestamp.
+    """
+    return f"{int(time())}-{uuid4().hex}"
+
+
+def get_version(key):
+    """
+    Возвращает текущую версию набора данных, хранящуюся в кэше.
+    Отсутствующая версия создается заново, поэтому сброс версии
+    сводится к удалению ключа.
+    """
+    return cache.get_or_set(key, new_version(), timeout=None)
+
+
+async def aget_version(key):
+    """
+    Асинхронный вариант get_version.
+    """
+    return await cache.aget_or_set(key, new_version(), timeout=None)
+
+
+def get_version_timestamp(version):
+    """
+    Возвращает время создания версии. Оно не раньше времени
+    последнего изменения данных и подходит для Last-Modified.
+    """
+    return int(version.split("-", 1)[0])
+
+
+def bump_versions(keys):
+    """
+    Сбрасывает версии наборов данных с переданными ключами.
+    """
+    cache.delete_many(keys)
+
+
+def invalidate_versions(keys):
+    """
+    Сбрасывает версии после фиксации транзакции, чтобы параллельный
+    запрос не сохранил под новой версией данные, прочитанные
+    до фиксации.
+    """
+    keys = tuple(keys)
+    if keys:
+        transaction.on_commit(lambda: bump_versions(keys))
+
+
+def get_cart_version(user_id):
+    """
+    Возвращает текущую версию списка покупок пользователя.
+    Версия меняется при любом изменении списка покупок
+    или ингредиентов рецептов, которые в нем находятся.
+    """
+    generation = get_version(CARTS_GENERATION_KEY)
+    version = get_version(CART_VERSION_KEY.format(user_id=user_id))
+    return f"{generation}:{version}"
+
+
+def invalidate_shopping_carts(user_ids):
+    """
+    Сбрасывает версии списков покупок переданных пользователей после
+    фиксации транзакции, чтобы параллельный запрос не сохранил
+    под новой версией список, прочитанный до фиксации.
+    """
+    invalidate_versions(
+        CART_VERSION_KEY.format(user_id=user_id) for user_id in user_ids
+    )
+
+
+def invalidate_all_shopping_carts():
+    """
+    Сбрасывает версии списков покупок всех пользователей.
+    Используется при массовом изменении справочника продуктов.
+    """
+    invalidate_versions((CARTS_GENERATION_KEY,))
+
+
+def invalidate_recipes_in_carts(recipe_ids):
+    """
+    Сбрасывает версии списков покупок всех пользователей,
+    у которых в списке есть хотя бы один из переданных рецептов.
+    Внутри defer_cart_invalidation рецепты только запоминаются.
+    """
+    recipes = getattr(deferred_invalidation, "recipe_ids", None)
+    if recipes is not None:
+        recipes.update(recipe_ids)
+        return
+    invalidate_shopping_carts(
+        ShoppingList.objects.filter(
+            subscribed_recipe__in=recipe_ids
+        ).values_list("subscriber", flat=True).distinct()
+    )
+
+
+@contextmanager
+def defer_cart_invalidation():
+    """
+    Откладывает сброс списков покупок по рецептам до выхода из блока
+    и выполняет его одним запросом, сколько бы ингредиентов ни
+    изменилось. Транзакцию следует открывать внутри блока, чтобы
+    сброс происходил уже после фиксации изменений.
+    """
+    if getattr(deferred_invalidation, "recipe_ids", None) is not None:
+        yield
+        return
+    deferred_invalidation.recipe_ids = set()
+    try:
+        yield
+    finally:
+        recipe_ids = deferred_invalidation.recipe_ids
+        deferred_invalidation.recipe_ids = None
+        if recipe_ids:
+            invalidate_recipes_in_carts(recipe_ids)
+
+
+def get_rows_digest(ingredients_list):
+    """
+    Возвращает хэш агрегированного списка ингредиентов,
+    вычисленный по названию, единице измерения и общему количеству.
+    """
+    digest = hashlib.sha256()
+    for ingredient in ingredients_list:
+        digest.update(
+            "\x1f".join((
+                str(ingredient.get("name")),
+                str(ingredient.get("measurement_unit")),
+                str(ingredient.get("total_amount")),
+            )).encode()
+        )
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def get_shopping_list_path(digest):
+    return os.path.join(
+        settings.SHOPPING_LIST_CACHE_DIR, f"{digest}{SHOPPING_LIST_SUFFIX}"
+    )
+
+
+def increment_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_shopping_list_cache_stats():
+    """
+    Возвращает количество попаданий и промахов кэша списков покупок.
+    """
+    stats = cache.get_many((SHOPPING_LIST_HITS_KEY, SHOPPING_LIST_MISSES_KEY))
+    return {
+        "hits": stats.get(SHOPPING_LIST_HITS_KEY, 0),
+        "misses": stats.get(SHOPPING_LIST_MISSES_KEY, 0),
+    }
+
+
+def open_shopping_list_file(digest):
+    """
+    Открывает сохраненный файл и отмечает его как недавно
+    использованный. Возвращает None, если файла нет в хранилище.
+    """
+    path = get_shopping_list_path(digest)
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # Файл вытеснил другой воркер, открытый дескриптор
+        # остается рабочим.
+        pass
+    return file
+
+
+def get_cached_shopping_list(user_id, version):
+    """
+    Возвращает открытый файл со списком покупок пользователя,
+    если его список не менялся с момента последней генерации.
+    Агрегация ингредиентов в этом случае не выполняется.
+    """
+    digest = cache.get(
+        CART_DIGEST_KEY.format(user_id=user_id, version=version)
+    )
+    file = digest and open_shopping_list_file(digest)
+    if file:
+        increment_counter(SHOPPING_LIST_HITS_KEY)
+    return file
+
+
+def cache_shopping_list(user_id, version, ingredients_list):
+    """
+    Возвращает открытый файл со списком покупок для агрегированного
+    списка ингредиентов. Файлы хранятся по хэшу содержимого, поэтому
+    одинаковые списки покупок генерируются один раз.
+
+    Версию списка покупок нужно получить до агрегации ингредиентов,
+    иначе изменение, сделанное во время агрегации, не сбросит кэш.
+    """
+    digest = get_rows_digest(ingredients_list)
+    file = open_shopping_list_file(digest)
+    if file:
+        increment_counter(SHOPPING_LIST_HITS_KEY)
+    else:
+        increment_counter(SHOPPING_LIST_MISSES_KEY)
+        os.makedirs(settings.SHOPPING_LIST_CACHE_DIR, exist_ok=True)
+        file = NamedTemporaryFile(
+            dir=settings.SHOPPING_LIST_CACHE_DIR, delete=False
+        )
+        try:
+            render_shopping_list(ingredients_list, file)
+            file.flush()
+            os.replace(file.name, get_shopping_list_path(digest))
+        except Exception:
+            file.close()
+            os.remove(file.name)
+            raise
+        # Отдается уже открытый дескриптор: файл под новым именем
+        # может успеть вытеснить другой воркер.
+        file.seek(0)
+        evict_shopping_lists()
+    cache.set(
+        CART_DIGEST_KEY.format(user_id=user_id, version=version),
+        digest,
+        timeout=settings.SHOPPING_LIST_CACHE_TIMEOUT,
+    )
+    return file
+
+
+def evict_shopping_lists():
+    """
+    Удаляет давно не использованные файлы, если их количество
+    превышает SHOPPING_LIST_CACHE_MAX_FILES. Файлы, которые
+    параллельно удалил другой воркер, пропускаются.
+    """
+    files = []
+    with os.scandir(settings.SHOPPING_LIST_CACHE_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(SHOPPING_LIST_SUFFIX):
+                continue
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    files.sort()
+    excess = max(len(files) - settings.SHOPPING_LIST_CACHE_MAX_FILES, 0)
+    for _, path in files[:excess]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import local
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription
+
+User = get_user_model()
+
+deferred_changes = local()
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "subscribed_recipe"),
+    (Recipe, "in_carts_count", ShoppingList, "subscribed_recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "author"),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счетчик одним UPDATE без чтения строки,
+    поэтому параллельные запросы не теряют изменения друг друга.
+    Внутри defer_counter_changes изменение только запоминается.
+    """
+    changes = getattr(deferred_changes, "changes", None)
+    if changes is not None:
+        changes[(model, field)][pk] += delta
+        return
+    change_counters(model, (pk,), field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@contextmanager
+def defer_counter_changes():
+    """
+    Откладывает изменения счетчиков до выхода из блока и применяет
+    их одним UPDATE на каждое сочетание счетчика и величины
+    изменения, например при удалении сразу многих объектов.
+    """
+    if getattr(deferred_changes, "changes", None) is not None:
+        yield
+        return
+    deferred_changes.changes = defaultdict(lambda: defaultdict(int))
+    try:
+        yield
+    finally:
+        changes = deferred_changes.changes
+        deferred_changes.changes = None
+    for (model, field), deltas in changes.items():
+        pks_by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            if delta:
+                pks_by_delta[delta].append(pk)
+        for delta, pks in pks_by_delta.items():
+            change_counters(model, pks, field, delta)
+
+
+def get_actual_count(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def recount(model, field, related_model, related_field, pks=None):
+    """
+    Пересчитывает счетчик у всех объектов model или только у объектов
+    из pks одним UPDATE и возвращает количество исправленных строк.
+    """
+    actual = get_actual_count(related_model, related_field)
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.exclude(**{field: actual}).update(**{field: actual})
+
+
+def recount_all():
+    """
+    Пересчитывает все счетчики. Возвращает количество
+    исправленных строк для каждого счетчика.
+    """
+    return {
+        f"{model._meta.model_name}.{field}": recount(
+            model, field, related_model, related_field
+        )
+        for model, field, related_model, related_field in COUNTERS
+    }
@@ -1,17 +1,33 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Case, Value, When
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework
 
-from recipes.models import BaseIngredient, Recipe, Tag
+from .recipe_search import search_recipes
+from .search import search_ingredients
+from .tags import TAGS_MODE_ANY, TAGS_MODES, filter_by_tags, get_tag_choices
+from recipes.models import BaseIngredient, Favorite, Recipe, ShoppingList
 
 User = get_user_model()
 
 
 class RecipeFilter(rest_framework.FilterSet):
-    tags = rest_framework.filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+    """
+    Фильтр рецептов по тегам, автору, избранному и списку покупок.
+    Параметр search включает полнотекстовый поиск по названию
+    и тексту, результаты сортируются по релевантности. Теги
+    проверяются по маске тегов рецепта: tags_mode=any (по умолчанию)
+    оставляет рецепты хотя бы с одним из тегов, tags_mode=all -
+    со всеми.
+    """
+
+    tags = rest_framework.filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method="filter_tags",
+    )
+    tags_mode = rest_framework.filters.ChoiceFilter(
+        choices=TAGS_MODES,
+        method="filter_tags_mode",
     )
     is_favorited = rest_framework.filters.NumberFilter(
         method="filter_is_favorite",
@@ -19,44 +35,97 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.filters.NumberFilter(
         method="filter_is_shopping_card",
     )
+    search = rest_framework.filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipe
         fields = (
             "tags",
+            "tags_mode",
             "author",
             "is_favorited",
             "is_in_shopping_cart",
+            "search",
+        )
+
+    def filter_tags(self, queryset, name, value):
+        return filter_by_tags(
+            queryset,
+            value,
+            self.form.cleaned_data.get("tags_mode") or TAGS_MODE_ANY,
         )
 
+    def filter_tags_mode(self, queryset, name, value):
+        """
+        Режим учитывается в filter_tags.
+        """
+        return queryset
+
     def filter_is_favorite(self, queryset, name, value):
         if value:
-            return queryset.filter(
-                favorite_subscribed_recipe__subscriber=self.request.user
-            )
+            return self.filter_subscribed(queryset, Favorite)
         return queryset
 
     def filter_is_shopping_card(self, queryset, name, value):
         if value:
-            return queryset.filter(
-                shoppinglist_subscribed_recipe__subscriber=self.request.user
-            )
+            return self.filter_subscribed(queryset, ShoppingList)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
+
+    def filter_subscribed(self, queryset, model):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(
+            Exists(
+                model.objects.filter(
+                    subscriber=user, subscribed_recipe=OuterRef("pk")
+                )
+            )
+        )
+
 
 class BaseIngredientFilter(rest_framework.FilterSet):
+    """
+    Фильтр автодополнения продуктов по названию.
+    Параметр limit ограничивает количество продуктов в ответе,
+    по умолчанию - INGREDIENT_SEARCH_LIMIT, в том числе для списка
+    без поиска по названию.
+    """
+
     name = rest_framework.filters.CharFilter(method="filter_name")
+    limit = rest_framework.filters.NumberFilter(
+        method="filter_limit",
+        min_value=1,
+        max_value=settings.INGREDIENT_SEARCH_MAX_LIMIT,
+        decimal_places=0,
+    )
 
     class Meta:
         model = BaseIngredient
-        fields = ("name",)
+        fields = ("name", "limit")
+
+    def get_limit(self):
+        limit = self.form.cleaned_data.get("limit")
+        return int(limit or settings.INGREDIENT_SEARCH_LIMIT)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.form.cleaned_data.get("name"):
+            return queryset[:self.get_limit()]
+        return queryset
 
     def filter_name(self, queryset, name, value):
         if value:
-            queryset = queryset.filter(name__icontains=value.lower())
-            return queryset.annotate(
-                start=Case(
-                    When(name__istartswith=value.lower(), then=Value(True))
-                )
-            ).order_by("start", "name")
+            return search_ingredients(queryset, value, self.get_limit())
+        return queryset
+
+    def filter_limit(self, queryset, name, value):
+        """
+        Ограничение применяется в filter_name и filter_queryset.
+        """
         return queryset
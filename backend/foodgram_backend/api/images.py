@@ -0,0 +1,135 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .recipe_cache import invalidate_recipe_details
+from recipes.models import Recipe
+
+VARIANTS_DIR = "recipes/image/variants"
+WEBP_SUFFIX = "_webp"
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+    thread_name_prefix="recipe-images",
+)
+
+
+def get_variant_names():
+    """
+    Возвращает названия всех копий изображения рецепта:
+    для каждого размера - копию в исходном формате и в WebP.
+    """
+    for size_name in settings.RECIPE_IMAGE_SIZES:
+        yield size_name
+        yield size_name + WEBP_SUFFIX
+
+
+def get_image_variant_urls(recipe, request=None):
+    """
+    Возвращает ссылки на копии изображения рецепта. Пока копии
+    не готовы, вместо каждой из них отдается исходное изображение.
+    """
+    if not recipe.image:
+        return {name: None for name in get_variant_names()}
+    storage = recipe.image.storage
+    variants = recipe.image_variants or {}
+    urls = {
+        name: storage.url(variants.get(name, recipe.image.name))
+        for name in get_variant_names()
+    }
+    if request is None:
+        return urls
+    return {name: request.build_absolute_uri(url) for name, url in urls.items()}
+
+
+def save_variant(storage, image, name, image_format):
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format=image_format,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def create_image_variants(recipe_id, obsolete=()):
+    """
+    Создает уменьшенные копии изображения рецепта в исходном формате
+    и в WebP и сохраняет их имена в Recipe.image_variants.
+
+    Если изображение рецепта успело смениться, созданные копии
+    удаляются: их заменят копии, запланированные для нового изображения.
+    Копии предыдущего изображения из obsolete удаляются в любом случае.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only("image").first()
+    storage = Recipe._meta.get_field("image").storage
+    for name in obsolete:
+        storage.delete(name)
+    if recipe is None or not recipe.image:
+        return {}
+    try:
+        with recipe.image.open("rb") as file:
+            image = Image.open(file)
+            image.load()
+    except (OSError, UnidentifiedImageError) as error:
+        logger.warning(
+            "Не удалось открыть изображение рецепта %s: %s", recipe_id, error
+        )
+        return {}
+    image = ImageOps.exif_transpose(image)
+    has_alpha = "A" in image.getbands()
+    image_format, extension = ("PNG", "png") if has_alpha else ("JPEG", "jpg")
+    if not has_alpha and image.mode != "RGB":
+        image = image.convert("RGB")
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    variants = {}
+    for size_name, size in settings.RECIPE_IMAGE_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        name = f"{VARIANTS_DIR}/{stem}-{size_name}"
+        variants[size_name] = save_variant(
+            storage, thumbnail, f"{name}.{extension}", image_format
+        )
+        variants[size_name + WEBP_SUFFIX] = save_variant(
+            storage, thumbnail, f"{name}.webp", "WEBP"
+        )
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_variants=variants)
+    if not updated:
+        for name in variants.values():
+            storage.delete(name)
+        return {}
+    invalidate_recipe_details((recipe_id,))
+    return variants
+
+
+def process_image_variants(recipe_id, obsolete=()):
+    try:
+        create_image_variants(recipe_id, obsolete)
+    except Exception:
+        logger.exception(
+            "Не удалось создать копии изображения рецепта %s", recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(recipe_id, obsolete=()):
+    """
+    Ставит создание копий изображения рецепта в очередь фонового
+    пула потоков после фиксации текущей транзакции, чтобы запрос
+    не ждал обработки изображения.
+    """
+    transaction.on_commit(
+        lambda: executor.submit(process_image_variants, recipe_id, obsolete)
+    )
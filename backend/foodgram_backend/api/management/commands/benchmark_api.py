@@ -0,0 +1,428 @@
+import json
+import os
+from collections import namedtuple
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from recipes.models import (
+    BaseIngredient,
+    Favorite,
+    Recipe,
+    ShoppingList,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 3
+LATENCY_NOISE_MS = 2
+BASELINE_FIELDS = ("status", "queries")
+BULK_SIZE = 7
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA"
+    "CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAA"
+    "ggCByxOyYQAAAABJRU5ErkJggg=="
+)
+
+Scenario = namedtuple(
+    "Scenario", ("name", "url_name", "method", "path", "data")
+)
+
+
+def get_route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет маршруты api/urls.py через тестовый клиент на текущей "
+        "базе и выводит перцентили времени ответа и количество запросов "
+        "к БД. Сравнивает результат с сохраненным базовым замером "
+        "и завершается с ошибкой при регрессии: изменении статуса ответа "
+        "или росте количества запросов, а с --tolerance и росте p95. "
+        "Изменяющие запросы выполняются в транзакции, которая "
+        "откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=DEFAULT_REPEAT,
+            help="Количество замеров для каждого маршрута.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=DEFAULT_WARMUP,
+            help="Количество прогревочных запросов без замера.",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username пользователя, от имени которого идут запросы. "
+            "По умолчанию - автор рецептов с самым большим списком покупок.",
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            help="Замерять только перечисленные сценарии.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Путь к JSON с базовым замером.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Сохранить результат в --baseline вместо сравнения.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            help="Допустимый относительный рост p95, например 0.25. "
+            "Без параметра время ответа зависит от машины и не "
+            "сохраняется и не сравнивается.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 2:
+            raise CommandError("--repeat должен быть не меньше 2.")
+        if options["save_baseline"] and not options["baseline"]:
+            raise CommandError("Для --save-baseline нужен --baseline.")
+        user = self.get_user(options["user"])
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=(
+                f"Token {Token.objects.get_or_create(user=user)[0].key}"
+            )
+        )
+        scenarios = self.get_scenarios(user)
+        if options["only"]:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options["only"]
+            ]
+        results = {}
+        self.stdout.write(
+            f"{'scenario':<32} {'status':>6} {'p50, ms':>9} "
+            f"{'p95, ms':>9} {'p99, ms':>9} {'queries':>8}"
+        )
+        with TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            MEDIA_ROOT=media_root,
+            SHOPPING_LIST_CACHE_DIR=os.path.join(media_root, "shopping_lists"),
+        ):
+            for scenario in scenarios:
+                results[scenario.name] = self.measure(
+                    client, scenario, options["repeat"], options["warmup"]
+                )
+                self.write_result(scenario.name, results[scenario.name])
+        if not options["only"]:
+            self.write_uncovered(scenarios)
+        if not options["baseline"]:
+            return
+        if options["save_baseline"]:
+            if options["tolerance"] is None:
+                results = {
+                    name: {field: result[field] for field in BASELINE_FIELDS}
+                    for name, result in results.items()
+                }
+            with open(options["baseline"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+                file.write("\n")
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Базовый замер сохранен в {options['baseline']}."
+                )
+            )
+            return
+        self.compare(results, options["baseline"], options["tolerance"])
+
+    @staticmethod
+    def get_user(username):
+        users = User.objects.filter(is_active=True, is_user_ban=False)
+        if username:
+            user = users.filter(username=username).first()
+        else:
+            user = (
+                users.filter(
+                    Exists(Recipe.objects.filter(author=OuterRef("pk")))
+                )
+                .annotate(cart_size=Count("shoppinglist_subscriber"))
+                .order_by("-cart_size", "pk")
+                .first()
+            )
+        if user is None:
+            raise CommandError(
+                "Нет подходящего пользователя. Заполните базу командой "
+                "generate_test_data."
+            )
+        return user
+
+    @staticmethod
+    def get_scenarios(user):
+        """
+        Возвращает сценарии для маршрутов api/urls.py. Сценарии, для
+        которых в базе нет данных, пропускаются.
+        """
+        recipe = Recipe.objects.order_by("-pub_date").first()
+        own_recipe = (
+            Recipe.objects.filter(author=user).order_by("-pub_date").first()
+        )
+        tag_slugs = list(
+            Tag.objects.order_by("pk").values_list("slug", flat=True)[:2]
+        )
+        tag = Tag.objects.order_by("pk").first()
+        product = BaseIngredient.objects.order_by("pk").first()
+        favorite = Favorite.objects.filter(subscriber=user).first()
+        cart_entry = ShoppingList.objects.filter(subscriber=user).first()
+        subscription = Subscription.objects.filter(user=user).first()
+        not_favorited = (
+            Recipe.objects.exclude(favorite_subscribed_recipe__subscriber=user)
+            .order_by("-pub_date").first()
+        )
+        not_in_cart = (
+            Recipe.objects.exclude(
+                shoppinglist_subscribed_recipe__subscriber=user
+            ).order_by("-pub_date").first()
+        )
+        not_subscribed = (
+            User.objects.exclude(pk=user.pk)
+            .exclude(subscribing__user=user)
+            .order_by("pk").first()
+        )
+        pantry = recipe and {
+            "ingredients": list(
+                recipe.ingredient_to_recipe.values_list(
+                    "ingredient", flat=True
+                )
+            )
+        }
+        bulk_data = {
+            "recipes": list(
+                Recipe.objects.order_by("-pub_date")
+                .values_list("pk", flat=True)[:BULK_SIZE]
+            )
+        }
+        recipe_data = product and tag and {
+            "ingredients": [{"id": product.pk, "amount": 10}],
+            "tags": [tag.pk],
+            "image": IMAGE,
+            "name": "Тестовый рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+        }
+        candidates = (
+            ("recipes", "recipe-list", "GET", {}, None, True),
+            ("recipes: tags", "recipe-list", "GET", {},
+             tag and {"tags": tag.slug}, tag),
+            ("recipes: all tags", "recipe-list", "GET", {},
+             {"tags": tag_slugs, "tags_mode": "all"}, len(tag_slugs) == 2),
+            ("recipes: is_favorited", "recipe-list", "GET", {},
+             {"is_favorited": 1}, True),
+            ("recipes: cursor", "recipe-list", "GET", {},
+             {"pagination": "cursor"}, True),
+            ("recipes: by ingredients", "recipe-by-ingredients", "GET", {},
+             pantry, pantry and pantry["ingredients"]),
+            ("recipe", "recipe-detail", "GET",
+             {"pk": recipe and recipe.pk}, None, recipe),
+            ("recipe: create", "recipe-list", "POST", {},
+             recipe_data, recipe_data),
+            ("recipe: update", "recipe-detail", "PATCH",
+             {"pk": own_recipe and own_recipe.pk},
+             recipe_data, own_recipe and recipe_data),
+            ("recipe: delete", "recipe-detail", "DELETE",
+             {"pk": own_recipe and own_recipe.pk}, None, own_recipe),
+            ("favorite: add", "recipe-create-destroy-favorite", "POST",
+             {"pk": not_favorited and not_favorited.pk}, None, not_favorited),
+            ("favorite: remove", "recipe-create-destroy-favorite", "DELETE",
+             {"pk": favorite and favorite.subscribed_recipe_id},
+             None, favorite),
+            ("shopping_cart: add", "recipe-create-destroy-shopping-cart",
+             "POST", {"pk": not_in_cart and not_in_cart.pk}, None, not_in_cart),
+            ("shopping_cart: remove", "recipe-create-destroy-shopping-cart",
+             "DELETE", {"pk": cart_entry and cart_entry.subscribed_recipe_id},
+             None, cart_entry),
+            ("favorites: bulk add", "recipe-bulk-favorite", "POST", {},
+             bulk_data, recipe),
+            ("favorites: bulk remove", "recipe-bulk-favorite", "DELETE", {},
+             bulk_data, recipe),
+            ("shopping_cart: bulk add", "recipe-bulk-shopping-cart", "POST",
+             {}, bulk_data, recipe),
+            ("shopping_cart: bulk remove", "recipe-bulk-shopping-cart",
+             "DELETE", {}, bulk_data, recipe),
+            ("shopping_cart: contents", "recipe-bulk-shopping-cart", "GET",
+             {}, None, True),
+            ("shopping_cart: download", "recipe-download-shopping-cart",
+             "GET", {}, None, True),
+            ("shopping_cart: download txt",
+             "recipe-download-shopping-cart", "GET", {}, {"format": "txt"},
+             True),
+            ("shopping_cart: download csv",
+             "recipe-download-shopping-cart", "GET", {}, {"format": "csv"},
+             True),
+            ("shopping_cart: download json",
+             "recipe-download-shopping-cart", "GET", {}, {"format": "json"},
+             True),
+            ("tags", "tag-list", "GET", {}, None, True),
+            ("tag", "tag-detail", "GET", {"pk": tag and tag.pk}, None, tag),
+            ("ingredients: search", "ingredients-list", "GET", {},
+             product and {"name": product.name[:3]}, product),
+            ("ingredient", "ingredients-detail", "GET",
+             {"pk": product and product.pk}, None, product),
+            ("subscriptions", "subscriptions-list", "GET", {},
+             {"recipes_limit": 3}, True),
+            ("subscribe", "subscribe-list", "POST",
+             {"user_id": not_subscribed and not_subscribed.pk},
+             None, not_subscribed),
+            ("unsubscribe", "subscribe-list", "DELETE",
+             {"user_id": subscription and subscription.author_id},
+             None, subscription),
+            ("users", "user-list", "GET", {}, None, True),
+            ("users: me", "user-me", "GET", {}, None, True),
+            ("user", "user-detail", "GET", {"id": user.pk}, None, True),
+            ("metrics", "metrics", "GET", {}, None, True),
+            ("async: recipes", "async-recipe-list", "GET", {}, None, True),
+            ("async: recipe", "async-recipe-detail", "GET",
+             {"pk": recipe and recipe.pk}, None, recipe),
+            ("async: tags", "async-tag-list", "GET", {}, None, True),
+            ("async: tag", "async-tag-detail", "GET",
+             {"pk": tag and tag.pk}, None, tag),
+            ("async: ingredients: search", "async-ingredients-list", "GET",
+             {}, product and {"name": product.name[:3]}, product),
+            ("async: ingredient", "async-ingredients-detail", "GET",
+             {"pk": product and product.pk}, None, product),
+            ("async: subscriptions", "async-subscriptions-list", "GET", {},
+             {"recipes_limit": 3}, True),
+        )
+        return [
+            Scenario(
+                name, url_name, method, reverse(url_name, kwargs=kwargs), data
+            )
+            for name, url_name, method, kwargs, data, available in candidates
+            if available
+        ]
+
+    @staticmethod
+    def send(client, scenario):
+        if scenario.method == "GET":
+            response = client.get(scenario.path, scenario.data)
+            if response.streaming:
+                # Файл формируется при чтении ответа, его время
+                # и запросы к БД входят в замер.
+                for _ in response.streaming_content:
+                    pass
+            return response
+        with transaction.atomic():
+            response = client.generic(
+                scenario.method,
+                scenario.path,
+                json.dumps(scenario.data or {}),
+                content_type="application/json",
+            )
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, client, scenario, repeat, warmup):
+        for _ in range(warmup):
+            self.send(client, scenario)
+        timings = []
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = perf_counter()
+                response = self.send(client, scenario)
+                timings.append((perf_counter() - start) * 1000)
+            queries = max(queries, len(context.captured_queries))
+            if hasattr(response, "streaming_content"):
+                response.close()
+        p50, p95, p99 = (
+            quantiles(timings, n=100, method="inclusive")[index]
+            for index in (49, 94, 98)
+        )
+        return {
+            "status": response.status_code,
+            "p50": round(p50, 2),
+            "p95": round(p95, 2),
+            "p99": round(p99, 2),
+            "queries": queries,
+        }
+
+    def write_result(self, name, result):
+        style = (
+            self.style.ERROR if result["status"] >= 400
+            else lambda text: text
+        )
+        self.stdout.write(style(
+            f"{name:<32} {result['status']:>6} {result['p50']:>9.2f} "
+            f"{result['p95']:>9.2f} {result['p99']:>9.2f} "
+            f"{result['queries']:>8}"
+        ))
+
+    def write_uncovered(self, scenarios):
+        uncovered = (
+            set(get_route_names(api_urls.urlpatterns))
+            - {scenario.url_name for scenario in scenarios}
+        )
+        if uncovered:
+            self.stdout.write(
+                "Маршруты без замеров: " + ", ".join(sorted(uncovered))
+            )
+
+    def compare(self, results, path, tolerance):
+        if not os.path.exists(path):
+            raise CommandError(f"Файл базового замера не найден: {path}.")
+        with open(path, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result["status"] != expected["status"]:
+                regressions.append(
+                    f"{name}: статус {result['status']} "
+                    f"вместо {expected['status']}"
+                )
+            if result["queries"] > expected["queries"]:
+                regressions.append(
+                    f"{name}: запросов к БД {result['queries']} "
+                    f"вместо {expected['queries']}"
+                )
+            if tolerance is None or "p95" not in expected:
+                continue
+            limit = max(
+                expected["p95"] * (1 + tolerance),
+                expected["p95"] + LATENCY_NOISE_MS,
+            )
+            if result["p95"] > limit:
+                regressions.append(
+                    f"{name}: p95 {result['p95']:.2f} мс "
+                    f"вместо {expected['p95']:.2f} мс"
+                )
+        if regressions:
+            raise CommandError(
+                "Регрессия относительно базового замера:\n"
+                + "\n".join(regressions)
+            )
+        self.stdout.write(
+            self.style.SUCCESS("Регрессий относительно базового замера нет.")
+        )
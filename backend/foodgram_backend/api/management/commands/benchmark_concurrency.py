@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from threading import local
+from time import perf_counter
+
+import requests
+from django.core.management import BaseCommand, CommandError
+
+DEFAULT_CONCURRENCY = 50
+DEFAULT_REQUESTS = 1000
+DEFAULT_TIMEOUT = 30
+
+sessions = local()
+
+
+def get_session():
+    if not hasattr(sessions, "session"):
+        sessions.session = requests.Session()
+    return sessions.session
+
+
+def send(url, headers, timeout):
+    start = perf_counter()
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        ok = False
+    return ok, (perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает работающий сервер одновременными клиентами и выводит "
+        "пропускную способность и перцентили времени ответа для каждого "
+        "адреса. Используется для сравнения WSGI- и ASGI-развертывания "
+        "с одинаковым количеством воркеров: первым передается адрес "
+        "синхронного маршрута, следующими - асинхронного."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls",
+            nargs="+",
+            help="Адреса, например http://localhost:8000/api/recipes/ "
+            "и http://localhost:8001/api/async/recipes/.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help="Количество одновременных клиентов.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=DEFAULT_REQUESTS,
+            help="Количество запросов к каждому адресу.",
+        )
+        parser.add_argument(
+            "--token",
+            help="Токен пользователя, от имени которого идут запросы.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=DEFAULT_TIMEOUT,
+            help="Таймаут одного запроса в секундах.",
+        )
+
+    def handle(self, *args, **options):
+        for option in ("concurrency", "requests"):
+            if options[option] < 1:
+                raise CommandError(f"--{option} должен быть больше 0.")
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        self.stdout.write(
+            f"{'url':<48} {'ok':>6} {'errors':>6} {'req/s':>8} "
+            f"{'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9}"
+        )
+        baseline = None
+        for url in options["urls"]:
+            result = self.measure(
+                url,
+                headers,
+                options["concurrency"],
+                options["requests"],
+                options["timeout"],
+            )
+            self.write_result(url, result)
+            if baseline is None:
+                baseline = result
+            elif baseline["throughput"]:
+                self.stdout.write(
+                    f"{'':<48} пропускная способность x"
+                    f"{result['throughput'] / baseline['throughput']:.2f} "
+                    "относительно первого адреса"
+                )
+
+    @staticmethod
+    def measure(url, headers, concurrency, count, timeout):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Прогрев: соединения клиентов и кэши сервера.
+            list(executor.map(
+                lambda _: send(url, headers, timeout), range(concurrency)
+            ))
+            start = perf_counter()
+            results = list(executor.map(
+                lambda _: send(url, headers, timeout), range(count)
+            ))
+            elapsed = perf_counter() - start
+        timings = [timing for ok, timing in results if ok]
+        errors = len(results) - len(timings)
+        if len(timings) > 1:
+            p50, p95, p99 = (
+                quantiles(timings, n=100, method="inclusive")[index]
+                for index in (49, 94, 98)
+            )
+        else:
+            p50 = p95 = p99 = timings[0] if timings else 0.0
+        return {
+            "ok": len(timings),
+            "errors": errors,
+            "throughput": len(timings) / elapsed,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+        }
+
+    def write_result(self, url, result):
+        style = (
+            self.style.ERROR if result["errors"]
+            else lambda text: text
+        )
+        self.stdout.write(style(
+            f"{url:<48} {result['ok']:>6} {result['errors']:>6} "
+            f"{result['throughput']:>8.1f} {result['p50']:>9.2f} "
+            f"{result['p95']:>9.2f} {result['p99']:>9.2f}"
+        ))
@@ -0,0 +1,86 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from api.recipe_search import search_recipes
+from recipes.models import Recipe
+
+DEFAULT_TERMS = ("суп", "обжарить", "кароми", "зушеда", "суп обжарить")
+DEFAULT_REPEAT = 5
+
+
+def search_fulltext(value, page_size):
+    queryset = search_recipes(Recipe.objects.all(), value)
+    return queryset.count(), list(queryset[:page_size])
+
+
+def search_icontains(value, page_size):
+    queryset = Recipe.objects.filter(
+        Q(name__icontains=value) | Q(text__icontains=value)
+    ).order_by("-pub_date", "-pk")
+    return queryset.count(), list(queryset[:page_size])
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает полнотекстовый поиск рецептов (параметр search) "
+        "с поиском через icontains на текущей базе: количество найденных "
+        "рецептов и время запроса первой страницы вместе с count. "
+        "Корпус для замера создает generate_test_data, например "
+        "с --recipes 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--terms",
+            nargs="+",
+            default=DEFAULT_TERMS,
+            help="Поисковые запросы: частые, редкие и из нескольких слов.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=DEFAULT_REPEAT,
+            help="Количество замеров для каждого запроса.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должен быть больше 0.")
+        self.stdout.write(
+            f"База: {connection.vendor}, рецептов: {Recipe.objects.count()}"
+        )
+        self.stdout.write(
+            f"{'term':<16} {'method':<10} {'found':>8} "
+            f"{'best, ms':>10} {'avg, ms':>10}"
+        )
+        for term in options["terms"]:
+            results = {
+                name: self.measure(method, term, options["repeat"])
+                for name, method in (
+                    ("fulltext", search_fulltext),
+                    ("icontains", search_icontains),
+                )
+            }
+            for name, (found, best, average) in results.items():
+                self.stdout.write(
+                    f"{term:<16} {name:<10} {found:>8} "
+                    f"{best:>10.1f} {average:>10.1f}"
+                )
+            if results["fulltext"][1]:
+                self.stdout.write(
+                    f"{'':<16} время icontains / fulltext: x"
+                    f"{results['icontains'][1] / results['fulltext'][1]:.1f}"
+                )
+
+    @staticmethod
+    def measure(method, term, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            found, _ = method(term, settings.REST_FRAMEWORK["PAGE_SIZE"])
+            timings.append((perf_counter() - start) * 1000)
+        return found, min(timings), sum(timings) / len(timings)
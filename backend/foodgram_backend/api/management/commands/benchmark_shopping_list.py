@@ -0,0 +1,90 @@
+import tracemalloc
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.util import (
+    ROWS_PER_PAGE,
+    SHOPPING_LIST_STREAMS,
+    start_download_shopping_cart,
+    stream_shopping_list,
+)
+
+DEFAULT_SIZES = (10, 1000, 10000)
+DEFAULT_REPEAT = 3
+FORMATS = ("pdf", *SHOPPING_LIST_STREAMS)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время генерации файла со списком покупок "
+        "и пиковое потребление памяти для корзин разного размера "
+        "в форматах PDF, txt, csv и json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=DEFAULT_SIZES,
+            help="Количество строк в списке покупок.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=DEFAULT_REPEAT,
+            help="Количество повторов для каждого размера.",
+        )
+        parser.add_argument(
+            "--formats",
+            nargs="+",
+            choices=FORMATS,
+            default=FORMATS,
+            help="Форматы файла.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'format':>6} {'lines':>8} {'pages':>6} {'best, ms':>10} "
+            f"{'avg, ms':>10} {'peak, KiB':>10} {'size, KiB':>10}"
+        )
+        for file_format in options["formats"]:
+            for size in options["sizes"]:
+                self.measure(file_format, size, options["repeat"])
+
+    def measure(self, file_format, size, repeat):
+        timings = []
+        peak = 0
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = perf_counter()
+            ingredients = self.create_ingredients(size)
+            if file_format == "pdf":
+                response = start_download_shopping_cart(ingredients)
+            else:
+                response = stream_shopping_list(ingredients, file_format)
+            content_size = sum(map(len, response.streaming_content))
+            timings.append(perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            response.close()
+        pages = "-"
+        if file_format == "pdf":
+            pages = -(-size // ROWS_PER_PAGE) or 1
+        self.stdout.write(
+            f"{file_format:>6} {size:>8} {pages:>6} "
+            f"{min(timings) * 1000:>10.1f} "
+            f"{sum(timings) / len(timings) * 1000:>10.1f} "
+            f"{peak / 1024:>10.0f} {content_size / 1024:>10.0f}"
+        )
+
+    @staticmethod
+    def create_ingredients(size):
+        for number in range(size):
+            yield {
+                "ingredient": number + 1,
+                "name": f"ингредиент {number}",
+                "measurement_unit": "г",
+                "total_amount": number + 1,
+            }
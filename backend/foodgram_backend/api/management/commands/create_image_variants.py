@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+from tqdm import tqdm
+
+from api.images import create_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает уменьшенные копии и WebP-версии изображений рецептов, "
+        "у которых их еще нет, например после перезапуска сервера, "
+        "прервавшего фоновую обработку."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать копии у всех рецептов.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").exclude(image=None)
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+        created = 0
+        for recipe in tqdm(
+            recipes.only("pk", "image_variants").iterator(),
+            total=recipes.count(),
+            desc="Image variants",
+            colour="green",
+        ):
+            obsolete = tuple(recipe.image_variants.values())
+            if create_image_variants(recipe.pk, obsolete):
+                created += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано изображений: {created}.")
+        )
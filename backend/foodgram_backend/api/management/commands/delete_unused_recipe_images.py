@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.models import RecipeImage
+
+DEFAULT_HOURS = 24
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет изображения, загруженные через /api/recipes/images/, "
+        "которые так и не были привязаны к рецепту."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=DEFAULT_HOURS,
+            help="Удалять загрузки старше указанного количества часов.",
+        )
+
+    def handle(self, *args, **options):
+        images = RecipeImage.objects.filter(
+            created__lt=timezone.now() - timedelta(hours=options["hours"])
+        )
+        deleted = 0
+        for image in images.iterator():
+            image.image.delete(save=False)
+            image.delete()
+            deleted += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Удалено изображений: {deleted}.")
+        )
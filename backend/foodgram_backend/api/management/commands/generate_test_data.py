@@ -0,0 +1,332 @@
+import random
+from itertools import accumulate, islice, product
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from api.cache import (
+    TAGS_VERSION_KEY,
+    bump_versions,
+    invalidate_all_shopping_carts,
+)
+from api.counters import recount_all
+from api.recipe_cache import invalidate_all_recipe_details
+from api.recipe_coverage import invalidate_recipe_ingredient_index
+from api.search import invalidate_ingredient_search
+from api.shopping_cart import rebuild_items
+from api.tags import update_tags_masks
+from recipes.models import (
+    TAG_BITS,
+    BaseIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingList,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_PASSWORD = "synthetic-password"
+MEASUREMENT_UNITS = ("г", "кг", "мл", "л", "шт.", "ст. л.", "ч. л.", "по вкусу")
+WORDS = (
+    "суп", "салат", "пирог", "каша", "рагу", "омлет", "паста", "плов",
+    "запеканка", "котлеты", "блины", "соус", "жаркое", "десерт", "кекс",
+)
+COOKING_WORDS = (
+    "обжарить", "нарезать", "добавить", "посолить", "перемешать", "варить",
+    "запечь", "остудить", "подавать", "взбить", "тушить", "натереть",
+    "духовка", "сковорода", "кастрюля", "тесто", "начинка", "бульон",
+    "лук", "морковь", "чеснок", "картофель", "сметана", "сыр", "масло",
+    "мука", "яйцо", "молоко", "зелень", "перец", "минут", "огонь",
+)
+SYLLABLES = ("ка", "ро", "ми", "ту", "ле", "на", "во", "зу", "ше", "да")
+# Словарь текстов рецептов: частые слова в начале, длинный хвост
+# редких синтетических слов для замеров полнотекстового поиска.
+TEXT_WORDS = WORDS + COOKING_WORDS + tuple(
+    "".join(syllables) for syllables in product(SYLLABLES, repeat=3)
+)
+
+
+def zipf_weights(size, exponent):
+    """
+    Возвращает накопленные веса распределения Ципфа для size элементов:
+    первый элемент выбирается чаще всего, популярность
+    остальных падает как 1 / rank ** exponent.
+    """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует синтетический набор данных заданного размера: "
+        "пользователей, продукты, теги, рецепты, избранное, списки "
+        "покупок и подписки. Популярность авторов, рецептов и продуктов "
+        "распределена по закону Ципфа, результат воспроизводим по --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--ingredients",
+            type=int,
+            default=2000,
+            help="Количество новых продуктов в справочнике.",
+        )
+        parser.add_argument(
+            "--tags",
+            type=int,
+            default=10,
+            help="Сколько тегов должно быть в базе.",
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe",
+            nargs=2,
+            type=int,
+            default=(3, 15),
+            metavar=("MIN", "MAX"),
+        )
+        parser.add_argument(
+            "--favorites",
+            type=int,
+            default=20,
+            help="Среднее количество рецептов в избранном у пользователя.",
+        )
+        parser.add_argument(
+            "--cart",
+            type=int,
+            default=5,
+            help="Среднее количество рецептов в списке покупок.",
+        )
+        parser.add_argument(
+            "--subscriptions",
+            type=int,
+            default=10,
+            help="Среднее количество подписок у пользователя.",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Показатель распределения Ципфа.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одном INSERT.",
+        )
+
+    def handle(self, *args, **options):
+        for option in ("users", "recipes", "tags", "batch_size"):
+            if options[option] < 1:
+                raise CommandError(
+                    f"--{option.replace('_', '-')} должен быть больше 0."
+                )
+        if options["tags"] > TAG_BITS:
+            raise CommandError(f"--tags должен быть не больше {TAG_BITS}.")
+        low, high = options["ingredients_per_recipe"]
+        if not 1 <= low <= high:
+            raise CommandError(
+                "--ingredients-per-recipe: нужно 1 <= MIN <= MAX."
+            )
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.skew = options["skew"]
+        start = perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options["users"])
+            base_ids = self.create_base_ingredients(options["ingredients"])
+            if len(base_ids) < high:
+                raise CommandError(
+                    "В справочнике меньше продуктов, чем "
+                    "--ingredients-per-recipe MAX."
+                )
+            tag_ids = self.create_tags(options["tags"])
+            recipe_ids = self.create_recipes(
+                options["recipes"], user_ids, base_ids, tag_ids, low, high
+            )
+            self.create_user_relations(
+                Favorite, options["favorites"], user_ids, recipe_ids
+            )
+            self.create_user_relations(
+                ShoppingList, options["cart"], user_ids, recipe_ids
+            )
+            self.create_subscriptions(options["subscriptions"], user_ids)
+            recount_all()
+            rebuild_items()
+            update_tags_masks(recipe_ids)
+        invalidate_ingredient_search()
+        invalidate_all_shopping_carts()
+        invalidate_all_recipe_details()
+        invalidate_recipe_ingredient_index()
+        bump_versions((TAGS_VERSION_KEY,))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово за {perf_counter() - start:.1f} с. "
+                f"Пароль пользователей: {DEFAULT_PASSWORD}."
+            )
+        )
+
+    def bulk_create(self, model, objects):
+        """
+        Сохраняет объекты пачками по batch_size и возвращает их количество.
+        """
+        objects = iter(objects)
+        total = 0
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {total}")
+        return total
+
+    @staticmethod
+    def get_new_ids(model, last_id):
+        return list(
+            model.objects.filter(pk__gt=last_id or 0)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def choose(self, population, cum_weights, size):
+        """
+        Выбирает size разных элементов с учетом весов. Повторы
+        добираются равномерно, чтобы не ждать выпадения редких элементов.
+        """
+        if size >= len(population):
+            return set(population)
+        chosen = set(self.random.choices(
+            population, cum_weights=cum_weights, k=size
+        ))
+        while len(chosen) < size:
+            chosen.add(self.random.choice(population))
+        return chosen
+
+    def create_users(self, count):
+        last_id = User.objects.aggregate(last=Max("pk"))["last"] or 0
+        password = make_password(DEFAULT_PASSWORD)
+        self.bulk_create(User, (
+            User(
+                username=f"synthetic{number}",
+                email=f"synthetic{number}@example.com",
+                first_name=f"Имя {number}",
+                last_name=f"Фамилия {number}",
+                password=password,
+            )
+            for number in range(last_id + 1, last_id + count + 1)
+        ))
+        return self.get_new_ids(User, last_id)
+
+    def create_base_ingredients(self, count):
+        last_id = BaseIngredient.objects.aggregate(last=Max("pk"))["last"]
+        self.bulk_create(BaseIngredient, (
+            BaseIngredient(
+                name=f"продукт {number}",
+                measurement_unit=self.random.choice(MEASUREMENT_UNITS),
+            )
+            for number in range((last_id or 0) + 1, (last_id or 0) + count + 1)
+        ))
+        return list(
+            BaseIngredient.objects.order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def create_tags(self, count):
+        last_id = Tag.objects.aggregate(last=Max("pk"))["last"] or 0
+        existing = Tag.objects.count()
+        used_bits = set(Tag.objects.values_list("bit", flat=True))
+        free_bits = [bit for bit in range(TAG_BITS) if bit not in used_bits]
+        self.bulk_create(Tag, (
+            Tag(
+                name=f"тег {number}",
+                slug=f"tag-{number}",
+                color=f"#{self.random.randrange(0x1000000):06X}",
+                bit=bit,
+            )
+            for number, bit in zip(
+                range(last_id + 1, last_id + count - existing + 1),
+                free_bits,
+            )
+        ))
+        return list(Tag.objects.order_by("pk").values_list("pk", flat=True))
+
+    def create_recipes(self, count, user_ids, base_ids, tag_ids, low, high):
+        last_id = Recipe.objects.aggregate(last=Max("pk"))["last"]
+        author_weights = zipf_weights(len(user_ids), self.skew)
+        text_weights = zipf_weights(len(TEXT_WORDS), self.skew)
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f"{self.random.choice(WORDS)} {number}"[:32],
+                text=" ".join(self.random.choices(
+                    TEXT_WORDS, cum_weights=text_weights, k=40
+                )),
+                cooking_time=self.random.randint(5, 180),
+                image="recipes/image/synthetic.png",
+            )
+            for number, author_id in enumerate(self.random.choices(
+                user_ids, cum_weights=author_weights, k=count
+            ))
+        ))
+        recipe_ids = self.get_new_ids(Recipe, last_id)
+        base_weights = zipf_weights(len(base_ids), self.skew)
+        self.bulk_create(Ingredient, (
+            Ingredient(
+                ingredient_id=base_id,
+                to_recipe_id=recipe_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for base_id in self.choose(
+                base_ids, base_weights, self.random.randint(low, high)
+            )
+        ))
+        tag_weights = zipf_weights(len(tag_ids), self.skew)
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.choose(
+                tag_ids,
+                tag_weights,
+                self.random.randint(1, min(3, len(tag_ids))),
+            )
+        ))
+        return recipe_ids
+
+    def get_relation_sizes(self, average, user_ids, limit):
+        """
+        Возвращает количество связей для каждого пользователя:
+        большинство пользователей почти неактивны, немногие - очень.
+        """
+        for user_id in user_ids:
+            size = int(self.random.expovariate(1 / average)) if average else 0
+            yield user_id, min(size, limit)
+
+    def create_user_relations(self, model, average, user_ids, recipe_ids):
+        recipe_weights = zipf_weights(len(recipe_ids), self.skew)
+        self.bulk_create(model, (
+            model(subscriber_id=user_id, subscribed_recipe_id=recipe_id)
+            for user_id, size in self.get_relation_sizes(
+                average, user_ids, len(recipe_ids)
+            )
+            for recipe_id in self.choose(recipe_ids, recipe_weights, size)
+        ))
+
+    def create_subscriptions(self, average, user_ids):
+        author_weights = zipf_weights(len(user_ids), self.skew)
+        self.bulk_create(Subscription, (
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id, size in self.get_relation_sizes(
+                average, user_ids, len(user_ids) - 1
+            )
+            for author_id in self.choose(user_ids, author_weights, size)
+            if author_id != user_id
+        ))
@@ -1,19 +1,116 @@
+import json
+import os
 from csv import DictReader
+from itertools import islice
+from time import perf_counter
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 from tqdm import tqdm
 
+from api.cache import invalidate_all_shopping_carts
+from api.recipe_cache import invalidate_all_recipe_details
+from api.search import invalidate_ingredient_search
 from recipes.models import BaseIngredient
 
+DEFAULT_FILE = "data/ingredients.csv"
+DEFAULT_BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
+    help = (
+        "Загружает продукты из CSV или JSON файла пачками "
+        "в одной транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=DEFAULT_FILE,
+            help="Путь к файлу .csv или .json с полями "
+            "name и measurement_unit.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одном INSERT.",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Обновлять единицу измерения у уже существующих продуктов.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше 0.")
+        progress = tqdm(
+            self.read_rows(options["file"]),
+            desc="Upload ingredients",
+            colour="green",
+        )
+        rows = iter(progress)
+        total = 0
+        count_before = BaseIngredient.objects.count()
+        start = perf_counter()
+        with transaction.atomic():
+            while batch := list(islice(rows, batch_size)):
+                self.save_batch(batch, options["update"])
+                total += len(batch)
+        duration = perf_counter() - start
+        progress.close()
+        invalidate_ingredient_search()
+        if options["update"]:
+            invalidate_all_shopping_carts()
+            invalidate_all_recipe_details()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано строк: {total}, добавлено продуктов: "
+                f"{BaseIngredient.objects.count() - count_before}, "
+                f"{total / duration if duration else total:.0f} строк/с."
+            )
+        )
+
+    @staticmethod
+    def read_rows(path):
+        """
+        Возвращает генератор строк файла. CSV читается построчно,
+        JSON должен содержать список объектов.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in (".csv", ".json"):
+            raise CommandError(
+                f"Неподдерживаемый формат файла: {extension or path}."
+            )
+        with open(path, encoding="utf-8") as file:
+            if extension == ".csv":
+                yield from DictReader(file)
+            else:
+                yield from json.load(file)
 
-    def handle(self, *args, **kwargs):
-        with open("data/ingredients.csv", encoding="utf-8") as file:
-            rows = list(DictReader(file))
-        for row in tqdm(rows, desc="Upload ingredients", colour="green"):
-            name = row.get("name")
-            BaseIngredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=row.get("measurement_unit"),
-                )
+    @staticmethod
+    def save_batch(batch, update=False):
+        """
+        Сохраняет пачку продуктов одним запросом. Повторяющиеся
+        названия внутри пачки схлопываются, последняя строка побеждает.
+        """
+        ingredients = {
+            row.get("name"): BaseIngredient(
+                name=row.get("name"),
+                measurement_unit=row.get("measurement_unit"),
+            )
+            for row in batch
+        }
+        if update:
+            BaseIngredient.objects.bulk_create(
+                ingredients.values(),
+                update_conflicts=True,
+                unique_fields=("name",),
+                update_fields=("measurement_unit",),
+            )
+        else:
+            BaseIngredient.objects.bulk_create(
+                ingredients.values(), ignore_conflicts=True
+            )
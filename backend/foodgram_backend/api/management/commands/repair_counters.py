@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from api.counters import recount_all
+from api.shopping_cart import rebuild_items
+from api.tags import update_tags_masks
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счетчики избранного, списков покупок, рецептов "
+        "и подписчиков, пересобирает строки списков покупок и маски "
+        "тегов рецептов по фактическим данным. Нужна после массовых "
+        "операций в обход сигналов, например bulk_create или loaddata."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount_all()
+            items = rebuild_items()
+            masks = update_tags_masks()
+        for counter, rows in fixed.items():
+            self.stdout.write(f"{counter}: исправлено строк {rows}")
+        self.stdout.write(f"Строк списков покупок: {items}")
+        self.stdout.write(f"Масок тегов рецептов: {masks}")
+        self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны."))
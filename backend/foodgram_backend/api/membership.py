@@ -0,0 +1,130 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from recipes.models import Favorite, ShoppingList
+
+FAVORITES = "favorites"
+SHOPPING_CART = "shopping_cart"
+MEMBERSHIP_MODELS = {
+    FAVORITES: Favorite,
+    SHOPPING_CART: ShoppingList,
+}
+MEMBERSHIP_VERSION_KEY = "membership_version:{kind}:{user_id}"
+MEMBERSHIP_KEY = "membership:{kind}:{user_id}:{version}"
+
+
+def get_membership_cache():
+    return caches[settings.MEMBERSHIP_CACHE_ALIAS]
+
+
+def get_recipe_ids(user_id, kind):
+    """
+    Возвращает множество id рецептов из избранного или списка покупок
+    пользователя. Множество хранится в кэше под текущей версией
+    и загружается из БД одним запросом, только если его там нет.
+    """
+    cache = get_membership_cache()
+    version = cache.get_or_set(
+        MEMBERSHIP_VERSION_KEY.format(kind=kind, user_id=user_id),
+        uuid4().hex,
+        timeout=None,
+    )
+    key = MEMBERSHIP_KEY.format(kind=kind, user_id=user_id, version=version)
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        recipe_ids = frozenset(
+            MEMBERSHIP_MODELS[kind].objects.filter(
+                subscriber_id=user_id
+            ).values_list("subscribed_recipe_id", flat=True)
+        )
+        cache.set(key, recipe_ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+async def aget_recipe_ids(user_id, kind):
+    """
+    Асинхронный вариант get_recipe_ids с теми же ключами кэша.
+    """
+    cache = get_membership_cache()
+    version = await cache.aget_or_set(
+        MEMBERSHIP_VERSION_KEY.format(kind=kind, user_id=user_id),
+        uuid4().hex,
+        timeout=None,
+    )
+    key = MEMBERSHIP_KEY.format(kind=kind, user_id=user_id, version=version)
+    recipe_ids = await cache.aget(key)
+    if recipe_ids is None:
+        recipe_ids = frozenset([
+            recipe_id
+            async for recipe_id in MEMBERSHIP_MODELS[kind].objects.filter(
+                subscriber_id=user_id
+            ).values_list("subscribed_recipe_id", flat=True)
+        ])
+        await cache.aset(key, recipe_ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def invalidate_membership(user_id, kind):
+    """
+    Сбрасывает версию множества после фиксации транзакции.
+
+    Множество не правится на месте: при одновременных добавлениях
+    и удалениях чтение-изменение-запись в кэше теряло бы изменения.
+    Читатель, загрузивший данные до фиксации, сохраняет их под старой
+    версией, поэтому устаревшее множество после сброса не читается.
+    """
+    key = MEMBERSHIP_VERSION_KEY.format(kind=kind, user_id=user_id)
+    transaction.on_commit(lambda: get_membership_cache().delete(key))
+
+
+class RecipeMembership:
+    """
+    Избранное и список покупок пользователя в виде множеств id
+    рецептов. Множества загружаются при первом обращении, поэтому
+    флаги is_favorited и is_in_shopping_cart любого количества
+    рецептов стоят не больше одного обращения к кэшу на множество.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_recipe_ids(self, kind):
+        if self.user.is_anonymous:
+            return frozenset()
+        return get_recipe_ids(self.user.id, kind)
+
+    async def aload(self):
+        """
+        Заранее загружает оба множества, чтобы сериализаторы
+        в асинхронном представлении не обращались к кэшу и БД.
+        """
+        if self.user.is_anonymous:
+            self.favorites = self.shopping_cart = frozenset()
+        else:
+            self.favorites = await aget_recipe_ids(self.user.id, FAVORITES)
+            self.shopping_cart = await aget_recipe_ids(
+                self.user.id, SHOPPING_CART
+            )
+        return self
+
+    @cached_property
+    def favorites(self):
+        return self.get_recipe_ids(FAVORITES)
+
+    @cached_property
+    def shopping_cart(self):
+        return self.get_recipe_ids(SHOPPING_CART)
+
+
+def get_membership(context):
+    """
+    Возвращает RecipeMembership текущего пользователя, общий
+    для всех сериализаторов с этим контекстом.
+    """
+    if "membership" not in context:
+        context["membership"] = RecipeMembership(context["request"].user)
+    return context["membership"]
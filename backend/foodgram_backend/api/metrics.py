@@ -0,0 +1,208 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+current_request_metrics = ContextVar("current_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса, которые накапливаются во время
+    его обработки: количество и время запросов к БД
+    и время сериализации ответа.
+    """
+
+    __slots__ = (
+        "queries",
+        "db_duration",
+        "serialization_duration",
+        "serialization_depth",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_duration = 0.0
+        self.serialization_duration = 0.0
+        self.serialization_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_duration += perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка запросов к БД, которая устанавливается на каждое
+    соединение при его создании. Запросы учитываются в метриках
+    запроса, который обрабатывается в текущем контексте. Контекст
+    переходит в sync_to_async, поэтому учитываются и запросы
+    асинхронных представлений, выполненные в потоке.
+    """
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus с набором меток.
+    """
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.sums = defaultdict(float)
+
+    def observe(self, labels, value):
+        self.values[labels][bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, counts in sorted(self.values.items()):
+            label_text = format_labels(labels)
+            total = 0
+            for bucket, count in zip((*self.buckets, "+Inf"), counts):
+                total += count
+                yield (
+                    f"{self.name}_bucket{{{label_text},le=\"{bucket}\"}} "
+                    f"{total}"
+                )
+            yield f"{self.name}_sum{{{label_text}}} {self.sums[labels]}"
+            yield f"{self.name}_count{{{label_text}}} {total}"
+
+
+class Counter:
+    """
+    Счетчик в формате Prometheus с набором меток.
+    """
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = defaultdict(int)
+
+    def inc(self, labels):
+        self.values[labels] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{{{format_labels(labels)}}} {value}"
+
+
+def format_labels(labels):
+    return ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in labels
+    )
+
+
+def escape_label(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+class MetricsRegistry:
+    """
+    Хранилище метрик процесса. Каждый воркер отдает свои значения,
+    суммирование между воркерами выполняет Prometheus.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = Counter(
+            "foodgram_requests_total",
+            "Количество обработанных запросов.",
+        )
+        self.request_duration = Histogram(
+            "foodgram_request_duration_seconds",
+            "Время обработки запроса.",
+            DURATION_BUCKETS,
+        )
+        self.db_queries = Histogram(
+            "foodgram_db_queries",
+            "Количество запросов к БД за один запрос.",
+            QUERIES_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            "foodgram_db_duration_seconds",
+            "Время выполнения запросов к БД за один запрос.",
+            DURATION_BUCKETS,
+        )
+        self.serialization_duration = Histogram(
+            "foodgram_serialization_duration_seconds",
+            "Время сериализации ответа.",
+            DURATION_BUCKETS,
+        )
+
+    def observe(self, view, method, status, duration, metrics):
+        labels = (("view", view), ("method", method))
+        with self.lock:
+            self.requests.inc((*labels, ("status", status)))
+            self.request_duration.observe(labels, duration)
+            self.db_queries.observe(labels, metrics.queries)
+            self.db_duration.observe(labels, metrics.db_duration)
+            self.serialization_duration.observe(
+                labels, metrics.serialization_duration
+            )
+
+    def render(self):
+        with self.lock:
+            lines = [
+                line
+                for metric in (
+                    self.requests,
+                    self.request_duration,
+                    self.db_queries,
+                    self.db_duration,
+                    self.serialization_duration,
+                )
+                for line in metric.render()
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Добавляет время выполнения блока к времени сериализации
+    текущего запроса. Вложенные блоки, например вложенные
+    сериализаторы или рендеринг внутри замера, учитываются
+    один раз - во внешнем блоке.
+    """
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        yield
+        return
+    metrics.serialization_depth += 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_depth -= 1
+        if not metrics.serialization_depth:
+            metrics.serialization_duration += perf_counter() - start
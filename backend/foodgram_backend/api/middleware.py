@@ -0,0 +1,127 @@
+from time import perf_counter
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import RequestMetrics, current_request_metrics, registry
+from .replicas import (
+    RequestRouting,
+    current_request_routing,
+    get_user_id,
+    stick_to_primary,
+)
+
+UNRESOLVED_VIEW = "unresolved"
+
+
+class MetricsMiddleware:
+    """
+    Собирает для каждого представления и HTTP-метода время ответа,
+    количество и время запросов к БД и время сериализации.
+    Метрики доступны в формате Prometheus по адресу /api/metrics.
+
+    Запросы к БД учитывает обертка api.metrics.record_query, поэтому
+    middleware работает и под WSGI, и под ASGI без перехода
+    асинхронной цепочки обработчиков в синхронный поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.observe(request, response, metrics, start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.observe(request, response, metrics, start)
+        return response
+
+    @staticmethod
+    def observe(request, response, metrics, start):
+        resolver_match = request.resolver_match
+        registry.observe(
+            resolver_match.view_name if resolver_match else UNRESOLVED_VIEW,
+            request.method,
+            response.status_code,
+            perf_counter() - start,
+            metrics,
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Задает для запроса правила чтения api.replicas.ReplicaRouter
+    и после запроса, который записывал в БД, закрепляет чтение
+    пользователя за основной БД. Без настроенных реплик
+    не подключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request)
+        token = current_request_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_routing.reset(token)
+        self.stick(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request)
+        token = current_request_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_routing.reset(token)
+        if routing.written:
+            await sync_to_async(self.stick)(request, routing)
+        return response
+
+    @staticmethod
+    def stick(request, routing):
+        """
+        Пользователь определяется после ответа: DRF к этому моменту
+        заменил request.user на пользователя из токена.
+        """
+        if routing.written:
+            user_id = get_user_id(request)
+            if user_id is not None:
+                stick_to_primary(user_id)
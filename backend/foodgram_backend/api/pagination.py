@@ -0,0 +1,119 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_FORWARD = "n"
+CURSOR_BACKWARD = "p"
+
+
+class RecipeKeysetPagination(BasePagination):
+    """
+    Пагинация ленты рецептов по курсору (pub_date, id).
+
+    Вместо COUNT(*) и OFFSET каждая страница выбирается условием
+    "строго раньше последнего показанного рецепта" по индексу pub_date,
+    поэтому стоимость запроса не зависит от глубины страницы, а новые
+    рецепты не сдвигают уже показанные страницы. Ответ не содержит count.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        direction, pub_date, pk = self.decode_cursor(request)
+        if direction == CURSOR_BACKWARD:
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).order_by("pub_date", "pk")
+        else:
+            queryset = queryset.order_by("-pub_date", "-pk")
+            if pub_date is not None:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                )
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if direction == CURSOR_BACKWARD:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = pub_date is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return CURSOR_FORWARD, None, None
+        try:
+            direction, pub_date, pk = (
+                urlsafe_b64decode(encoded.encode()).decode().split("|")
+            )
+            if direction not in (CURSOR_FORWARD, CURSOR_BACKWARD):
+                raise ValueError
+            return direction, datetime.fromisoformat(pub_date), int(pk)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, direction, recipe):
+        cursor = f"{direction}|{recipe.pub_date.isoformat()}|{recipe.pk}"
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(CURSOR_FORWARD, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(CURSOR_BACKWARD, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        )))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -43,3 +44,21 @@ class IsAdminOrReadOnlyPermission(permissions.BasePermission):
             request.method in permissions.SAFE_METHODS
             or self.is_admin
         )
+
+
+class MetricsPermission(permissions.BasePermission):
+    """
+    Разрешает просмотр метрик администраторам и запросам
+    с адресов из METRICS_ALLOWED_IPS. Адрес проверяется по REMOTE_ADDR,
+    поэтому за прокси он совпадает с адресом прокси: nginx закрывает
+    /api/metrics снаружи, а Prometheus обращается к web напрямую.
+    """
+
+    message = "Метрики доступны только администратору."
+
+    def has_permission(self, request, view):
+        return (
+            request.user.is_staff
+            or request.META.get("REMOTE_ADDR")
+            in settings.METRICS_ALLOWED_IPS
+        )
@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import aget_version, get_version, invalidate_versions
+from recipes.models import Recipe
+from users.models import Subscription
+
+RECIPE_DETAILS_GENERATION_KEY = "recipe_details_generation"
+RECIPE_VERSION_KEY = "recipe_version:{recipe_id}"
+RECIPE_DETAIL_KEY = "recipe_detail:{recipe_id}:{version}:{base_url}"
+USER_FIELDS = ("is_favorited", "is_in_shopping_cart")
+AUTHOR_USER_FIELDS = ("is_subscribed",)
+
+
+def get_version_keys(recipe_id):
+    return (
+        RECIPE_DETAILS_GENERATION_KEY,
+        RECIPE_VERSION_KEY.format(recipe_id=recipe_id),
+    )
+
+
+def join_versions(keys, versions):
+    return ":".join(versions[key] for key in keys)
+
+
+def get_recipe_detail_key(recipe_id, request):
+    """
+    Возвращает ключ кэша рецепта. Ключ включает общую версию
+    (меняется при изменении тегов и справочника продуктов) и версию
+    рецепта (меняется при изменении рецепта, его ингредиентов, тегов
+    и автора). Обе версии читаются одним обращением к кэшу.
+    """
+    keys = get_version_keys(recipe_id)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = get_version(key)
+    return RECIPE_DETAIL_KEY.format(
+        recipe_id=recipe_id,
+        version=join_versions(keys, versions),
+        base_url=request.build_absolute_uri("/"),
+    )
+
+
+async def aget_recipe_detail_key(recipe_id, request):
+    """
+    Асинхронный вариант get_recipe_detail_key.
+    """
+    keys = get_version_keys(recipe_id)
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = await aget_version(key)
+    return RECIPE_DETAIL_KEY.format(
+        recipe_id=recipe_id,
+        version=join_versions(keys, versions),
+        base_url=request.build_absolute_uri("/"),
+    )
+
+
+def get_shared_data(data):
+    """
+    Возвращает копию ответа RecipeSerializer без полей, зависящих
+    от пользователя. Поля остаются на своих местах со значением None,
+    чтобы порядок ключей в ответе из кэша не менялся.
+    """
+    shared = {**data, **dict.fromkeys(USER_FIELDS)}
+    shared["author"] = {
+        **data["author"], **dict.fromkeys(AUTHOR_USER_FIELDS)
+    }
+    return shared
+
+
+def get_cached_recipe_detail(key):
+    return cache.get(key)
+
+
+async def aget_cached_recipe_detail(key):
+    return await cache.aget(key)
+
+
+def cache_recipe_detail(key, data):
+    cache.set(
+        key, get_shared_data(data), settings.RECIPE_DETAIL_CACHE_TIMEOUT
+    )
+
+
+async def acache_recipe_detail(key, data):
+    await cache.aset(
+        key, get_shared_data(data), settings.RECIPE_DETAIL_CACHE_TIMEOUT
+    )
+
+
+def add_user_fields(data, membership, is_subscribed):
+    """
+    Дополняет закэшированный рецепт флагами текущего пользователя.
+    """
+    data = {
+        **data,
+        "is_favorited": data["id"] in membership.favorites,
+        "is_in_shopping_cart": data["id"] in membership.shopping_cart,
+    }
+    data["author"] = {**data["author"], "is_subscribed": is_subscribed}
+    return data
+
+
+def get_subscriptions(user, author_id):
+    return Subscription.objects.filter(user=user, author_id=author_id)
+
+
+def is_subscribed(user, author_id):
+    if user.is_anonymous:
+        return False
+    return get_subscriptions(user, author_id).exists()
+
+
+async def ais_subscribed(user, author_id):
+    if user.is_anonymous:
+        return False
+    return await get_subscriptions(user, author_id).aexists()
+
+
+def invalidate_recipe_details(recipe_ids):
+    """
+    Сбрасывает версии переданных рецептов.
+    """
+    invalidate_versions(
+        RECIPE_VERSION_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    )
+
+
+def invalidate_author_recipe_details(author_id):
+    """
+    Сбрасывает версии всех рецептов автора.
+    """
+    invalidate_recipe_details(
+        Recipe.objects.filter(author_id=author_id).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def invalidate_all_recipe_details():
+    """
+    Сбрасывает общую версию рецептов. Используется при изменении
+    тегов и справочника продуктов, которые входят во многие рецепты.
+    """
+    invalidate_versions((RECIPE_DETAILS_GENERATION_KEY,))
@@ -0,0 +1,342 @@
+from array import array
+from collections import defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .replicas import read_from_primary
+from recipes.models import Ingredient
+
+RECIPE_INGREDIENTS_SEQUENCE_KEY = "recipe_ingredients_sequence"
+RECIPE_INGREDIENTS_CHANGE_KEY = "recipe_ingredients_change:{number}"
+CHANGE_LOG_SIZE = 1000
+CHANGE_LOG_TIMEOUT = 60 * 60
+REBUILD_BATCH_SIZE = 10000
+
+
+def get_sequence():
+    """
+    Возвращает номер последнего изменения ингредиентов рецептов.
+    Отсутствующий номер создается заново со значением 0, это
+    заставляет индексы процессов перестроиться полностью. None
+    означает, что кэш не хранит значения.
+    """
+    sequence = cache.get(RECIPE_INGREDIENTS_SEQUENCE_KEY)
+    if sequence is None:
+        cache.add(RECIPE_INGREDIENTS_SEQUENCE_KEY, 0, timeout=None)
+        sequence = cache.get(RECIPE_INGREDIENTS_SEQUENCE_KEY)
+    return sequence
+
+
+def next_sequence(step=1):
+    get_sequence()
+    try:
+        return cache.incr(RECIPE_INGREDIENTS_SEQUENCE_KEY, step)
+    except ValueError:
+        return None
+
+
+def get_mask(recipe_ids):
+    """
+    Возвращает битовую маску, в которой установлены биты
+    с номерами из recipe_ids.
+    """
+    if not recipe_ids:
+        return 0
+    bits = bytearray(max(recipe_ids) // 8 + 1)
+    for recipe_id in recipe_ids:
+        bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def get_products(rows):
+    """
+    Группирует строки (id рецепта, id продукта), упорядоченные по
+    рецепту, в id рецептов каждого продукта и id рецептов с каждым
+    числом различных продуктов.
+    """
+    recipes = defaultdict(lambda: array("L"))
+    sizes = defaultdict(lambda: array("L"))
+    current, products = None, set()
+    for recipe_id, product_id in rows:
+        if recipe_id != current:
+            if products:
+                sizes[len(products)].append(current)
+            current, products = recipe_id, set()
+        products.add(product_id)
+        recipes[product_id].append(recipe_id)
+    if products:
+        sizes[len(products)].append(current)
+    return recipes, sizes
+
+
+def add_to_counter(slices, mask):
+    """
+    Прибавляет единицу к счетчикам рецептов из mask. Счетчики всех
+    рецептов хранятся поразрядно: slices[i] - маска рецептов,
+    у которых i-й бит счетчика равен единице.
+    """
+    for position, bits in enumerate(slices):
+        slices[position] = bits ^ mask
+        mask &= bits
+        if not mask:
+            return
+    slices.append(mask)
+
+
+def get_equal_mask(slices, value):
+    """
+    Возвращает маску рецептов, счетчик которых равен value.
+    Результат нужно пересечь с маской рецептов: биты за пределами
+    счетчиков в нем установлены.
+    """
+    mask = -1
+    for position, bits in enumerate(slices):
+        mask &= bits if value >> position & 1 else ~bits
+    return mask
+
+
+def get_highest_bits(mask, skip, limit):
+    """
+    Возвращает номера не более чем limit старших установленных битов
+    mask после пропуска skip старших битов. Граница пропуска
+    находится двоичным поиском по числу битов старше сдвига.
+    """
+    if skip:
+        low, high = 0, mask.bit_length()
+        while low < high:
+            shift = (low + high + 1) // 2
+            if (mask >> shift).bit_count() >= skip:
+                low = shift
+            else:
+                high = shift - 1
+        mask &= (1 << low) - 1
+    found = []
+    while mask and len(found) < limit:
+        position = mask.bit_length() - 1
+        found.append(position)
+        mask ^= 1 << position
+    return found
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс продукт -> рецепты в памяти процесса.
+
+    Рецепты каждого продукта хранятся битовой маской, в которой номер
+    бита равен id рецепта, а рецепты с одинаковым числом различных
+    продуктов - отдельными масками. Поэтому подсчет совпадений для
+    всех рецептов сводится к нескольким побитовым операциям
+    над масками, а не к перебору рецептов в Python.
+
+    Изменения рецептов записываются в журнал в кэше под
+    последовательными номерами. Индекс хранит номер последнего
+    примененного изменения и догружает из БД только рецепты из новых
+    записей журнала. Если записи журнала вытеснены или их слишком
+    много, индекс перестраивается целиком. Маски не изменяются
+    на месте, новое состояние подменяется целиком, поэтому поиск
+    читает индекс без блокировки.
+    """
+
+    def __init__(self):
+        self.sequence = None
+        self.state = ({}, {})
+        self.lock = Lock()
+
+    def refresh(self):
+        sequence = get_sequence()
+        if sequence is not None and sequence == self.sequence:
+            return
+        with self.lock, read_from_primary():
+            if sequence is not None and sequence == self.sequence:
+                return
+            if (
+                sequence is None
+                or self.sequence is None
+                or not 0 < sequence - self.sequence <= CHANGE_LOG_SIZE
+                or not self.apply_changes(self.sequence + 1, sequence)
+            ):
+                self.rebuild()
+            self.sequence = sequence
+
+    def rebuild(self):
+        recipes, sizes = get_products(
+            Ingredient.objects.filter(to_recipe__isnull=False)
+            .values_list("to_recipe_id", "ingredient_id")
+            .order_by("to_recipe_id")
+            .iterator(chunk_size=REBUILD_BATCH_SIZE)
+        )
+        self.state = (
+            {
+                product_id: get_mask(recipe_ids)
+                for product_id, recipe_ids in recipes.items()
+            },
+            {
+                size: get_mask(recipe_ids)
+                for size, recipe_ids in sizes.items()
+            },
+        )
+
+    def apply_changes(self, first, last):
+        """
+        Применяет записи журнала с номерами от first до last.
+        Возвращает False, если какой-то записи в кэше нет.
+        """
+        keys = [
+            RECIPE_INGREDIENTS_CHANGE_KEY.format(number=number)
+            for number in range(first, last + 1)
+        ]
+        entries = cache.get_many(keys)
+        if len(entries) != len(keys):
+            return False
+        self.update_recipes(set().union(*entries.values()))
+        return True
+
+    def update_recipes(self, recipe_ids):
+        """
+        Перечитывает продукты переданных рецептов из БД и заменяет
+        их биты во всех масках. Повторное применение изменения ничего
+        не меняет, поэтому запись журнала, попавшая в индекс
+        при полной перестройке, не мешает.
+        """
+        recipes, sizes = get_products(
+            Ingredient.objects.filter(to_recipe__in=recipe_ids)
+            .values_list("to_recipe_id", "ingredient_id")
+            .order_by("to_recipe_id")
+        )
+        keep = ~get_mask(recipe_ids)
+        masks, size_masks = self.state
+        self.state = tuple(
+            {
+                key: (old.get(key, 0) & keep) | get_mask(new.get(key, ()))
+                for key in old.keys() | new.keys()
+            }
+            for old, new in ((masks, recipes), (size_masks, sizes))
+        )
+
+    def search(self, include, exclude=(), min_coverage=0):
+        """
+        Возвращает уровни результата (доля продуктов рецепта
+        из include, число недостающих продуктов со знаком минус, число
+        продуктов из include, число продуктов рецепта, маска рецептов,
+        количество рецептов), упорядоченные от лучшего к худшему.
+        """
+        self.refresh()
+        masks, size_masks = self.state
+        include = [masks[pk] for pk in set(include) if pk in masks]
+        excluded = 0
+        for pk in set(exclude):
+            excluded |= masks.get(pk, 0)
+        slices = []
+        found = 0
+        for mask in include:
+            add_to_counter(slices, mask)
+            found |= mask
+        found &= ~excluded
+        equal_masks = {}
+        levels = []
+        for total, size_mask in size_masks.items():
+            candidates = found & size_mask
+            if not candidates:
+                continue
+            for count in range(1, min(total, len(include)) + 1):
+                coverage = count / total
+                if coverage < min_coverage:
+                    continue
+                if count not in equal_masks:
+                    equal_masks[count] = get_equal_mask(slices, count)
+                mask = candidates & equal_masks[count]
+                if mask:
+                    levels.append((
+                        coverage,
+                        count - total,
+                        count,
+                        total,
+                        mask,
+                        mask.bit_count(),
+                    ))
+        levels.sort(key=lambda level: level[:3], reverse=True)
+        return levels
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+class RecipeCoverage:
+    """
+    Результат поиска рецептов по продуктам для Paginator: элементы -
+    (id рецепта, доля имеющихся продуктов, число имеющихся продуктов,
+    число продуктов рецепта). Внутри уровня с одинаковой долей
+    рецепты идут от новых к старым. Номера рецептов извлекаются
+    из масок только для запрошенной страницы.
+    """
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    def __len__(self):
+        return sum(level[-1] for level in self.levels)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        limit = stop - start
+        found = []
+        for coverage, _, count, total, mask, size in self.levels:
+            if len(found) >= limit:
+                break
+            if start >= size:
+                start -= size
+                continue
+            found.extend(
+                (recipe_id, coverage, count, total)
+                for recipe_id in get_highest_bits(
+                    mask, start, limit - len(found)
+                )
+            )
+            start = 0
+        return found
+
+
+def log_recipe_changes(recipe_ids):
+    number = next_sequence()
+    if number is not None:
+        cache.set(
+            RECIPE_INGREDIENTS_CHANGE_KEY.format(number=number),
+            recipe_ids,
+            CHANGE_LOG_TIMEOUT,
+        )
+
+
+def invalidate_recipe_ingredients(recipe_ids):
+    """
+    Записывает изменение продуктов переданных рецептов в журнал
+    после фиксации транзакции, чтобы индексы процессов перечитали
+    из БД уже зафиксированные данные.
+    """
+    recipe_ids = frozenset(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: log_recipe_changes(recipe_ids))
+
+
+def invalidate_recipe_ingredient_index():
+    """
+    Заставляет индексы всех процессов перестроиться полностью.
+    Используется после массовой загрузки рецептов в обход сигналов.
+    """
+    transaction.on_commit(lambda: next_sequence(CHANGE_LOG_SIZE + 1))
+
+
+def get_recipe_coverage(ingredients, exclude=(), min_coverage=0):
+    """
+    Возвращает рецепты, в которых есть хотя бы один продукт
+    из ingredients и нет ни одного из exclude, с долей имеющихся
+    продуктов рецепта (coverage) не меньше min_coverage.
+    Сначала идут рецепты с большей долей, затем с меньшим числом
+    недостающих продуктов, затем с большим числом имеющихся.
+    """
+    return RecipeCoverage(
+        recipe_ingredient_index.search(ingredients, exclude, min_coverage)
+    )
@@ -0,0 +1,88 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = "pg_catalog.russian"
+FTS_TABLE = "recipes_recipe_fts"
+FTS_NAME_WEIGHT = 10.0
+FTS_TEXT_WEIGHT = 1.0
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def get_fts_query(value):
+    """
+    Преобразует строку пользователя в запрос FTS5: каждое слово
+    берется в кавычки, чтобы операторы FTS5 в нем не разбирались,
+    и ищется как префикс, что отчасти заменяет отсутствующий
+    в SQLite русский стеммер.
+    """
+    return " ".join(
+        f'"{word}"*' for word in WORD_PATTERN.findall(value.lower())
+    )
+
+
+def search_postgresql(queryset, value):
+    table = queryset.model._meta.db_table
+    query = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    return queryset.filter(
+        RawSQL(
+            f"{table}.search_vector @@ {query}",
+            (value,),
+            output_field=BooleanField(),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f"ts_rank({table}.search_vector, {query})",
+            (value,),
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_sqlite(queryset, query):
+    """
+    Таблица FTS5 присоединяется к рецептам по rowid через модель
+    RecipeSearchIndex: так MATCH выполняется один раз на запрос,
+    а bm25 считается только для найденных строк, без подзапроса
+    на каждый рецепт. Условия ссылаются на таблицу индекса по имени,
+    под которым ее присоединяет ORM.
+    """
+    return queryset.filter(
+        search_index__isnull=False,
+    ).filter(
+        RawSQL(f"{FTS_TABLE} MATCH %s", (query,), output_field=BooleanField())
+    ).annotate(
+        search_rank=RawSQL(
+            f"-bm25({FTS_TABLE}, {FTS_NAME_WEIGHT}, {FTS_TEXT_WEIGHT})",
+            (),
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск рецептов по названию и тексту с сортировкой
+    по релевантности, при равной релевантности - сначала новые.
+    На PostgreSQL используется колонка search_vector с GIN-индексом
+    и русской конфигурацией, на SQLite - таблица FTS5, на остальных
+    базах - icontains без ранжирования. Индексы создает миграция
+    recipes.0007_recipe_search_index и поддерживают триггеры БД.
+    Строка без слов (только знаки препинания или кавычки) на SQLite
+    ничего не находит.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        queryset = search_postgresql(queryset, value)
+    elif vendor == "sqlite":
+        query = get_fts_query(value)
+        if not query:
+            return queryset.none()
+        queryset = search_sqlite(queryset, query)
+    else:
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
+    return queryset.order_by("-search_rank", "-pub_date", "-pk")
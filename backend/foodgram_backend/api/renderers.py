@@ -0,0 +1,44 @@
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import measure_serialization
+
+
+class MetricsJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, время работы которого учитывается в метрике
+    времени сериализации ответа.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ShoppingListRenderer(MetricsJSONRenderer):
+    """
+    Формат выгрузки списка покупок, выбирается параметром format
+    или заголовком Accept. Сам файл формирует представление,
+    рендерер сериализует только ответы с ошибками, их тело
+    отдается как JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = "application/json"
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
@@ -0,0 +1,139 @@
+"""
+Маршрутизация чтения на реплики БД.
+
+Реплики перечисляются в DATABASE_REPLICAS. Запросы к ORM
+из GET и HEAD читают с одной из реплик, выбранной на весь HTTP-запрос.
+Остальные методы, чтение после записи в том же запросе и чтение
+внутри транзакции идут в основную БД. После записи пользователь
+REPLICA_STICKY_TIMEOUT секунд читает только из основной БД, чтобы
+видеть свои изменения, пока реплики догоняют основную базу. Отметка
+хранится в кэше "default", поэтому ее видят все воркеры: при
+нескольких процессах кэш обязан быть общим, см.
+api.cache.check_shared_cache.
+Вне HTTP-запроса (команды, фоновые потоки) все запросы идут
+в основную БД.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD")
+PRIMARY_STICKY_KEY = "db_primary_sticky:{user_id}"
+PRIMARY_MODELS = frozenset(("authtoken.token", "sessions.session"))
+
+current_request_routing = ContextVar("current_request_routing", default=None)
+primary_reads = ContextVar("primary_reads", default=False)
+
+
+def get_user_id(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def is_sticky(user_id):
+    if user_id is None:
+        return False
+    return cache.get(PRIMARY_STICKY_KEY.format(user_id=user_id)) is not None
+
+
+def stick_to_primary(user_id):
+    """
+    Направляет чтение пользователя в основную БД на время
+    REPLICA_STICKY_TIMEOUT.
+    """
+    cache.set(
+        PRIMARY_STICKY_KEY.format(user_id=user_id),
+        True,
+        settings.REPLICA_STICKY_TIMEOUT,
+    )
+
+
+class RequestRouting:
+    """
+    База для чтения в рамках одного HTTP-запроса.
+
+    Реплика выбирается при первом чтении, а не в начале запроса:
+    к этому моменту DRF уже аутентифицировал пользователя, и можно
+    проверить, не записывал ли он недавно. Пока пользователь
+    определяется, чтение идет в основную БД, поэтому загрузка
+    пользователя из сессии не зацикливается на маршрутизаторе.
+    """
+
+    __slots__ = ("request", "database", "written")
+
+    def __init__(self, request):
+        self.request = request
+        self.database = (
+            None if request.method in SAFE_METHODS else DEFAULT_DB_ALIAS
+        )
+        self.written = False
+
+    def get_read_database(self):
+        if self.database is None:
+            self.database = DEFAULT_DB_ALIAS
+            if not is_sticky(get_user_id(self.request)):
+                self.database = random.choice(settings.DATABASE_REPLICAS)
+        return self.database
+
+    def mark_written(self):
+        self.written = True
+        self.database = DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Направляет чтение внутри блока в основную БД. Нужен там, где
+    прочитанное сохраняется в общий кэш под текущей версией данных:
+    отстающая реплика вернула бы строки до изменения, сбросившего
+    версию, и они остались бы в кэше до следующего сброса.
+    """
+    token = primary_reads.set(True)
+    try:
+        yield
+    finally:
+        primary_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Маршрутизатор БД: чтение по правилам RequestRouting, запись
+    всегда в основную БД. Токены и сессии читаются только из основной
+    БД, иначе только что выданный токен мог бы не найтись на реплике.
+    Миграции к репликам не применяются.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_request_routing.get()
+        if routing is None:
+            return None
+        if (
+            primary_reads.get()
+            or model._meta.label_lower in PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return routing.get_read_database()
+
+    def db_for_write(self, model, **hints):
+        routing = current_request_routing.get()
+        if routing is not None:
+            routing.mark_written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,128 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+
+from .cache import (
+    BASE_INGREDIENTS_VERSION_KEY,
+    get_version,
+    invalidate_versions,
+)
+from .replicas import read_from_primary
+from recipes.models import BaseIngredient
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный по названию список продуктов в памяти процесса.
+
+    Используется для автодополнения на базах данных без триграммного
+    индекса: функция LOWER в SQLite не переводит в нижний регистр
+    кириллицу, поэтому названия приводятся к нижнему регистру в Python.
+    Список перестраивается, когда меняется версия справочника продуктов.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ()
+        self.lock = Lock()
+
+    def refresh(self):
+        version = get_version(BASE_INGREDIENTS_VERSION_KEY)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            with read_from_primary():
+                self.entries = tuple(sorted(
+                    (name.casefold(), pk)
+                    for pk, name in BaseIngredient.objects.values_list(
+                        "pk", "name"
+                    ).iterator()
+                ))
+            self.version = version
+
+    def search(self, value, limit):
+        """
+        Возвращает id не более чем limit продуктов, в названии которых
+        есть value. Сначала идут названия, начинающиеся с value: они
+        находятся двоичным поиском. Вхождения в середину названия
+        требуют просмотра всего списка, поэтому ищутся, только если
+        value не короче INGREDIENT_SEARCH_SUBSTRING_MIN_LENGTH,
+        а начал названий не хватило до limit.
+        """
+        self.refresh()
+        value = value.casefold()
+        entries = self.entries
+        found = []
+        start = bisect_left(entries, (value,))
+        for name, pk in entries[start:start + limit]:
+            if not name.startswith(value):
+                break
+            found.append(pk)
+        if len(found) < limit and has_substring_search(value):
+            for name, pk in entries:
+                if value in name and not name.startswith(value):
+                    found.append(pk)
+                    if len(found) == limit:
+                        break
+        return found
+
+
+ingredient_prefix_index = IngredientPrefixIndex()
+
+
+def has_substring_search(value):
+    return len(value) >= settings.INGREDIENT_SEARCH_SUBSTRING_MIN_LENGTH
+
+
+def invalidate_ingredient_search():
+    """
+    Сбрасывает версию справочника продуктов, после чего индекс
+    автодополнения будет перестроен при следующем запросе.
+    """
+    invalidate_versions((BASE_INGREDIENTS_VERSION_KEY,))
+
+
+def search_ingredients(queryset, value, limit):
+    """
+    Возвращает не более limit продуктов, в названии которых есть value,
+    без учета регистра. Продукты, название которых начинается с value,
+    идут первыми, внутри групп - по алфавиту. Строки короче
+    INGREDIENT_SEARCH_SUBSTRING_MIN_LENGTH ищутся только по началу
+    названия.
+
+    На PostgreSQL запрос обслуживается триграммным индексом
+    по lower(name), на остальных базах - индексом в памяти процесса.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        value = value.lower()
+        lookup = (
+            "search_name__contains" if has_substring_search(value)
+            else "search_name__startswith"
+        )
+        return queryset.annotate(
+            search_name=Lower("name"),
+        ).filter(
+            **{lookup: value},
+        ).annotate(
+            is_prefix=Case(
+                When(search_name__startswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+        ).order_by("is_prefix", "name")[:limit]
+    found = ingredient_prefix_index.search(value, limit)
+    if not found:
+        return queryset.none()
+    return queryset.filter(pk__in=found).order_by(
+        Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(found)),
+            output_field=IntegerField(),
+        )
+    )
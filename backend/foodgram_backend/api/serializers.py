@@ -1,4 +1,11 @@
+import os
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer
 from drf_extra_fields.fields import Base64ImageField
@@ -6,12 +13,25 @@ from rest_framework import serializers, status
 from rest_framework.fields import SerializerMethodField
 from rest_framework.serializers import ValidationError
 
-from .validators import is_unique, min_value_validator, validate_subscription
+from .cache import defer_cart_invalidation, invalidate_recipes_in_carts
+from .images import get_image_variant_urls, schedule_image_variants
+from .membership import get_membership
+from .metrics import measure_serialization
+from .recipe_cache import invalidate_recipe_details
+from .recipe_coverage import invalidate_recipe_ingredients
+from .shopping_cart import change_recipe_ingredients, defer_cart_changes
+from .validators import (
+    is_unique,
+    min_value_validator,
+    validate_recipes_limit,
+    validate_subscription,
+)
 from recipes.models import (
     BaseIngredient,
     Favorite,
     Ingredient,
     Recipe,
+    RecipeImage,
     ShoppingList,
     Tag,
 )
@@ -19,30 +39,69 @@ from users.models import Subscription
 
 User = get_user_model()
 
+RECIPES_LIMIT_DEFAULT = 6
+
+
+def get_recipe_prefetch_lookups():
+    """
+    Возвращает связи рецепта, которые RecipeSerializer
+    читает без дополнительных запросов к БД.
+    """
+    return (
+        "tags",
+        Prefetch(
+            "ingredient_to_recipe",
+            queryset=Ingredient.objects.select_related("ingredient"),
+        ),
+    )
+
+
+class MeasuredSerializerMixin:
+    """
+    Учитывает время to_representation в метрике времени сериализации
+    ответа. Там же выполняются вложенные сериализаторы и запросы
+    к БД, которые они делают.
+    """
+
+    def to_representation(self, instance):
+        with measure_serialization():
+            return super().to_representation(instance)
+
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для кратких данных о рецептах,
     используется для вывода списка рецептов.
     """
 
+    image_variants = SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
         read_only_fields = (
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
+    def get_image_variants(self, obj):
+        return get_image_variant_urls(obj, self.context.get("request"))
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для данных пользователей,
     используется для вывода списка пользователей
@@ -67,13 +126,15 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         request = self.context["request"]
         if request.user.is_anonymous:
             return False
         return obj.subscribing.filter(user=request.user).exists()
 
 
-class UserCreateSerializer(UserCreateSerializer):
+class UserCreateSerializer(MeasuredSerializerMixin, UserCreateSerializer):
     """
     Сериализатор для создания новых пользователей,
     используется при регистрации новых пользователей.
@@ -90,7 +151,9 @@ class UserCreateSerializer(UserCreateSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для тегов рецептов,
     используется для вывода списка тегов.
@@ -112,7 +175,9 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class BaseIngredientSerializer(serializers.ModelSerializer):
+class BaseIngredientSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для базовых ингредиентов рецептов,
     используется для вывода списка базовых ингредиентов.
@@ -132,7 +197,9 @@ class BaseIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для ингредиентов рецепта.
     Выводит информацию о базовом ингредиенте и его количестве в рецепте.
@@ -167,7 +234,9 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class AuthorSubscriptionSerializer(serializers.ModelSerializer):
+class AuthorSubscriptionSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для получения информации об авторе рецептов и их количестве,
     а также для подписки/отписки на автора.
@@ -176,6 +245,10 @@ class AuthorSubscriptionSerializer(serializers.ModelSerializer):
     - get_recipes_count: метод, который возвращает количество рецептов у автора
     - get_recipes: метод, который возвращает список рецептов автора
     - get_author: метод, который возвращает информацию об авторе
+
+    Количество рецептов берется из счетчика User.recipes_count. Если
+    подписка получена из GetAuthorSubscriptionViewSet, рецепты берутся
+    из словаря recipes_by_author в контексте сериализатора.
     """
 
     author = SerializerMethodField()
@@ -196,18 +269,26 @@ class AuthorSubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes_count(self, obj):
-        return obj.author.author_recipe.count()
+        return obj.author.recipes_count
 
     def get_recipes(self, obj):
-        request = self.context["request"]
-        limit = request.query_params.get("recipes_limit", 6)
-        recipes = obj.author.author_recipe.all()
-        recipes = recipes[:int(limit)]
+        recipes_by_author = self.context.get("recipes_by_author")
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.author_id, ())
+        else:
+            request = self.context["request"]
+            limit = validate_recipes_limit(
+                request.query_params.get("recipes_limit"),
+                RECIPES_LIMIT_DEFAULT,
+            )
+            recipes = obj.author.author_recipe.all()[:limit]
         serializer = ShortRecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
     def get_author(self, obj):
         request = self.context["request"]
+        if obj.user_id == request.user.id:
+            obj.author.is_subscribed = True
         serializer = UserSerializer(
             obj.author, context={'request': request}, read_only=True
         )
@@ -261,7 +342,9 @@ class AuthorSubscriptionSerializer(serializers.ModelSerializer):
         return new_data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для добавления/удаления
     рецепта в/из избранное.
@@ -290,7 +373,9 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return ShortRecipeSerializer(instance.subscribed_recipe).data
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+class ShoppingListSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для добавления/удаления
     рецепта в/из список покупок.
@@ -319,7 +404,60 @@ class ShoppingListSerializer(serializers.ModelSerializer):
         return ShortRecipeSerializer(instance.subscribed_recipe).data
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ShoppingListItemSerializer(
+    MeasuredSerializerMixin, serializers.Serializer
+):
+    """
+    Сериализатор строки списка покупок: продукт
+    и суммарное количество по всем рецептам списка.
+    """
+
+    id = serializers.IntegerField(source="ingredient")
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField(source="total_amount")
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """
+    Сериализатор списка id рецептов для массового добавления
+    в избранное и список покупок и удаления из них.
+    """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_SIZE,
+    )
+
+
+class RecipeCoverageQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров поиска рецептов по продуктам: ingredients -
+    продукты, которые есть у пользователя, exclude - продукты, рецепты
+    с которыми не нужны, min_coverage - минимальная доля продуктов
+    рецепта, которые есть у пользователя.
+    """
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_COVERAGE_MAX_INGREDIENTS,
+    )
+    exclude = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        default=list,
+        max_length=settings.RECIPE_COVERAGE_MAX_INGREDIENTS,
+    )
+    min_coverage = serializers.FloatField(
+        required=False, default=0, min_value=0, max_value=1
+    )
+
+
+class RecipeSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для модели Recipe, который возвращает полную
     информацию о рецепте, включая информацию об авторе, тегах,
@@ -335,6 +473,13 @@ class RecipeSerializer(serializers.ModelSerializer):
     добавлен ли рецепт в избранное у текущего пользователя
     - get_is_in_shopping_cart: метод, который возвращает флаг,
     показывающий, есть ли рецепт в списке покупок текущего пользователя
+    - get_image_variants: метод, который возвращает ссылки на уменьшенные
+    копии изображения, а до их готовности - на исходное изображение
+
+    Флаги is_favorited и is_in_shopping_cart проверяются по множествам
+    id рецептов пользователя из кэша (см. api.membership). Если рецепт
+    получен из RecipeViewSet.get_queryset, подписка на автора берется
+    из аннотации, а теги и ингредиенты - из prefetch_related.
     """
 
     author = UserSerializer(
@@ -346,6 +491,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_variants = SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -359,6 +505,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "text",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
         read_only_fields = ("is_favorited", "is_in_shopping_cart")
@@ -368,33 +515,54 @@ class RecipeSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_ingredients(self, obj):
-        ingredients = Ingredient.objects.select_related(
-            "to_recipe").filter(to_recipe=obj)
         serializer = IngredientSerializer(
-            ingredients,
+            obj.ingredient_to_recipe.all(),
             many=True,
             read_only=True,
         )
         return serializer.data
 
     def get_is_favorited(self, obj):
-        request = self.context["request"]
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            subscribed_recipe=obj, subscriber=request.user
-        ).exists()
+        return obj.pk in get_membership(self.context).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context["request"]
-        if request.user.is_anonymous:
-            return False
-        return ShoppingList.objects.filter(
-            subscribed_recipe=obj, subscriber=request.user
-        ).exists()
+        return obj.pk in get_membership(self.context).shopping_cart
+
+    def get_image_variants(self, obj):
+        return get_image_variant_urls(obj, self.context.get("request"))
+
+    def to_representation(self, instance):
+        if hasattr(instance, "author_is_subscribed"):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+
+class RecipeImageSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
+    """
+    Сериализатор изображения рецепта, загруженного отдельным
+    запросом. Возвращает id, который передается в image_id
+    при создании или обновлении рецепта.
+    """
+
+    image = serializers.ImageField()
+
+    class Meta:
+        model = RecipeImage
+        fields = ("id", "image")
+
+    def create(self, validated_data):
+        image = validated_data["image"]
+        image.name = uuid4().hex + os.path.splitext(image.name)[1].lower()
+        return RecipeImage.objects.create(
+            owner=self.context["request"].user, **validated_data
+        )
 
 
-class CreateRecipeSerializer(serializers.ModelSerializer):
+class CreateRecipeSerializer(
+    MeasuredSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для модели Recipe, который используется
     для создания и обновления рецепта.
@@ -406,13 +574,18 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     введенные ингредиенты уникальны и существуют в базе данных.
     - is_unique: метод, который проверяет, что элементы списка уникальны.
     - create: метод, который создает новый объект рецепта,
-    а также связанные с ним теги и ингредиенты.
+    а также связанные с ним теги и ингредиенты, и ставит в очередь
+    создание уменьшенных копий изображения.
     - update: метод, который обновляет существующий объект рецепта,
-    а также связанные с ним теги и ингредиенты.
-    - get_ingredients_list_object: метод, который получает список
-    ингредиентов рецепта и создает объекты модели Ingredients,
-    которые связываются с объектом рецепта и базовыми ингредиентами,
-    указанными в списке ингредиентов.
+    а также связанные с ним теги и ингредиенты. При смене изображения
+    его копии создаются заново.
+    - set_ingredients: метод, который приводит ингредиенты рецепта
+    к переданному списку: создает новые, обновляет количество у
+    измененных и удаляет убранные объекты модели Ingredient пакетными
+    запросами, число которых не зависит от количества ингредиентов.
+
+    Изображение передается либо в image строкой base64, либо в image_id
+    ссылкой на изображение, загруженное через /recipes/images/.
     """
 
     author = UserSerializer(
@@ -429,7 +602,12 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(
         many=True,
     )
-    image = Base64ImageField(max_length=None)
+    image = Base64ImageField(max_length=None, required=False)
+    image_id = serializers.PrimaryKeyRelatedField(
+        queryset=RecipeImage.objects.all(),
+        required=False,
+        write_only=True,
+    )
     name = serializers.CharField()
     cooking_time = serializers.IntegerField()
 
@@ -440,11 +618,39 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             "author",
             "ingredients",
             "image",
+            "image_id",
             "name",
             "text",
             "cooking_time",
         )
 
+    def validate_image_id(self, image):
+        if image.owner_id != self.context["request"].user.id:
+            raise ValidationError(
+                detail={
+                    "errors": "Изображение загружено другим пользователем!"
+                },
+                code=status.HTTP_400_BAD_REQUEST,
+            )
+        return image
+
+    def validate(self, data):
+        if "image" in data and "image_id" in data:
+            raise ValidationError(
+                detail={"errors": "Передайте либо image, либо image_id!"},
+                code=status.HTTP_400_BAD_REQUEST,
+            )
+        if (
+            self.instance is None
+            and not data.get("image")
+            and "image_id" not in data
+        ):
+            raise ValidationError(
+                detail={"errors": "Добавьте изображение рецепта!"},
+                code=status.HTTP_400_BAD_REQUEST,
+            )
+        return data
+
     def validate_cooking_time(self, cooking_time):
         min_value_validator(cooking_time, "Время приготовления",)
         return cooking_time
@@ -454,24 +660,24 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return tags
 
     def validate_ingredients(self, ingredients):
-        new_ingredients = []
-        for ingredient in ingredients:
-            id = ingredient.get("ingredient").get("id")
-            amount = ingredient.get("amount")
-            if not BaseIngredient.objects.filter(pk=id).exists():
-                raise ValidationError(
-                    detail={
-                        "errors": (
-                            "Один или несколько введенных "
-                            "Ингредиентов не существуют!"
-                        )
-                    },
-                    code=status.HTTP_404_NOT_FOUND,
-                )
-            new_ingredients.append({
-                "id": id,
-                "amount": amount,
-            })
+        new_ingredients = [
+            {
+                "id": ingredient.get("ingredient").get("id"),
+                "amount": ingredient.get("amount"),
+            }
+            for ingredient in ingredients
+        ]
+        ids = {ingredient.get("id") for ingredient in new_ingredients}
+        if BaseIngredient.objects.filter(pk__in=ids).count() != len(ids):
+            raise ValidationError(
+                detail={
+                    "errors": (
+                        "Один или несколько введенных "
+                        "Ингредиентов не существуют!"
+                    )
+                },
+                code=status.HTTP_404_NOT_FOUND,
+            )
         return new_ingredients
 
     def create(self, validated_data):
@@ -479,11 +685,14 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop("ingredients")
         is_unique(ingredients, "Ингредиенты")
         self.validate_amount(ingredients)
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        recipe.ingredients.set(
-            self.get_ingredients_list_object(ingredients, recipe)
-        )
+        with defer_cart_invalidation(), transaction.atomic():
+            uploaded_image = self.use_uploaded_image(validated_data)
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.set_ingredients(ingredients, recipe)
+            schedule_image_variants(recipe.id)
+            if uploaded_image is not None:
+                uploaded_image.delete()
         return recipe
 
     def update(self, instance, validated_data):
@@ -491,40 +700,89 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop("ingredients")
         is_unique(ingredients, "Ингредиенты")
         self.validate_amount(ingredients)
-        instance.tags.set(tags)
-        instance.ingredients.set(
-            self.get_ingredients_list_object(ingredients, instance)
-        )
-        return super().update(instance, validated_data)
-
-    def get_ingredients_list_object(self, ingredients, recipe):
-        exist_ingredients = recipe.ingredients.all()
-        ingredients_as_object = []
+        with defer_cart_invalidation(), transaction.atomic():
+            uploaded_image = self.use_uploaded_image(validated_data)
+            instance.tags.set(tags)
+            self.set_ingredients(ingredients, instance)
+            if "image" in validated_data:
+                schedule_image_variants(
+                    instance.id, tuple(instance.image_variants.values())
+                )
+                validated_data["image_variants"] = {}
+            if uploaded_image is not None:
+                uploaded_image.delete()
+            return super().update(instance, validated_data)
+
+    @staticmethod
+    def use_uploaded_image(validated_data):
+        """
+        Подставляет в рецепт файл загруженного изображения без
+        копирования. Запись о загрузке удаляется после сохранения
+        рецепта, файл остается за рецептом.
+        """
+        uploaded_image = validated_data.pop("image_id", None)
+        if uploaded_image is not None:
+            validated_data["image"] = uploaded_image.image.name
+        return uploaded_image
+
+    def set_ingredients(self, ingredients, recipe):
+        """
+        Создает, изменяет и удаляет ингредиенты рецепта пачками.
+        bulk_create и bulk_update не отправляют сигналы, поэтому
+        изменения количества продуктов передаются в списки покупок
+        явно; удаление учитывается сигналами post_delete одним разом.
+        Новые продукты так же явно передаются в индекс поиска
+        рецептов по продуктам.
+        """
+        exist_ingredients = {
+            ingredient.ingredient_id: ingredient
+            for ingredient in Ingredient.objects.filter(to_recipe=recipe)
+        }
+        new_ingredients = []
+        changed_ingredients = []
+        deltas = Counter()
         for ingredient in ingredients:
             amount = ingredient.get("amount")
-            ingredient = BaseIngredient.objects.get(
-                    pk=ingredient.get("id")
+            ingredient_obj = exist_ingredients.pop(ingredient.get("id"), None)
+            if ingredient_obj is None:
+                new_ingredients.append(
+                    Ingredient(
+                        ingredient_id=ingredient.get("id"),
+                        to_recipe=recipe,
+                        amount=amount,
+                    )
                 )
-            if ingredient in exist_ingredients:
-                ingredient_obj = Ingredient.objects.get(
-                    ingredient=ingredient,
-                    to_recipe=recipe,
+                deltas[ingredient.get("id")] += amount
+            elif ingredient_obj.amount != amount:
+                deltas[ingredient_obj.ingredient_id] += (
+                    amount - ingredient_obj.amount
                 )
                 ingredient_obj.amount = amount
-            else:
-                ingredient_obj = Ingredient.objects.create(
-                    ingredient=ingredient,
-                    to_recipe=recipe,
-                    amount=amount,
-                )
-            ingredient_obj.save()
-            ingredients_as_object.append(ingredient.id)
-        return ingredients_as_object
+                changed_ingredients.append(ingredient_obj)
+        with defer_cart_changes():
+            Ingredient.objects.bulk_create(new_ingredients)
+            Ingredient.objects.bulk_update(changed_ingredients, ("amount",))
+            change_recipe_ingredients(recipe.id, deltas)
+            if exist_ingredients:
+                Ingredient.objects.filter(
+                    pk__in=[
+                        ingredient.pk
+                        for ingredient in exist_ingredients.values()
+                    ]
+                ).delete()
+        if new_ingredients:
+            invalidate_recipe_ingredients((recipe.id,))
+        if new_ingredients or changed_ingredients or exist_ingredients:
+            invalidate_recipes_in_carts((recipe.id,))
+            invalidate_recipe_details((recipe.id,))
+        if hasattr(recipe, "_prefetched_objects_cache"):
+            recipe._prefetched_objects_cache.pop("ingredient_to_recipe", None)
 
     def validate_amount(self, ingredients):
         for ingredient in ingredients:
             min_value_validator(ingredient.get("amount"), "Количество",)
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], *get_recipe_prefetch_lookups())
         serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
@@ -0,0 +1,262 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import islice
+from threading import local
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import Ingredient, ShoppingList, ShoppingListItem
+
+REBUILD_BATCH_SIZE = 2000
+STREAM_BATCH_SIZE = 2000
+
+User = get_user_model()
+
+deferred_changes = local()
+
+
+def lock_shopping_cart(user_id):
+    """
+    Блокирует строку пользователя до конца транзакции. Все изменения
+    состава списка покупок пользователя берут эту блокировку до чтения
+    и записи, поэтому одиночные и массовые добавления и удаления
+    выполняются по очереди и видят результат друг друга.
+    """
+    list(
+        User.objects.select_for_update()
+        .filter(pk=user_id)
+        .values_list("pk", flat=True)
+    )
+
+
+def get_recipe_amounts(recipe_ids):
+    """
+    Возвращает количество каждого продукта в рецептах:
+    {id рецепта: {id продукта: количество}}.
+    """
+    amounts = defaultdict(Counter)
+    for row in (
+        Ingredient.objects.filter(to_recipe__in=recipe_ids)
+        .values("to_recipe", "ingredient")
+        .annotate(amount=Sum("amount"))
+        .order_by()
+    ):
+        amounts[row["to_recipe"]][row["ingredient"]] += row["amount"]
+    return amounts
+
+
+def change_items(user_ids, deltas):
+    """
+    Прибавляет к строкам списков покупок пользователей изменения
+    количества {id продукта: изменение}. Недостающие строки создаются,
+    само изменение выполняется одним UPDATE без чтения строк, поэтому
+    параллельные запросы не теряют изменения друг друга.
+
+    Строки с нулевым количеством не удаляются: удаление могло бы
+    разойтись с параллельным добавлением. Они не попадают в список
+    покупок и убираются при пересборке.
+    """
+    user_ids = list(user_ids)
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    added = [
+        ingredient_id for ingredient_id, delta in deltas.items() if delta > 0
+    ]
+    if added:
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id in added
+            ],
+            ignore_conflicts=True,
+        )
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    ).update(
+        total_amount=Greatest(
+            F("total_amount")
+            + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+    )
+
+
+def apply_recipe_changes(changes):
+    """
+    Применяет изменения {(id пользователя, id рецепта): +1 или -1}:
+    количество продуктов рецептов загружается одним запросом,
+    строки каждого пользователя меняются одним UPDATE.
+    """
+    amounts = get_recipe_amounts({recipe_id for _, recipe_id in changes})
+    deltas = defaultdict(Counter)
+    for (user_id, recipe_id), sign in changes.items():
+        for ingredient_id, amount in amounts[recipe_id].items():
+            deltas[user_id][ingredient_id] += sign * amount
+    for user_id, user_deltas in deltas.items():
+        change_items((user_id,), user_deltas)
+
+
+def apply_ingredient_changes(changes):
+    """
+    Применяет изменения продуктов рецептов
+    {id рецепта: {id продукта: изменение}} к спискам покупок всех
+    пользователей, у которых эти рецепты в списке покупок.
+    """
+    users = defaultdict(list)
+    for user_id, recipe_id in ShoppingList.objects.filter(
+        subscribed_recipe_id__in=changes
+    ).values_list("subscriber_id", "subscribed_recipe_id"):
+        users[recipe_id].append(user_id)
+    for recipe_id, user_ids in users.items():
+        change_items(user_ids, changes[recipe_id])
+
+
+def change_cart_recipe(user_id, recipe_id, sign):
+    """
+    Учитывает добавление (sign=1) или удаление (sign=-1) рецепта
+    из списка покупок пользователя.
+    """
+    changes = getattr(deferred_changes, "changes", None)
+    if changes is not None:
+        changes["recipes"][(user_id, recipe_id)] += sign
+        return
+    with transaction.atomic():
+        lock_shopping_cart(user_id)
+        apply_recipe_changes({(user_id, recipe_id): sign})
+
+
+def change_recipe_ingredients(recipe_id, deltas):
+    """
+    Учитывает изменение количества продуктов рецепта
+    {id продукта: изменение} в списках покупок пользователей,
+    у которых этот рецепт в списке покупок.
+    """
+    if not any(deltas.values()):
+        return
+    changes = getattr(deferred_changes, "changes", None)
+    if changes is not None:
+        changes["ingredients"][recipe_id].update(deltas)
+        return
+    apply_ingredient_changes({recipe_id: deltas})
+
+
+@contextmanager
+def defer_cart_changes():
+    """
+    Откладывает изменения списков покупок до выхода из блока
+    и применяет их разом: при удалении многих рецептов из списка
+    покупок или многих продуктов из рецепта сигналы post_delete
+    приходят для каждой строки.
+    """
+    if getattr(deferred_changes, "changes", None) is not None:
+        yield
+        return
+    deferred_changes.changes = {
+        "recipes": Counter(),
+        "ingredients": defaultdict(Counter),
+    }
+    try:
+        yield
+    finally:
+        changes = deferred_changes.changes
+        deferred_changes.changes = None
+    if recipes := {
+        key: sign for key, sign in changes["recipes"].items() if sign
+    }:
+        apply_recipe_changes(recipes)
+    if ingredients := {
+        recipe_id: deltas
+        for recipe_id, deltas in changes["ingredients"].items()
+        if any(deltas.values())
+    }:
+        apply_ingredient_changes(ingredients)
+
+
+def rebuild_items(user_ids=None):
+    """
+    Пересобирает строки списков покупок переданных или всех
+    пользователей по фактическим данным и возвращает количество
+    созданных строк. Нужна после массовых операций в обход сигналов.
+    """
+    items = ShoppingListItem.objects.all()
+    # Условие на список покупок задается одним filter(), иначе Django
+    # присоединит таблицу списков покупок второй раз.
+    lookup = {"to_recipe__shoppinglist_subscribed_recipe__isnull": False}
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        lookup = {
+            "to_recipe__shoppinglist_subscribed_recipe__subscriber__in": (
+                user_ids
+            )
+        }
+    rows = iter(
+        Ingredient.objects.filter(**lookup).values(
+            "ingredient",
+            user=F("to_recipe__shoppinglist_subscribed_recipe__subscriber"),
+        )
+        .annotate(total=Sum("amount"))
+        .order_by()
+        .iterator()
+    )
+    created = 0
+    with transaction.atomic():
+        items.delete()
+        while batch := list(islice(rows, REBUILD_BATCH_SIZE)):
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=row["user"],
+                    ingredient_id=row["ingredient"],
+                    total_amount=row["total"],
+                )
+                for row in batch
+            )
+            created += len(batch)
+    return created
+
+
+def get_shopping_list_rows(user_id):
+    """
+    Возвращает запрос строк списка покупок пользователя из заранее
+    посчитанных данных в формате, который принимают
+    render_shopping_list, stream_shopping_list
+    и ShoppingListItemSerializer.
+    """
+    return (
+        ShoppingListItem.objects.filter(user_id=user_id, total_amount__gt=0)
+        .values(
+            "ingredient",
+            "total_amount",
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+        )
+        .order_by("name")
+    )
+
+
+def get_shopping_list(user_id):
+    return list(get_shopping_list_rows(user_id))
+
+
+def iter_shopping_list(user_id):
+    """
+    Читает строки списка покупок пачками по STREAM_BATCH_SIZE,
+    не загружая весь список в память.
+    """
+    return get_shopping_list_rows(user_id).iterator(
+        chunk_size=STREAM_BATCH_SIZE
+    )
@@ -0,0 +1,342 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .cache import (
+    TAGS_VERSION_KEY,
+    invalidate_recipes_in_carts,
+    invalidate_shopping_carts,
+    invalidate_versions,
+)
+from .counters import change_counter
+from .membership import FAVORITES, SHOPPING_CART, invalidate_membership
+from .metrics import record_query
+from .recipe_cache import (
+    invalidate_all_recipe_details,
+    invalidate_author_recipe_details,
+    invalidate_recipe_details,
+)
+from .recipe_coverage import invalidate_recipe_ingredients
+from .search import invalidate_ingredient_search
+from .shopping_cart import change_cart_recipe, change_recipe_ingredients
+from .tags import clear_tag_bit, update_recipe_tags_mask, update_tags_masks
+from recipes.models import (
+    TAG_BITS,
+    BaseIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingList,
+    Tag,
+    get_free_tag_bit,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+RECIPE_AUTHOR_FIELDS = ("email", "username", "first_name", "last_name")
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def shopping_list_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш списка покупок при добавлении
+    или удалении рецепта из списка покупок.
+    """
+    invalidate_shopping_carts((instance.subscriber_id,))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_membership_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш множества избранных рецептов пользователя.
+    """
+    invalidate_membership(instance.subscriber_id, FAVORITES)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def shopping_cart_membership_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш множества рецептов в списке покупок пользователя.
+    """
+    invalidate_membership(instance.subscriber_id, SHOPPING_CART)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш списков покупок, в которых есть рецепт
+    с измененным ингредиентом.
+    """
+    invalidate_recipes_in_carts((instance.to_recipe_id,))
+
+
+@receiver((post_save, post_delete), sender=BaseIngredient)
+def base_ingredient_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш списков покупок, в которых есть рецепты
+    с измененным продуктом.
+    """
+    invalidate_recipes_in_carts(
+        Ingredient.objects.filter(ingredient=instance).values("to_recipe")
+    )
+
+
+@receiver((post_save, post_delete), sender=BaseIngredient)
+def base_ingredient_search_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает индекс автодополнения продуктов.
+    """
+    invalidate_ingredient_search()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает версию списка тегов.
+    """
+    invalidate_versions((TAGS_VERSION_KEY,))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_detail_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает версию закэшированного рецепта.
+    """
+    invalidate_recipe_details((instance.pk,))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def recipe_detail_ingredient_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает версию рецепта с измененным ингредиентом.
+    """
+    invalidate_recipe_details((instance.to_recipe_id,))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def recipe_coverage_changed(sender, instance, **kwargs):
+    """
+    Записывает изменение продуктов рецепта в журнал индекса поиска
+    рецептов по продуктам.
+    """
+    if instance.to_recipe_id is not None:
+        invalidate_recipe_ingredients((instance.to_recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_detail_tags_changed(sender, instance, action, reverse, **kwargs):
+    """
+    Сбрасывает версию рецепта при изменении его тегов. При изменении
+    рецептов со стороны тега сбрасываются все рецепты.
+    """
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        invalidate_all_recipe_details()
+    else:
+        invalidate_recipe_details((instance.pk,))
+
+
+@receiver(pre_save, sender=Tag)
+def tag_saving(sender, instance, **kwargs):
+    """
+    Назначает новому тегу свободный бит в масках тегов рецептов.
+    """
+    if instance.bit is None:
+        instance.bit = get_free_tag_bit()
+        if instance.bit is None:
+            raise ValueError(f"Поддерживается не больше {TAG_BITS} тегов.")
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_mask_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Пересчитывает маски тегов рецептов, у которых изменились теги.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action == "post_clear" and reverse:
+        clear_tag_bit(instance.bit)
+    elif not reverse:
+        if pk_set or action == "post_clear":
+            update_recipe_tags_mask(instance)
+    elif pk_set:
+        update_tags_masks(pk_set)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """
+    Снимает бит удаленного тега с масок рецептов: связи с рецептами
+    удаляются каскадно, без сигнала m2m_changed.
+    """
+    clear_tag_bit(instance.bit)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=BaseIngredient)
+def recipe_details_reference_changed(sender, **kwargs):
+    """
+    Сбрасывает все закэшированные рецепты при изменении тега
+    или продукта, которые могут входить во многие рецепты.
+    """
+    invalidate_all_recipe_details()
+
+
+@receiver(post_save, sender=User)
+def recipe_detail_author_changed(
+    sender, instance, created, raw, update_fields, **kwargs
+):
+    """
+    Сбрасывает закэшированные рецепты автора при изменении полей,
+    которые выводятся в рецепте. Обновление last_login при входе
+    рецепты не затрагивает.
+    """
+    if created or raw:
+        return
+    if update_fields is None or not update_fields.isdisjoint(
+        RECIPE_AUTHOR_FIELDS
+    ):
+        invalidate_author_recipe_details(instance.pk)
+
+
+def get_counter_delta(signal, kwargs):
+    """
+    Возвращает изменение счетчика: +1 при создании объекта, -1 при
+    удалении. Объекты из фикстур (raw) не учитываются, после loaddata
+    счетчики пересчитываются командой repair_counters.
+    """
+    if kwargs.get("raw"):
+        return 0
+    if signal is post_delete:
+        return -1
+    return 1 if kwargs.get("created") else 0
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_count_changed(sender, instance, signal, **kwargs):
+    """
+    Поддерживает счетчик добавлений рецепта в избранное.
+    """
+    if delta := get_counter_delta(signal, kwargs):
+        change_counter(
+            Recipe, instance.subscribed_recipe_id, "favorites_count", delta
+        )
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def cart_count_changed(sender, instance, signal, **kwargs):
+    """
+    Поддерживает счетчик добавлений рецепта в списки покупок.
+    """
+    if delta := get_counter_delta(signal, kwargs):
+        change_counter(
+            Recipe, instance.subscribed_recipe_id, "in_carts_count", delta
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_count_changed(sender, instance, signal, **kwargs):
+    """
+    Поддерживает счетчик рецептов автора.
+    """
+    if delta := get_counter_delta(signal, kwargs):
+        change_counter(User, instance.author_id, "recipes_count", delta)
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def followers_count_changed(sender, instance, signal, **kwargs):
+    """
+    Поддерживает счетчик подписчиков автора.
+    """
+    if delta := get_counter_delta(signal, kwargs):
+        change_counter(User, instance.author_id, "followers_count", delta)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def cart_items_changed(sender, instance, signal, **kwargs):
+    """
+    Прибавляет продукты рецепта к строкам списка покупок пользователя
+    или вычитает их.
+    """
+    if delta := get_counter_delta(signal, kwargs):
+        change_cart_recipe(
+            instance.subscriber_id, instance.subscribed_recipe_id, delta
+        )
+
+
+@receiver(pre_save, sender=Ingredient)
+def ingredient_saving(sender, instance, raw, **kwargs):
+    """
+    Запоминает продукт и количество изменяемого ингредиента,
+    чтобы в post_save учесть в списках покупок только разницу.
+    """
+    if instance.pk is not None and not raw:
+        instance._cart_previous = (
+            Ingredient.objects.filter(pk=instance.pk)
+            .values_list("ingredient_id", "amount")
+            .first()
+        )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_cart_items_changed(sender, instance, signal, **kwargs):
+    """
+    Переносит изменение ингредиента рецепта в списки покупок
+    пользователей, у которых этот рецепт в списке покупок.
+    """
+    if kwargs.get("raw"):
+        return
+    deltas = Counter()
+    if signal is post_delete:
+        deltas[instance.ingredient_id] -= instance.amount
+    else:
+        previous = instance.__dict__.pop("_cart_previous", None)
+        if previous is not None:
+            ingredient_id, amount = previous
+            deltas[ingredient_id] -= amount
+        if kwargs.get("created") or previous is not None:
+            deltas[instance.ingredient_id] += instance.amount
+    change_recipe_ingredients(instance.to_recipe_id, deltas)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированного пользователя токена при выходе.
+    """
+    invalidate_tokens((instance.key,))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, raw, **kwargs):
+    """
+    Сбрасывает закэшированного пользователя при смене пароля,
+    блокировке и любом другом изменении. У нового пользователя
+    токенов еще нет.
+    """
+    if not created and not raw:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """
+    Подключает учет запросов к БД в метриках. Обертка живет вместе
+    с объектом соединения и при переподключении не дублируется.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
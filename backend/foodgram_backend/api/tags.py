@@ -0,0 +1,164 @@
+from django.contrib.postgres.fields import ArrayField
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import (
+    BigIntegerField,
+    F,
+    Func,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce
+
+from .cache import TAGS_VERSION_KEY, get_version
+from .replicas import read_from_primary
+from recipes.models import Recipe, Tag
+
+TAG_BITS_KEY = "tag_bits:{version}"
+TAGS_MODE_ANY = "any"
+TAGS_MODE_ALL = "all"
+TAGS_MODES = (
+    (TAGS_MODE_ANY, "Хотя бы один из тегов"),
+    (TAGS_MODE_ALL, "Все теги"),
+)
+
+
+class TagsMaskBits(Func):
+    """
+    Номера битов маски тегов рецепта. Функцию и GIN-индекс по ней
+    создает миграция recipes.0009_recipe_tags_mask_index, есть только
+    на PostgreSQL.
+    """
+
+    function = "recipes_tags_mask_bits"
+    output_field = ArrayField(IntegerField())
+
+
+def get_tag_bits():
+    """
+    Возвращает словарь {slug тега: номер бита}. Словарь хранится
+    в кэше процесса "reference" по версии тегов, поэтому таблица
+    тегов не запрашивается на каждый запрос.
+    """
+    version = get_version(TAGS_VERSION_KEY)
+    reference_cache = caches["reference"]
+    key = TAG_BITS_KEY.format(version=version)
+    bits = reference_cache.get(key)
+    if bits is None:
+        with read_from_primary():
+            bits = dict(
+                Tag.objects.filter(bit__isnull=False).values_list(
+                    "slug", "bit"
+                )
+            )
+        reference_cache.set(key, bits)
+    return bits
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_bits()]
+
+
+def get_tags_mask():
+    """
+    Выражение маски тегов рецепта по фактическим тегам: сумма
+    степеней двойки по битам тегов. Теги рецепта не повторяются,
+    поэтому сумма совпадает с побитовым ИЛИ.
+    """
+    return Coalesce(
+        Subquery(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef("pk"), tag__bit__isnull=False
+            )
+            .order_by()
+            .values("recipe")
+            .annotate(
+                mask=Sum(
+                    Cast(Value(1), BigIntegerField()).bitleftshift(
+                        F("tag__bit")
+                    )
+                )
+            )
+            .values("mask")
+        ),
+        0,
+        output_field=BigIntegerField(),
+    )
+
+
+def update_tags_masks(recipe_ids=None):
+    """
+    Пересчитывает маски тегов переданных или всех рецептов одним
+    UPDATE. Нужна после изменения тегов рецептов и массовых операций
+    в обход сигналов.
+    """
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    return recipes.update(tags_mask=get_tags_mask())
+
+
+def update_recipe_tags_mask(recipe):
+    """
+    Пересчитывает маску тегов рецепта в БД и у переданного объекта,
+    чтобы последующий save() этого объекта не записал старую маску.
+    """
+    recipe.tags_mask = sum(
+        1 << bit
+        for bit in recipe.tags.filter(bit__isnull=False).values_list(
+            "bit", flat=True
+        )
+    )
+    Recipe.objects.filter(pk=recipe.pk).update(tags_mask=recipe.tags_mask)
+
+
+def clear_tag_bit(bit):
+    """
+    Снимает бит удаленного тега или тега, у которого убрали
+    все рецепты, с масок рецептов, чтобы бит можно было отдать
+    новому тегу.
+    """
+    if bit is None:
+        return
+    Recipe.objects.alias(tag_bit=F("tags_mask").bitand(1 << bit)).exclude(
+        tag_bit=0
+    ).update(tags_mask=F("tags_mask").bitand(~(1 << bit)))
+
+
+def filter_by_tags(queryset, slugs, mode=TAGS_MODE_ANY):
+    """
+    Оставляет рецепты хотя бы с одним (mode="any") или со всеми
+    (mode="all") тегами из slugs. Условие проверяет маску тегов
+    рецепта без присоединения таблицы тегов, поэтому рецепты
+    не дублируются и DISTINCT не нужен.
+
+    На PostgreSQL условие записывается через массив битов маски
+    (&& и @>) и использует GIN-индекс. На остальных базах маска
+    сравнивается побитовым И, такое условие индекс не использует,
+    и таблица рецептов просматривается целиком.
+
+    Неизвестные теги RecipeFilter отклоняет с ответом 400 еще
+    до вызова; здесь они не совпадают ни с одним рецептом.
+    """
+    bits = get_tag_bits()
+    tag_bits = []
+    for slug in slugs:
+        if slug in bits:
+            tag_bits.append(bits[slug])
+        elif mode == TAGS_MODE_ALL:
+            return queryset.none()
+    if not tag_bits:
+        return queryset.none()
+    if connections[queryset.db].vendor == "postgresql":
+        queryset = queryset.alias(tag_bits=TagsMaskBits("tags_mask"))
+        if mode == TAGS_MODE_ALL:
+            return queryset.filter(tag_bits__contains=tag_bits)
+        return queryset.filter(tag_bits__overlap=tag_bits)
+    mask = sum(1 << bit for bit in set(tag_bits))
+    queryset = queryset.alias(tags_match=F("tags_mask").bitand(mask))
+    if mode == TAGS_MODE_ALL:
+        return queryset.filter(tags_match=mask)
+    return queryset.exclude(tags_match=0)
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import BaseIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA"
+    "CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAA"
+    "ggCByxOyYQAAAABJRU5ErkJggg=="
+)
+
+
+class ApiTestCase(TestCase):
+    """
+    Общая основа тестов API: отдельный каталог для загруженных
+    и сгенерированных файлов и пустые кэши перед каждым тестом.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            SHOPPING_LIST_CACHE_DIR=os.path.join(
+                cls.media_root, "shopping_lists"
+            ),
+        )
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        for alias in ("default", "reference"):
+            caches[alias].clear()
+
+    @staticmethod
+    def create_user(username, **fields):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="Password-12345",
+            first_name=fields.pop("first_name", "Имя"),
+            last_name=fields.pop("last_name", "Фамилия"),
+            **fields,
+        )
+
+    @staticmethod
+    def get_client(user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    @staticmethod
+    def create_tag(slug):
+        color = hashlib.md5(slug.encode()).hexdigest()[:6].upper()
+        return Tag.objects.create(name=slug, slug=slug, color=f"#{color}")
+
+    @staticmethod
+    def create_base_ingredients(count, prefix="Продукт"):
+        return BaseIngredient.objects.bulk_create(
+            BaseIngredient(name=f"{prefix} {number}", measurement_unit="г")
+            for number in range(count)
+        )
+
+    @staticmethod
+    def create_recipe(author, name="Рецепт", tags=(), ingredients=()):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name,
+            text="Описание",
+            cooking_time=10,
+            image="recipes/image/test.png",
+        )
+        recipe.tags.set(tags)
+        for amount, base_ingredient in enumerate(ingredients, start=1):
+            Ingredient.objects.create(
+                to_recipe=recipe, ingredient=base_ingredient, amount=amount
+            )
+        return recipe
+
+    @staticmethod
+    def get_recipe_payload(tags, ingredients, **fields):
+        return {
+            "name": "Рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": IMAGE,
+            "tags": [tag.pk for tag in tags],
+            "ingredients": [
+                {"id": base_ingredient.pk, "amount": amount}
+                for amount, base_ingredient in enumerate(ingredients, 1)
+            ],
+            **fields,
+        }
@@ -0,0 +1,93 @@
+from .base import ApiTestCase
+from recipes.models import Favorite, ShoppingList
+from users.models import Subscription
+
+
+class AsyncViewsTest(ApiTestCase):
+    """
+    Маршруты /api/async/ отдают те же данные и ошибки,
+    что и синхронные маршруты.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.user = cls.create_user("user")
+        cls.tags = [cls.create_tag("breakfast"), cls.create_tag("dinner")]
+        cls.ingredients = cls.create_base_ingredients(3)
+        cls.recipes = [
+            cls.create_recipe(
+                cls.author,
+                name=f"Рецепт {number}",
+                tags=cls.tags[number % 2:][:1],
+                ingredients=cls.ingredients[number % 3:],
+            )
+            for number in range(3)
+        ]
+        Favorite.objects.create(
+            subscriber=cls.user, subscribed_recipe=cls.recipes[0]
+        )
+        ShoppingList.objects.create(
+            subscriber=cls.user, subscribed_recipe=cls.recipes[1]
+        )
+        Subscription.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def assert_same(self, path, params=None, client=None):
+        client = client or self.client
+        sync = client.get(f"/api/{path}", params)
+        response = client.get(f"/api/async/{path}", params)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.json(), sync.json())
+        return response
+
+    def test_recipes(self):
+        for params in (
+            None,
+            {"tags": "breakfast"},
+            {"is_favorited": 1},
+            {"is_in_shopping_cart": 1},
+            {"author": self.author.pk},
+            {"page": 2, "limit": 2},
+        ):
+            with self.subTest(params=params):
+                self.assert_same("recipes/", params)
+
+    def test_recipes_for_anonymous(self):
+        self.assert_same("recipes/", client=self.get_client())
+
+    def test_recipe(self):
+        for recipe in self.recipes:
+            # Второй запрос отдается из кэша рецепта.
+            for _ in range(2):
+                self.assert_same(f"recipes/{recipe.pk}/")
+
+    def test_missing_recipe(self):
+        response = self.assert_same("recipes/0/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_tags(self):
+        self.assert_same("tags/")
+        self.assert_same(f"tags/{self.tags[0].pk}/")
+
+    def test_ingredients(self):
+        self.assert_same("ingredients/")
+        self.assert_same("ingredients/", {"name": "Продукт 1"})
+        self.assert_same(f"ingredients/{self.ingredients[0].pk}/")
+
+    def test_subscriptions(self):
+        self.assert_same("users/subscriptions/", {"recipes_limit": 2})
+
+    def test_subscriptions_require_authentication(self):
+        response = self.assert_same(
+            "users/subscriptions/", client=self.get_client()
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_write_is_not_allowed(self):
+        response = self.client.post("/api/async/recipes/")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response["Allow"], "GET, HEAD")
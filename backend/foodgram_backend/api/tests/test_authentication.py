@@ -0,0 +1,107 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .base import ApiTestCase
+from api.authentication import CachedTokenAuthentication
+from api.cache import check_shared_cache
+from users.models import Subscription, User
+
+DUMMY_CACHE = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+LOCMEM_CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+
+
+class CachedTokenAuthenticationTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("user")
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def get_me(self):
+        return self.client.get("/api/users/me/")
+
+    def test_token_is_read_from_cache(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_me().status_code, 200)
+        self.assertFalse(
+            any(
+                "authtoken_token" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_logout_revokes_cached_token(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_inactive_user_is_rejected(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_cached_user_has_no_counters(self):
+        user, token = CachedTokenAuthentication().authenticate_credentials(
+            self.user.auth_token.key
+        )
+        self.assertTrue(
+            {"recipes_count", "followers_count"}
+            <= user.get_deferred_fields()
+        )
+
+    def test_write_through_cached_user_keeps_counters(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        Subscription.objects.create(
+            user=self.create_user("follower"), author=self.user
+        )
+        response = self.client.post(
+            "/api/users/set_password/",
+            {
+                "current_password": "Password-12345",
+                "new_password": "New-Password-12345",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).followers_count, 1
+        )
+
+
+class SharedCacheCheckTest(ApiTestCase):
+    @override_settings(
+        WEB_CONCURRENCY=2,
+        CACHES={"default": LOCMEM_CACHE, "reference": LOCMEM_CACHE},
+    )
+    def test_several_workers_require_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+    @override_settings(
+        WEB_CONCURRENCY=2,
+        CACHES={"default": DUMMY_CACHE, "reference": LOCMEM_CACHE},
+    )
+    def test_several_workers_with_shared_cache(self):
+        check_shared_cache()
+
+    @override_settings(
+        WEB_CONCURRENCY=1,
+        WEB_SERVICES=2,
+        CACHES={"default": LOCMEM_CACHE, "reference": LOCMEM_CACHE},
+    )
+    def test_several_services_require_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+    @override_settings(WEB_CONCURRENCY=1, WEB_SERVICES=1)
+    def test_single_worker_with_process_cache(self):
+        check_shared_cache()
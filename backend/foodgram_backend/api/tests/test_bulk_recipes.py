@@ -0,0 +1,153 @@
+from django.conf import settings
+
+from .base import ApiTestCase
+from recipes.models import Favorite, Recipe, ShoppingList
+
+FAVORITE_URL = "/api/recipes/favorite/"
+SHOPPING_CART_URL = "/api/recipes/shopping_cart/"
+MISSING_ID = 10 ** 6
+
+
+class BulkRecipesTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("user")
+        author = cls.create_user("author")
+        cls.base_ingredients = cls.create_base_ingredients(2)
+        cls.first, cls.second, cls.third = (
+            cls.create_recipe(
+                author,
+                name=f"Рецепт {number}",
+                ingredients=cls.base_ingredients[number % 2:],
+            )
+            for number in range(3)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def change(self, method, url, recipes):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                url, {"recipes": recipes}, format="json"
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (result["id"], result["status"])
+            for result in response.json()["results"]
+        ]
+
+    def get_counters(self, field):
+        return dict(Recipe.objects.values_list("pk", field))
+
+    def get_flags(self, field):
+        response = self.client.get(
+            "/api/recipes/", {"pagination": "cursor", "limit": 10}
+        )
+        return {
+            recipe["id"]: recipe[field]
+            for recipe in response.json()["results"]
+        }
+
+    def test_add_and_remove_favorites(self):
+        first, second, third = self.first.pk, self.second.pk, self.third.pk
+        self.assertEqual(
+            self.change("post", FAVORITE_URL, [first, MISSING_ID, first]),
+            [(first, "added"), (MISSING_ID, "not_found")],
+        )
+        self.assertEqual(
+            self.change("post", FAVORITE_URL, [second, first]),
+            [(second, "added"), (first, "already_added")],
+        )
+        self.assertEqual(
+            self.get_counters("favorites_count"),
+            {first: 1, second: 1, third: 0},
+        )
+        self.assertEqual(
+            self.get_flags("is_favorited"),
+            {first: True, second: True, third: False},
+        )
+        self.assertEqual(
+            self.change("delete", FAVORITE_URL, [first, third, MISSING_ID]),
+            [(first, "removed"), (third, "not_added"),
+             (MISSING_ID, "not_found")],
+        )
+        self.assertEqual(
+            list(
+                Favorite.objects.filter(subscriber=self.user).values_list(
+                    "subscribed_recipe", flat=True
+                )
+            ),
+            [second],
+        )
+        self.assertEqual(
+            self.get_counters("favorites_count"),
+            {first: 0, second: 1, third: 0},
+        )
+        self.assertEqual(
+            self.get_flags("is_favorited"),
+            {first: False, second: True, third: False},
+        )
+
+    def test_add_and_remove_shopping_cart(self):
+        first, second = self.first.pk, self.second.pk
+        self.assertEqual(
+            self.change("post", SHOPPING_CART_URL, [first, second]),
+            [(first, "added"), (second, "added")],
+        )
+        self.assertEqual(self.get_counters("in_carts_count")[first], 1)
+        items = self.client.get(SHOPPING_CART_URL).json()
+        self.assertEqual(
+            [(item["id"], item["amount"]) for item in items],
+            [
+                (self.base_ingredients[0].pk, 1),
+                (self.base_ingredients[1].pk, 3),
+            ],
+        )
+        self.assertTrue(self.get_flags("is_in_shopping_cart")[second])
+        self.assertEqual(
+            self.change("delete", SHOPPING_CART_URL, [first]),
+            [(first, "removed")],
+        )
+        items = self.client.get(SHOPPING_CART_URL).json()
+        self.assertEqual(
+            [(item["id"], item["amount"]) for item in items],
+            [(self.base_ingredients[1].pk, 1)],
+        )
+        self.assertEqual(
+            list(
+                ShoppingList.objects.filter(subscriber=self.user).values_list(
+                    "subscribed_recipe", flat=True
+                )
+            ),
+            [second],
+        )
+
+    def test_invalid_payload(self):
+        for url in (FAVORITE_URL, SHOPPING_CART_URL):
+            for recipes in ([], [0], ["a"], None):
+                with self.subTest(url=url, recipes=recipes):
+                    response = self.client.post(
+                        url, {"recipes": recipes}, format="json"
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("recipes", response.json())
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_too_many_recipes(self):
+        response = self.client.post(
+            FAVORITE_URL,
+            {"recipes": list(range(1, settings.BULK_RECIPES_MAX_SIZE + 2))},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("recipes", response.json())
+
+    def test_anonymous(self):
+        for url in (FAVORITE_URL, SHOPPING_CART_URL):
+            with self.subTest(url=url):
+                response = self.get_client().post(
+                    url, {"recipes": [self.first.pk]}, format="json"
+                )
+                self.assertEqual(response.status_code, 401)
@@ -0,0 +1,109 @@
+from .base import ApiTestCase
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription, User
+
+
+class CountersTest(ApiTestCase):
+    """
+    Счетчики и маска тегов меняются сигналами через UPDATE и не
+    затираются при сохранении объекта, прочитанного раньше.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.user = cls.create_user("user")
+        cls.tags = [cls.create_tag("breakfast"), cls.create_tag("dinner")]
+        cls.ingredients = cls.create_base_ingredients(2)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+
+    def create_recipe_through_api(self):
+        response = self.client.post(
+            "/api/recipes/",
+            self.get_recipe_payload(self.tags[:1], self.ingredients),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.json()["id"])
+
+    def test_counters_follow_changes(self):
+        recipe = self.create_recipe_through_api()
+        Favorite.objects.create(subscriber=self.user, subscribed_recipe=recipe)
+        ShoppingList.objects.create(
+            subscriber=self.user, subscribed_recipe=recipe
+        )
+        Subscription.objects.create(user=self.user, author=self.author)
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 1)
+        )
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count), (1, 1)
+        )
+
+    def test_set_password_keeps_counters(self):
+        self.client.get("/api/users/me/")
+        self.create_recipe_through_api()
+        response = self.client.post(
+            "/api/users/set_password/",
+            {
+                "current_password": "Password-12345",
+                "new_password": "New-Password-12345",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_profile_save_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        self.create_recipe_through_api()
+        Subscription.objects.create(user=self.user, author=self.author)
+        author.first_name = "Новое имя"
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, "Новое имя")
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (1, 1)
+        )
+
+    def test_recipe_update_keeps_counters_and_tags_mask(self):
+        recipe = self.create_recipe_through_api()
+        Favorite.objects.create(subscriber=self.user, subscribed_recipe=recipe)
+        ShoppingList.objects.create(
+            subscriber=self.user, subscribed_recipe=recipe
+        )
+        response = self.client.patch(
+            f"/api/recipes/{recipe.pk}/",
+            self.get_recipe_payload(
+                self.tags[1:], self.ingredients, name="Новое название"
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, "Новое название")
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 1)
+        )
+        self.assertEqual(recipe.tags_mask, 1 << self.tags[1].bit)
+
+    def test_stale_recipe_save_keeps_counters_and_tags_mask(self):
+        recipe = self.create_recipe_through_api()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(subscriber=self.user, subscribed_recipe=recipe)
+        recipe.tags.set(self.tags)
+        stale.name = "Новое название"
+        stale.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, "Новое название")
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(
+            recipe.tags_mask,
+            (1 << self.tags[0].bit) | (1 << self.tags[1].bit),
+        )
@@ -0,0 +1,86 @@
+from django.test import override_settings
+
+from .base import ApiTestCase
+from recipes.models import BaseIngredient
+
+URLS = ("/api/ingredients/", "/api/async/ingredients/")
+NAMES = (
+    "Сахар",
+    "сахарная пудра",
+    "Сахарный сироп",
+    "Ванильный сахар",
+    "Соль",
+    "Морская соль",
+    "Перец",
+)
+
+
+@override_settings(INGREDIENT_SEARCH_LIMIT=3)
+class IngredientSearchTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BaseIngredient.objects.bulk_create(
+            BaseIngredient(name=name, measurement_unit="г") for name in NAMES
+        )
+
+    def search(self, url, **params):
+        response = self.get_client().get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [ingredient["name"] for ingredient in response.json()]
+
+    def test_prefix_first(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.search(url, name="САХ"),
+                    ["Сахар", "сахарная пудра", "Сахарный сироп"],
+                )
+
+    def test_substring_fallback(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.search(url, name="соль"), ["Соль", "Морская соль"]
+                )
+
+    def test_short_value_matches_prefix_only(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.search(url, name="со"), ["Соль"])
+
+    def test_limit(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.search(url, name="сахар", limit=1), ["Сахар"]
+                )
+                self.assertEqual(
+                    self.search(url, name="сахар", limit=5)[-1],
+                    "Ванильный сахар",
+                )
+
+    def test_list_without_name_is_limited(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.search(url),
+                    ["Ванильный сахар", "Морская соль", "Перец"],
+                )
+                self.assertEqual(len(self.search(url, limit=5)), 5)
+
+    def test_limit_is_validated(self):
+        for url in URLS:
+            for limit in (0, 101, "a"):
+                with self.subTest(url=url, limit=limit):
+                    response = self.get_client().get(url, {"limit": limit})
+                    self.assertEqual(response.status_code, 400)
+
+    def test_detail_ignores_list_filters(self):
+        ingredient = BaseIngredient.objects.get(name="Перец")
+        for url in URLS:
+            with self.subTest(url=url):
+                response = self.get_client().get(
+                    f"{url}{ingredient.pk}/", {"limit": 1, "name": "соль"}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["name"], "Перец")
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+from functools import partial
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from tqdm import tqdm
+
+from api.cache import get_cart_version
+from recipes.models import BaseIngredient
+
+ROWS = [
+    {"name": "Мука", "measurement_unit": "г"},
+    {"name": "Молоко", "measurement_unit": "мл"},
+    {"name": "Яйцо", "measurement_unit": "шт"},
+]
+
+
+@mock.patch(
+    "api.management.commands.load_csv_data.tqdm",
+    partial(tqdm, disable=True),
+)
+class LoadCsvDataTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_csv(self, rows, name="ingredients.csv"):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("name,measurement_unit\n")
+            for row in rows:
+                file.write(f"{row['name']},{row['measurement_unit']}\n")
+        return path
+
+    def write_json(self, rows, name="ingredients.json"):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False)
+        return path
+
+    def load(self, path, *args):
+        stdout = StringIO()
+        call_command(
+            "load_csv_data", "--file", path, *args, stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def get_units(self):
+        return dict(
+            BaseIngredient.objects.values_list("name", "measurement_unit")
+        )
+
+    def test_csv_and_json(self):
+        for write in (self.write_csv, self.write_json):
+            with self.subTest(format=write.__name__):
+                BaseIngredient.objects.all().delete()
+                output = self.load(write(ROWS), "--batch-size", "2")
+                self.assertEqual(
+                    self.get_units(),
+                    {row["name"]: row["measurement_unit"] for row in ROWS},
+                )
+                self.assertIn("Обработано строк: 3", output)
+                self.assertIn("добавлено продуктов: 3", output)
+
+    def test_existing_and_duplicate_rows(self):
+        BaseIngredient.objects.create(name="Мука", measurement_unit="кг")
+        rows = ROWS + [{"name": "Молоко", "measurement_unit": "л"}]
+        output = self.load(self.write_csv(rows), "--batch-size", "10")
+        self.assertIn("добавлено продуктов: 2", output)
+        self.assertEqual(
+            self.get_units(), {"Мука": "кг", "Молоко": "л", "Яйцо": "шт"}
+        )
+
+    def test_update(self):
+        BaseIngredient.objects.create(name="Мука", measurement_unit="кг")
+        version = get_cart_version(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.load(self.write_json(ROWS), "--update")
+        self.assertEqual(self.get_units()["Мука"], "г")
+        self.assertEqual(BaseIngredient.objects.count(), 3)
+        self.assertNotEqual(get_cart_version(1), version)
+
+    def test_failed_batch_rolls_back_import(self):
+        rows = ROWS + [{"name": "Соль", "measurement_unit": None}]
+        with self.assertRaises(IntegrityError):
+            self.load(
+                self.write_json(rows), "--batch-size", "2", "--update"
+            )
+        self.assertFalse(BaseIngredient.objects.exists())
+
+    def test_invalid_arguments(self):
+        path = self.write_csv(ROWS)
+        with self.assertRaisesMessage(CommandError, "--batch-size"):
+            self.load(path, "--batch-size", "0")
+        with self.assertRaisesMessage(CommandError, ".txt"):
+            self.load(self.write_csv(ROWS, "ingredients.txt"))
@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from threading import Lock
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from .base import ApiTestCase
+from api.membership import FAVORITES, get_membership_cache, get_recipe_ids
+from recipes.models import Favorite, ShoppingList
+
+CONCURRENT_CLIENTS = 4
+
+
+class MembershipFlagsTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.user = cls.create_user("user")
+        cls.recipes = [
+            cls.create_recipe(cls.author, name=f"Рецепт {number}")
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def get_flags(self, field):
+        results = self.client.get("/api/recipes/").json()["results"]
+        return {recipe["id"] for recipe in results if recipe[field]}
+
+    def change(self, method, recipe, url_path):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(
+                f"/api/recipes/{recipe.pk}/{url_path}/"
+            )
+
+    def test_flags_follow_add_and_remove(self):
+        for url_path, field in (
+            ("favorite", "is_favorited"),
+            ("shopping_cart", "is_in_shopping_cart"),
+        ):
+            with self.subTest(url_path=url_path):
+                self.assertEqual(self.get_flags(field), set())
+                first, second, _ = self.recipes
+                self.assertEqual(
+                    self.change("post", first, url_path).status_code, 201
+                )
+                self.assertEqual(
+                    self.change("post", second, url_path).status_code, 201
+                )
+                self.assertEqual(
+                    self.get_flags(field), {first.pk, second.pk}
+                )
+                detail = self.client.get(f"/api/recipes/{first.pk}/").json()
+                self.assertTrue(detail[field])
+                self.assertEqual(
+                    self.change("delete", first, url_path).status_code, 204
+                )
+                self.assertEqual(self.get_flags(field), {second.pk})
+                detail = self.client.get(f"/api/recipes/{first.pk}/").json()
+                self.assertFalse(detail[field])
+
+    def test_set_read_before_commit_is_not_served(self):
+        """
+        Читатель загрузил множество до фиксации добавления в избранное
+        и сохранил его после сброса версии: устаревшее множество
+        остается под старой версией и не читается.
+        """
+        recipe = self.recipes[0]
+        membership_cache = get_membership_cache()
+        original_set = membership_cache.set
+
+        def set_after_concurrent_write(key, value, timeout):
+            with transaction.atomic():
+                Favorite.objects.create(
+                    subscriber=self.user, subscribed_recipe=recipe
+                )
+            original_set(key, value, timeout)
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(
+            membership_cache, "set", side_effect=set_after_concurrent_write
+        ):
+            stale = get_recipe_ids(self.user.pk, FAVORITES)
+        self.assertEqual(stale, frozenset())
+        self.assertEqual(
+            get_recipe_ids(self.user.pk, FAVORITES), {recipe.pk}
+        )
+
+
+class ConcurrentMembershipTest(TransactionTestCase):
+    """
+    Одновременные добавления и удаления из нескольких потоков:
+    после них флаги совпадают с содержимым БД.
+
+    Тестовая база SQLite в памяти не допускает одновременной записи
+    из разных соединений, поэтому на ней запросы потоков чередуются
+    под блокировкой. На PostgreSQL они выполняются одновременно.
+    """
+
+    def setUp(self):
+        self.lock = (
+            Lock() if connection.vendor == "sqlite" else nullcontext()
+        )
+        get_membership_cache().clear()
+        self.user = ApiTestCase.create_user("user")
+        author = ApiTestCase.create_user("author")
+        self.recipes = [
+            ApiTestCase.create_recipe(author, name=f"Рецепт {number}")
+            for number in range(CONCURRENT_CLIENTS * 2)
+        ]
+
+    def toggle(self, client, recipes):
+        try:
+            for recipe in recipes:
+                for url_path in ("favorite", "shopping_cart"):
+                    url = f"/api/recipes/{recipe.pk}/{url_path}/"
+                    with self.lock:
+                        client.post(url)
+                    with self.lock:
+                        get_recipe_ids(self.user.pk, FAVORITES)
+                    if recipe.pk % 2:
+                        with self.lock:
+                            client.delete(url)
+        finally:
+            connection.close()
+
+    def test_concurrent_add_and_remove(self):
+        get_recipe_ids(self.user.pk, FAVORITES)
+        with ThreadPoolExecutor(CONCURRENT_CLIENTS) as executor:
+            list(executor.map(
+                self.toggle,
+                [
+                    ApiTestCase.get_client(self.user)
+                    for _ in range(CONCURRENT_CLIENTS)
+                ],
+                [
+                    self.recipes[number::CONCURRENT_CLIENTS]
+                    for number in range(CONCURRENT_CLIENTS)
+                ],
+            ))
+        expected = {recipe.pk for recipe in self.recipes if not recipe.pk % 2}
+        for model in (Favorite, ShoppingList):
+            self.assertEqual(
+                set(
+                    model.objects.filter(subscriber=self.user).values_list(
+                        "subscribed_recipe", flat=True
+                    )
+                ),
+                expected,
+            )
+        client = ApiTestCase.get_client(self.user)
+        results = [
+            client.get(f"/api/recipes/{recipe.pk}/").json()
+            for recipe in self.recipes
+        ]
+        for field in ("is_favorited", "is_in_shopping_cart"):
+            self.assertEqual(
+                {recipe["id"] for recipe in results if recipe[field]},
+                expected,
+            )
@@ -0,0 +1,91 @@
+from time import sleep
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .base import ApiTestCase
+from api.metrics import (
+    RequestMetrics,
+    current_request_metrics,
+    measure_serialization,
+)
+from api.serializers import TagSerializer
+from recipes.models import Tag
+
+SERIALIZATION_DELAY = 0.02
+
+
+class MetricsViewTest(ApiTestCase):
+    """
+    Метрики отдаются администраторам и адресам из METRICS_ALLOWED_IPS.
+    """
+
+    url = "/api/metrics"
+
+    def test_allowed_ip(self):
+        self.client.get("/api/tags/")
+        response = self.client.get(self.url, REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'foodgram_requests_total{view="tag-list",method="GET",'
+            'status="200"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=("10.0.0.1",))
+    def test_other_ip_is_refused(self):
+        response = self.client.get(self.url, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 401)
+        user = self.create_user("user")
+        response = self.get_client(user).get(
+            self.url, REMOTE_ADDR="10.0.0.2"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=())
+    def test_admin(self):
+        admin = self.create_user("admin", is_staff=True)
+        response = self.get_client(admin).get(
+            self.url, REMOTE_ADDR="10.0.0.2"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class SerializationMetricsTest(SimpleTestCase):
+    """
+    Время сериализации включает построение данных сериализатором,
+    а вложенные замеры учитываются один раз.
+    """
+
+    def measure(self, function):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            function()
+        finally:
+            current_request_metrics.reset(token)
+        return metrics.serialization_duration
+
+    def test_serializer_data_is_measured(self):
+        tags = [
+            Tag(pk=number, name=f"tag {number}", slug=f"tag-{number}")
+            for number in range(2)
+        ]
+        with mock.patch(
+            "rest_framework.fields.CharField.to_representation",
+            side_effect=lambda value: sleep(SERIALIZATION_DELAY) or value,
+        ):
+            duration = self.measure(
+                lambda: TagSerializer(tags, many=True).data
+            )
+        self.assertGreaterEqual(duration, SERIALIZATION_DELAY * 2)
+
+    def test_nested_blocks_are_counted_once(self):
+        def nested():
+            with measure_serialization():
+                with measure_serialization():
+                    sleep(SERIALIZATION_DELAY)
+
+        duration = self.measure(nested)
+        self.assertGreaterEqual(duration, SERIALIZATION_DELAY)
+        self.assertLess(duration, SERIALIZATION_DELAY * 2)
@@ -0,0 +1,118 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import ApiTestCase
+from recipes.models import Favorite
+
+
+class RecipeDetailCacheTest(ApiTestCase):
+    """
+    Закэшированный рецепт обновляется после изменения ингредиентов,
+    тегов и автора, а флаги пользователя не попадают в общий кэш.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.user = cls.create_user("user")
+        cls.tags = [cls.create_tag("breakfast"), cls.create_tag("dinner")]
+        cls.ingredients = cls.create_base_ingredients(3)
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(
+            self.author, tags=self.tags[:1], ingredients=self.ingredients[:2]
+        )
+        self.url = f"/api/recipes/{self.recipe.pk}/"
+        self.client = self.get_client(self.user)
+
+    def get_detail(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def change(self, function, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            function(*args, **kwargs)
+        return self.get_detail()
+
+    def test_detail_is_served_from_cache(self):
+        self.get_detail()
+        with CaptureQueriesContext(connection) as context:
+            self.get_detail()
+        self.assertFalse(
+            any(
+                "recipes_ingredient" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_ingredient_amount_change(self):
+        self.get_detail()
+        ingredient = self.recipe.ingredient_to_recipe.first()
+        ingredient.amount = 500
+        data = self.change(ingredient.save)
+        self.assertIn(500, [item["amount"] for item in data["ingredients"]])
+
+    def test_ingredients_update_through_api(self):
+        self.get_detail()
+        author_client = self.get_client(self.author)
+        payload = self.get_recipe_payload(self.tags, self.ingredients[2:])
+        # Без нового изображения фоновая обработка не запускается.
+        del payload["image"]
+        data = self.change(
+            author_client.patch, self.url, payload, format="json"
+        )
+        self.assertEqual(
+            [item["id"] for item in data["ingredients"]],
+            [self.ingredients[2].pk],
+        )
+        self.assertEqual(
+            {tag["id"] for tag in data["tags"]},
+            {tag.pk for tag in self.tags},
+        )
+
+    def test_product_rename(self):
+        self.get_detail()
+        product = self.ingredients[0]
+        product.name = "Новое название"
+        data = self.change(product.save)
+        self.assertIn(
+            "Новое название", [item["name"] for item in data["ingredients"]]
+        )
+
+    def test_recipe_tags_change(self):
+        self.get_detail()
+        data = self.change(self.recipe.tags.set, self.tags[1:])
+        self.assertEqual(
+            [tag["slug"] for tag in data["tags"]], [self.tags[1].slug]
+        )
+
+    def test_tag_rename(self):
+        self.get_detail()
+        tag = self.tags[0]
+        tag.name = "Завтрак"
+        data = self.change(tag.save)
+        self.assertEqual([item["name"] for item in data["tags"]], ["Завтрак"])
+
+    def test_author_rename(self):
+        self.get_detail()
+        self.author.first_name = "Новое имя"
+        data = self.change(self.author.save)
+        self.assertEqual(data["author"]["first_name"], "Новое имя")
+
+    def test_user_flags_are_not_shared(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(
+                subscriber=self.user, subscribed_recipe=self.recipe
+            )
+        self.assertTrue(self.get_detail()["is_favorited"])
+        other = self.get_client(self.author).get(self.url).json()
+        self.assertFalse(other["is_favorited"])
+        self.assertTrue(self.get_detail()["is_favorited"])
+
+    def test_list_filters_are_ignored(self):
+        for _ in range(2):
+            response = self.client.get(self.url, {"is_favorited": 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.json()["is_favorited"])
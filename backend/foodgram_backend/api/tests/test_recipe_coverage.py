@@ -0,0 +1,44 @@
+from .base import ApiTestCase
+
+URL = "/api/recipes/by_ingredients/"
+
+
+class RecipeCoverageTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.products = cls.create_base_ingredients(4)
+        first, second, third, fourth = cls.products
+        cls.full = cls.create_recipe(
+            cls.author, name="Все есть", ingredients=(first, second)
+        )
+        cls.half = cls.create_recipe(
+            cls.author, name="Половина", ingredients=(first, third)
+        )
+        cls.other = cls.create_recipe(
+            cls.author, name="Другое", ingredients=(fourth,)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+
+    def get_coverage(self, **params):
+        response = self.client.get(
+            URL, {"ingredients": [p.pk for p in self.products[:2]], **params}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_recipes_are_ordered_by_coverage(self):
+        data = self.get_coverage()
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(
+            [(recipe["id"], recipe["coverage"]) for recipe in data["results"]],
+            [(self.full.pk, 1.0), (self.half.pk, 0.5)],
+        )
+
+    def test_cursor_pagination_is_ignored(self):
+        self.assertEqual(
+            self.get_coverage(pagination="cursor"), self.get_coverage()
+        )
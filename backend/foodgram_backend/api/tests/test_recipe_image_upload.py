@@ -0,0 +1,131 @@
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .base import IMAGE, ApiTestCase
+from recipes.models import Recipe, RecipeImage
+
+URL = "/api/recipes/images/"
+
+
+def get_png(size=(4, 4)):
+    buffer = BytesIO()
+    Image.new("RGB", size).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class RecipeImageUploadTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("user")
+        self.client = self.get_client(self.user)
+        self.tag = self.create_tag("lunch")
+        self.ingredients = self.create_base_ingredients(1)
+
+    def upload(self, client=None, content=None):
+        return (client or self.client).post(
+            URL,
+            {"image": SimpleUploadedFile("Photo.PNG", content or get_png())},
+            format="multipart",
+        )
+
+    def get_payload(self, **fields):
+        payload = self.get_recipe_payload((self.tag,), self.ingredients)
+        payload.pop("image")
+        payload.update(fields)
+        return payload
+
+    def test_multipart_upload(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201, response.content)
+        image = RecipeImage.objects.get(pk=response.json()["id"])
+        self.assertEqual(image.owner, self.user)
+        self.assertTrue(image.image.name.endswith(".png"))
+        self.assertNotIn("Photo", image.image.name)
+        self.assertTrue(response.json()["image"].endswith(image.image.name))
+        with image.image.open("rb") as file:
+            self.assertEqual(file.read(), get_png())
+
+    def test_raw_body_upload(self):
+        response = self.client.post(
+            URL,
+            get_png(),
+            content_type="image/png",
+            HTTP_CONTENT_DISPOSITION="attachment; filename=photo.png",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(RecipeImage.objects.filter(owner=self.user).exists())
+
+    def test_anonymous_upload_is_rejected(self):
+        self.assertEqual(self.upload(self.get_client()).status_code, 401)
+
+    def test_not_an_image_is_rejected(self):
+        response = self.upload(content=b"not an image")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image", response.json())
+        self.assertFalse(RecipeImage.objects.exists())
+
+    def test_size_limit(self):
+        content = get_png((200, 200))
+        with override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=len(content) - 1):
+            response = self.upload(content=content)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("errors", response.json())
+        self.assertFalse(RecipeImage.objects.exists())
+
+    def test_create_recipe_with_uploaded_image(self):
+        image = RecipeImage.objects.get(pk=self.upload().json()["id"])
+        response = self.client.post(
+            "/api/recipes/", self.get_payload(image_id=image.pk), format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get(pk=response.json()["id"])
+        self.assertEqual(recipe.image.name, image.image.name)
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+        self.assertFalse(RecipeImage.objects.filter(pk=image.pk).exists())
+
+    def test_update_recipe_with_uploaded_image(self):
+        recipe = self.create_recipe(self.user)
+        image = RecipeImage.objects.get(pk=self.upload().json()["id"])
+        response = self.client.patch(
+            f"/api/recipes/{recipe.pk}/",
+            self.get_payload(image_id=image.pk),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, image.image.name)
+
+    def test_invalid_image_references(self):
+        other = self.get_client(self.create_user("other"))
+        image_id = self.upload(other).json()["id"]
+        for fields in (
+            {"image_id": image_id},
+            {"image_id": 0},
+            {"image_id": self.upload().json()["id"], "image": IMAGE},
+            {},
+        ):
+            with self.subTest(fields=list(fields)):
+                response = self.client.post(
+                    "/api/recipes/", self.get_payload(**fields), format="json"
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_unused_uploads_are_deleted(self):
+        old, new = (
+            RecipeImage.objects.get(pk=self.upload().json()["id"])
+            for _ in range(2)
+        )
+        RecipeImage.objects.filter(pk=old.pk).update(
+            created=timezone.now() - timedelta(hours=25)
+        )
+        call_command("delete_unused_recipe_images", stdout=StringIO())
+        self.assertEqual(list(RecipeImage.objects.all()), [new])
+        self.assertFalse(old.image.storage.exists(old.image.name))
+        self.assertTrue(new.image.storage.exists(new.image.name))
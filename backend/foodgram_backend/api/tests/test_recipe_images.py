@@ -0,0 +1,131 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from PIL import Image
+
+from .base import ApiTestCase
+from api.images import create_image_variants, get_variant_names, save_variant
+from recipes.models import Recipe
+
+SIZES = {"list": 40, "detail": 100}
+
+
+def get_image_file(mode="RGB", size=(300, 150), image_format="PNG"):
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+    return ContentFile(buffer.getvalue())
+
+
+def run_now(function, *args):
+    return function(*args)
+
+
+@override_settings(RECIPE_IMAGE_SIZES=SIZES)
+class ImageVariantsTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.recipe = self.create_recipe(self.author)
+
+    def set_image(self, file, name="image.png"):
+        self.recipe.image.save(name, file)
+        return self.recipe.image.name
+
+    def open_variant(self, name):
+        storage = self.recipe.image.storage
+        with storage.open(name) as file:
+            image = Image.open(file)
+            image.load()
+        return image
+
+    def test_variants_are_resized_copies(self):
+        self.set_image(get_image_file("RGBA"))
+        variants = create_image_variants(self.recipe.pk)
+        self.assertEqual(set(variants), set(get_variant_names()))
+        for size_name, size in SIZES.items():
+            with self.subTest(size=size_name):
+                image = self.open_variant(variants[size_name])
+                self.assertEqual(image.format, "PNG")
+                self.assertEqual(image.size, (size, size // 2))
+                webp = self.open_variant(variants[f"{size_name}_webp"])
+                self.assertEqual(webp.format, "WEBP")
+                self.assertEqual(webp.size, (size, size // 2))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, variants)
+
+    def test_opaque_image_is_saved_as_jpeg(self):
+        self.set_image(get_image_file("P"))
+        variants = create_image_variants(self.recipe.pk)
+        self.assertEqual(self.open_variant(variants["list"]).format, "JPEG")
+        self.assertTrue(variants["list"].endswith(".jpg"))
+
+    def test_urls_fall_back_to_original(self):
+        name = self.set_image(get_image_file())
+        client = self.get_client(self.author)
+        url = f"/api/recipes/{self.recipe.pk}/"
+        urls = client.get(url).json()["image_variants"]
+        self.assertEqual(set(urls), set(get_variant_names()))
+        self.assertTrue(all(value.endswith(name) for value in urls.values()))
+        with self.captureOnCommitCallbacks(execute=True):
+            variants = create_image_variants(self.recipe.pk)
+        urls = client.get(url).json()["image_variants"]
+        for variant_name, value in urls.items():
+            self.assertTrue(value.endswith(variants[variant_name]))
+
+    def test_obsolete_variants_are_deleted(self):
+        self.set_image(get_image_file(), "old.png")
+        old = create_image_variants(self.recipe.pk)
+        self.set_image(get_image_file(), "new.png")
+        storage = self.recipe.image.storage
+        new = create_image_variants(self.recipe.pk, tuple(old.values()))
+        self.assertTrue(all(storage.exists(name) for name in new.values()))
+        self.assertFalse(any(storage.exists(name) for name in old.values()))
+
+    def test_variants_of_replaced_image_are_discarded(self):
+        self.set_image(get_image_file())
+        saved = []
+
+        def replace_image_and_save(storage, *args):
+            if not saved:
+                Recipe.objects.filter(pk=self.recipe.pk).update(
+                    image="recipes/image/other.png"
+                )
+            saved.append(save_variant(storage, *args))
+            return saved[-1]
+
+        with mock.patch(
+            "api.images.save_variant", side_effect=replace_image_and_save
+        ):
+            self.assertEqual(create_image_variants(self.recipe.pk), {})
+        storage = self.recipe.image.storage
+        self.assertFalse(any(storage.exists(name) for name in saved))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_broken_image_is_skipped(self):
+        self.set_image(ContentFile(b"not an image"))
+        with self.assertLogs("api.images", "WARNING"):
+            self.assertEqual(create_image_variants(self.recipe.pk), {})
+
+    @mock.patch("api.images.process_image_variants", create_image_variants)
+    @mock.patch("api.images.executor.submit", run_now)
+    def test_variants_are_created_after_commit(self):
+        client = self.get_client(self.author)
+        tag = self.create_tag("lunch")
+        ingredients = self.create_base_ingredients(1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post(
+                "/api/recipes/",
+                self.get_recipe_payload((tag,), ingredients),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get(pk=response.json()["id"])
+        self.assertEqual(recipe.image_variants, {})
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+        recipe.refresh_from_db()
+        self.assertEqual(set(recipe.image_variants), set(get_variant_names()))
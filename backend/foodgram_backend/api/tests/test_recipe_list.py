@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import ApiTestCase
+from recipes.models import Favorite, ShoppingList
+from users.models import Subscription
+
+
+class RecipeListTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("user")
+        cls.author = cls.create_user("author")
+        cls.other = cls.create_user("other")
+        tags = (cls.create_tag("breakfast"), cls.create_tag("dinner"))
+        base_ingredients = cls.create_base_ingredients(3)
+        cls.recipes = [
+            cls.create_recipe(
+                author,
+                name=f"Рецепт {number}",
+                tags=tags[:number % 2 + 1],
+                ingredients=base_ingredients[:number % 3 + 1],
+            )
+            for number, author in enumerate((cls.author, cls.other) * 4)
+        ]
+        cls.favorite, cls.in_cart = cls.recipes[:2]
+        Favorite.objects.create(
+            subscriber=cls.user, subscribed_recipe=cls.favorite
+        )
+        ShoppingList.objects.create(
+            subscriber=cls.user, subscribed_recipe=cls.in_cart
+        )
+        Subscription.objects.create(user=cls.user, author=cls.author)
+
+    def get_page(self, client, **params):
+        response = client.get("/api/recipes/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {recipe["id"]: recipe for recipe in response.json()["results"]}
+
+    def get_all(self, client):
+        return self.get_page(client, pagination="cursor", limit=8)
+
+    def test_flags(self):
+        recipes = self.get_all(self.get_client(self.user))
+        for recipe in self.recipes:
+            with self.subTest(recipe=recipe.name):
+                data = recipes[recipe.pk]
+                self.assertEqual(
+                    data["is_favorited"], recipe == self.favorite
+                )
+                self.assertEqual(
+                    data["is_in_shopping_cart"], recipe == self.in_cart
+                )
+                self.assertEqual(
+                    data["author"]["is_subscribed"],
+                    recipe.author == self.author,
+                )
+
+    def test_anonymous_flags_are_false(self):
+        for data in self.get_all(self.get_client()).values():
+            self.assertFalse(data["is_favorited"])
+            self.assertFalse(data["is_in_shopping_cart"])
+            self.assertFalse(data["author"]["is_subscribed"])
+
+    def test_tags_and_ingredients(self):
+        recipes = self.get_all(self.get_client(self.user))
+        for number, recipe in enumerate(self.recipes):
+            with self.subTest(recipe=recipe.name):
+                data = recipes[recipe.pk]
+                self.assertEqual(len(data["tags"]), number % 2 + 1)
+                self.assertEqual(
+                    [ingredient["amount"] for ingredient in data["ingredients"]],
+                    list(range(1, number % 3 + 2)),
+                )
+
+    def count_queries(self, client, size, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.get_page(client, **params)), size)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        client = self.get_client(self.user)
+        self.get_page(client)
+        self.assertEqual(
+            self.count_queries(client, 6),
+            self.count_queries(client, 2, page=2),
+        )
+        self.assertEqual(
+            self.count_queries(client, 2, pagination="cursor", limit=2),
+            self.count_queries(client, 8, pagination="cursor", limit=8),
+        )
@@ -0,0 +1,39 @@
+from .base import ApiTestCase
+
+
+class RecipeCursorPaginationTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        for number in range(8):
+            cls.create_recipe(cls.author, name=f"Суп {number}")
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+
+    def test_cursor_pages_follow_publication_order(self):
+        response = self.client.get(
+            "/api/recipes/", {"pagination": "cursor", "limit": 5}
+        )
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertNotIn("count", first)
+        second = self.client.get(first["next"]).json()
+        ids = [
+            recipe["id"] for recipe in first["results"] + second["results"]
+        ]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 8)
+
+    def test_cursor_with_search_is_rejected(self):
+        response = self.client.get(
+            "/api/recipes/", {"pagination": "cursor", "search": "суп"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pagination", response.json())
+
+    def test_search_keeps_page_number_pagination(self):
+        response = self.client.get("/api/recipes/", {"search": "суп"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 8)
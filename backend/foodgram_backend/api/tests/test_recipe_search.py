@@ -0,0 +1,87 @@
+from unittest import skipUnless
+
+from django.db import connection
+
+from .base import ApiTestCase
+from api.recipe_search import FTS_TABLE
+from recipes.models import Recipe
+
+URLS = ("/api/recipes/", "/api/async/recipes/")
+
+
+class RecipeSearchTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.soup = cls.create_recipe(cls.author, name="Грибной суп")
+        cls.salad = cls.create_recipe(cls.author, name="Салат")
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+
+    def search(self, url, value):
+        response = self.client.get(url, {"search": value})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_search_by_name(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.search(url, "суп"), [self.soup.pk])
+                self.assertEqual(self.search(url, "гриб"), [self.soup.pk])
+
+    def test_no_match(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.search(url, "пирог"), [])
+
+    def test_punctuation_only(self):
+        for url in URLS:
+            for value in ('"', "!!", '""', "-*"):
+                with self.subTest(url=url, value=value):
+                    self.assertEqual(self.search(url, value), [])
+
+    def test_quotes_inside_words(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.search(url, '"суп'), [self.soup.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        Recipe.objects.filter(pk=self.salad.pk).update(name="Овощной суп")
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertCountEqual(
+                    self.search(url, "суп"), [self.soup.pk, self.salad.pk]
+                )
+        self.soup.delete()
+        self.assertEqual(self.search(URLS[0], "суп"), [self.salad.pk])
+        self.assertEqual(self.search(URLS[0], "салат"), [])
+
+
+@skipUnless(connection.vendor == "sqlite", "Индекс FTS5 есть только в SQLite")
+class SqliteSearchIndexTest(ApiTestCase):
+    """
+    Таблица FTS5 и триггеры создаются сырым SQL в миграциях 0007 и 0008
+    и не видны автодетектору миграций. Если новая миграция пересоздаст
+    таблицу рецептов в SQLite и не восстановит триггеры, индекс
+    перестанет обновляться; этот тест это обнаружит.
+    """
+
+    def test_triggers_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name FROM sqlite_master "
+                "WHERE tbl_name IN (%s, %s) AND type IN ('table', 'trigger')",
+                ("recipes_recipe", FTS_TABLE),
+            )
+            objects = set(cursor.fetchall())
+        self.assertTrue(
+            {
+                ("table", FTS_TABLE),
+                ("trigger", "recipes_recipe_fts_insert"),
+                ("trigger", "recipes_recipe_fts_delete"),
+                ("trigger", "recipes_recipe_fts_update"),
+            } <= objects,
+            objects,
+        )
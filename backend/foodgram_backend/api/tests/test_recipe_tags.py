@@ -0,0 +1,99 @@
+from .base import ApiTestCase
+from recipes.models import Recipe
+
+URLS = ("/api/recipes/", "/api/async/recipes/")
+
+
+class RecipeTagsFilterTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.breakfast = cls.create_tag("breakfast")
+        cls.lunch = cls.create_tag("lunch")
+        cls.dinner = cls.create_tag("dinner")
+        cls.omelette = cls.create_recipe(
+            cls.author, name="Омлет", tags=(cls.breakfast,)
+        )
+        cls.soup = cls.create_recipe(
+            cls.author, name="Суп", tags=(cls.lunch, cls.dinner)
+        )
+        cls.porridge = cls.create_recipe(
+            cls.author, name="Каша", tags=(cls.breakfast, cls.lunch)
+        )
+        cls.create_recipe(cls.author, name="Без тегов")
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+
+    def filter(self, url, *slugs, **params):
+        response = self.client.get(url, {"tags": slugs, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def get_mask(self, recipe):
+        return Recipe.objects.values_list("tags_mask", flat=True).get(
+            pk=recipe.pk
+        )
+
+    def test_any_of_tags(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertCountEqual(
+                    self.filter(url, "breakfast", "lunch"),
+                    [self.omelette.pk, self.soup.pk, self.porridge.pk],
+                )
+                self.assertCountEqual(
+                    self.filter(url, "dinner", tags_mode="any"),
+                    [self.soup.pk],
+                )
+
+    def test_all_of_tags(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.filter(url, "breakfast", "lunch", tags_mode="all"),
+                    [self.porridge.pk],
+                )
+                self.assertEqual(
+                    self.filter(url, "breakfast", "dinner", tags_mode="all"),
+                    [],
+                )
+
+    def test_unknown_tag_is_rejected(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, {"tags": ["breakfast", "unknown"]}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("tags", response.json())
+
+    def test_mask_follows_tags_set_and_clear(self):
+        self.omelette.tags.set((self.lunch, self.dinner))
+        self.assertEqual(
+            self.get_mask(self.omelette),
+            (1 << self.lunch.bit) | (1 << self.dinner.bit),
+        )
+        self.assertCountEqual(
+            self.filter(URLS[0], "lunch", "dinner", tags_mode="all"),
+            [self.soup.pk, self.omelette.pk],
+        )
+        self.omelette.tags.clear()
+        self.assertEqual(self.get_mask(self.omelette), 0)
+        self.assertNotIn(self.omelette.pk, self.filter(URLS[0], "lunch"))
+
+    def test_mask_follows_tag_side_changes(self):
+        self.dinner.tags.add(self.omelette)
+        self.assertIn(self.omelette.pk, self.filter(URLS[0], "dinner"))
+        self.dinner.tags.clear()
+        self.assertEqual(self.filter(URLS[0], "dinner"), [])
+        self.assertEqual(self.get_mask(self.soup), 1 << self.lunch.bit)
+
+    def test_deleted_tag_bit_is_cleared_and_reused(self):
+        bit = self.dinner.bit
+        self.dinner.delete()
+        self.assertEqual(self.get_mask(self.soup), 1 << self.lunch.bit)
+        supper = self.create_tag("supper")
+        self.assertEqual(supper.bit, bit)
+        self.assertEqual(self.filter(URLS[0], "supper"), [])
@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import ApiTestCase
+from recipes.models import Recipe
+
+
+class RecipeWriteQueriesTest(ApiTestCase):
+    """
+    Количество запросов при создании и изменении рецепта
+    не зависит от количества ингредиентов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.tags = [cls.create_tag("breakfast"), cls.create_tag("dinner")]
+        cls.ingredients = cls.create_base_ingredients(80)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.author)
+        # Первый запрос создает токен, версии кэша и множества
+        # избранного и списка покупок автора.
+        self.client.post(
+            "/api/recipes/",
+            self.get_recipe_payload(self.tags, self.ingredients[:1]),
+            format="json",
+        )
+
+    def count_queries(self, method, url, ingredients):
+        payload = self.get_recipe_payload(self.tags, ingredients)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(
+                url, payload, format="json"
+            )
+        self.assertIn(response.status_code, (200, 201), response.content)
+        self.assertEqual(
+            len(response.json()["ingredients"]), len(ingredients)
+        )
+        return len(context.captured_queries)
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        one = self.count_queries("post", "/api/recipes/", self.ingredients[:1])
+        many = self.count_queries(
+            "post", "/api/recipes/", self.ingredients[:40]
+        )
+        self.assertEqual(one, many)
+        with self.assertNumQueries(one):
+            self.client.post(
+                "/api/recipes/",
+                self.get_recipe_payload(self.tags, self.ingredients[40:80]),
+                format="json",
+            )
+
+    def test_update_queries_do_not_depend_on_ingredients(self):
+        recipe = self.create_recipe(
+            self.author, tags=self.tags, ingredients=self.ingredients[:2]
+        )
+        url = f"/api/recipes/{recipe.pk}/"
+        one = self.count_queries("patch", url, self.ingredients[2:3])
+        many = self.count_queries("patch", url, self.ingredients[3:43])
+        self.assertEqual(one, many)
+        with self.assertNumQueries(one):
+            self.client.patch(
+                url,
+                self.get_recipe_payload(self.tags, self.ingredients[43:44]),
+                format="json",
+            )
+        self.assertEqual(
+            list(
+                Recipe.objects.get(pk=recipe.pk)
+                .ingredient_to_recipe.values_list("ingredient", flat=True)
+            ),
+            [self.ingredients[43].pk],
+        )
@@ -0,0 +1,63 @@
+from .base import ApiTestCase
+from recipes.models import BaseIngredient
+
+
+class VersionedReferenceTest(ApiTestCase):
+    """
+    Справочники отдают 304 на совпадающий ETag и новый ETag с новыми
+    данными после изменения справочника.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.create_user("user"))
+        self.create_tag("breakfast")
+        self.create_base_ingredients(2)
+
+    def assert_changed_after_304(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            .status_code,
+            304,
+        )
+        return response.json()
+
+    def test_tags(self):
+        for url in ("/api/tags/", "/api/async/tags/"):
+            with self.subTest(url=url):
+                slug = f"tag-{len(url)}"
+                data = self.assert_changed_after_304(
+                    url, lambda: self.create_tag(slug)
+                )
+                self.assertIn(slug, [tag["slug"] for tag in data])
+
+    def test_ingredients(self):
+        for url in ("/api/ingredients/", "/api/async/ingredients/"):
+            with self.subTest(url=url):
+                name = f"Соль {len(url)}"
+                data = self.assert_changed_after_304(
+                    url,
+                    lambda: BaseIngredient.objects.create(
+                        name=name, measurement_unit="г"
+                    ),
+                )
+                self.assertIn(name, [item["name"] for item in data])
+
+    def test_version_is_bumped_after_commit(self):
+        url = "/api/tags/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_tag("lunch")
+            self.assertEqual(self.client.get(url)["ETag"], etag)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
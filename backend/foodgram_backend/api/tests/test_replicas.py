@@ -0,0 +1,72 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.replicas import (
+    ReplicaRouter,
+    RequestRouting,
+    current_request_routing,
+    read_from_primary,
+    stick_to_primary,
+)
+from recipes.models import Recipe
+from users.models import User
+
+
+@override_settings(DATABASE_REPLICAS=("replica_1",), REPLICA_STICKY_TIMEOUT=60)
+class ReplicaRouterTest(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def route(self, method="get", user=None, model=Recipe, before=None):
+        request = getattr(self.factory, method)("/api/recipes/")
+        request.user = user or AnonymousUser()
+        routing = RequestRouting(request)
+        token = current_request_routing.set(routing)
+        try:
+            if before is not None:
+                before(routing)
+            return self.router.db_for_read(model)
+        finally:
+            current_request_routing.reset(token)
+
+    def test_safe_methods_read_from_replica(self):
+        self.assertEqual(self.route("get"), "replica_1")
+        self.assertEqual(self.route("head"), "replica_1")
+
+    def test_unsafe_methods_read_from_primary(self):
+        for method in ("post", "patch", "delete"):
+            with self.subTest(method=method):
+                self.assertEqual(self.route(method), "default")
+
+    def test_read_after_write_uses_primary(self):
+        def write(routing):
+            self.assertEqual(self.router.db_for_write(Recipe), "default")
+
+        self.assertEqual(self.route(before=write), "default")
+
+    def test_tokens_are_read_from_primary(self):
+        self.assertEqual(self.route(model=Token), "default")
+
+    def test_read_from_primary_block(self):
+        with read_from_primary():
+            self.assertEqual(self.route(), "default")
+
+    def test_user_sticks_to_primary_after_write(self):
+        user = User(pk=10_001)
+        self.assertEqual(self.route(user=user), "replica_1")
+        stick_to_primary(user.pk)
+        self.assertEqual(self.route(user=user), "default")
+        self.assertEqual(self.route(user=User(pk=10_002)), "replica_1")
+
+    def test_no_request_uses_default(self):
+        self.assertIsNone(self.router.db_for_read(Recipe))
+        self.assertEqual(self.router.db_for_write(Recipe), "default")
+
+    def test_migrations_skip_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica_1", "recipes"))
+        self.assertIsNone(self.router.allow_migrate("default", "recipes"))
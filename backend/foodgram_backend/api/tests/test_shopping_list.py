@@ -0,0 +1,384 @@
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO
+from threading import Barrier, Lock
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from reportlab.pdfbase.ttfonts import TTFont
+
+from .base import ApiTestCase
+from api.cache import (
+    SHOPPING_LIST_SUFFIX,
+    cache_shopping_list,
+    evict_shopping_lists,
+    get_cart_version,
+    get_shopping_list_path,
+    get_rows_digest,
+    invalidate_all_shopping_carts,
+    invalidate_shopping_carts,
+    open_shopping_list_file,
+)
+from api.membership import get_membership_cache
+from api.util import (
+    ROWS_PER_PAGE,
+    join_chunks,
+    register_font,
+    render_shopping_list,
+    split_data_by_pages,
+    start_download_shopping_cart,
+)
+from recipes.models import (
+    BaseIngredient,
+    Ingredient,
+    ShoppingList,
+    ShoppingListItem,
+)
+
+INGREDIENTS = [
+    {"name": "Мука", "measurement_unit": "г", "total_amount": 500},
+    {"name": "Яйцо", "measurement_unit": "шт", "total_amount": 3},
+]
+
+PDF_PAGE = re.compile(rb"/Type /Page\b(?!s)")
+
+replace = os.replace
+utime = os.utime
+
+
+def get_ingredients(count):
+    return [
+        {"name": f"Продукт {number}", "measurement_unit": "г",
+         "total_amount": number}
+        for number in range(count)
+    ]
+
+
+class ShoppingListFileTest(TestCase):
+    def render(self, ingredients=INGREDIENTS):
+        file = BytesIO()
+        render_shopping_list(ingredients, file)
+        return file.getvalue()
+
+    def test_same_list_renders_same_file(self):
+        self.assertEqual(self.render(), self.render())
+
+    def test_split_data_by_pages(self):
+        self.assertEqual(list(split_data_by_pages([], 2)), [[]])
+        self.assertEqual(
+            list(split_data_by_pages(range(5), 2)), [[0, 1], [2, 3], [4]]
+        )
+        self.assertEqual(
+            list(split_data_by_pages(iter(range(4)), 2)), [[0, 1], [2, 3]]
+        )
+
+    def test_long_list_is_split_into_pages(self):
+        for count, pages in (
+            (0, 1),
+            (1, 1),
+            (ROWS_PER_PAGE, 1),
+            (ROWS_PER_PAGE + 1, 2),
+            (ROWS_PER_PAGE * 2 + 1, 3),
+        ):
+            with self.subTest(count=count):
+                pdf = self.render(get_ingredients(count))
+                self.assertTrue(pdf.startswith(b"%PDF"))
+                self.assertEqual(len(PDF_PAGE.findall(pdf)), pages)
+
+    def test_font_is_registered_once(self):
+        register_font()
+        register_font.cache_clear()
+        self.addCleanup(register_font.cache_clear)
+        with mock.patch("api.util.TTFont", wraps=TTFont) as font:
+            self.render()
+            self.render()
+        font.assert_called_once()
+
+    def test_download_response(self):
+        response = start_download_shopping_cart(INGREDIENTS)
+        self.assertTrue(response.streaming)
+        self.assertIn(
+            'attachment; filename="shopping_list.pdf"',
+            response["Content-Disposition"],
+        )
+        self.assertEqual(b"".join(response.streaming_content), self.render())
+
+
+class ShoppingListExportTest(ApiTestCase):
+    URL = "/api/recipes/download_shopping_cart/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("user")
+        cls.flour, cls.salt = (
+            BaseIngredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (("Мука", "г"), ("Соль, крупная", "г"))
+        )
+        recipe = cls.create_recipe(
+            cls.user, ingredients=(cls.flour, cls.salt)
+        )
+        ShoppingList.objects.create(
+            subscriber=cls.user, subscribed_recipe=recipe
+        )
+
+    def download(self, user=None, **params):
+        response = self.get_client(user or self.user).get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_txt(self):
+        response, content = self.download(format="txt")
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertIn("shopping_list.txt", response["Content-Disposition"])
+        self.assertEqual(content, "мука (г) - 1\nсоль, крупная (г) - 2\n")
+
+    def test_csv(self):
+        response, content = self.download(format="csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            list(csv.reader(content.splitlines())),
+            [
+                ["name", "measurement_unit", "amount"],
+                ["Мука", "г", "1"],
+                ["Соль, крупная", "г", "2"],
+            ],
+        )
+
+    def test_json(self):
+        response, content = self.download(format="json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(content),
+            [
+                {"id": self.flour.pk, "name": "Мука",
+                 "measurement_unit": "г", "amount": 1},
+                {"id": self.salt.pk, "name": "Соль, крупная",
+                 "measurement_unit": "г", "amount": 2},
+            ],
+        )
+
+    def test_empty_cart(self):
+        user = self.create_user("empty")
+        for file_format, expected in (
+            ("txt", ""),
+            ("csv", "name,measurement_unit,amount\r\n"),
+            ("json", "[]"),
+        ):
+            with self.subTest(format=file_format):
+                _, content = self.download(user, format=file_format)
+                self.assertEqual(content, expected)
+
+    def test_pdf_is_default(self):
+        response = self.get_client(self.user).get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(
+            b"".join(response.streaming_content).startswith(b"%PDF")
+        )
+
+    def test_unknown_format_and_anonymous(self):
+        response = self.get_client(self.user).get(self.URL, {"format": "xls"})
+        self.assertEqual(response.status_code, 404)
+        response = self.get_client().get(self.URL, {"format": "csv"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_join_chunks(self):
+        self.assertEqual(
+            list(join_chunks(["a", "b", "c", "d", "e"], rows=2)),
+            ["ab", "cd", "e"],
+        )
+        self.assertEqual(list(join_chunks([])), [])
+
+
+class ShoppingListEvictionTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.names = [f"{number}{SHOPPING_LIST_SUFFIX}" for number in range(3)]
+        for mtime, name in enumerate(self.names):
+            path = os.path.join(self.directory, name)
+            open(path, "wb").close()
+            os.utime(path, (mtime, mtime))
+
+    def evict(self, max_files):
+        with override_settings(
+            SHOPPING_LIST_CACHE_DIR=self.directory,
+            SHOPPING_LIST_CACHE_MAX_FILES=max_files,
+        ):
+            evict_shopping_lists()
+        return sorted(os.listdir(self.directory))
+
+    def test_oldest_files_are_evicted(self):
+        self.assertEqual(self.evict(1), self.names[-1:])
+
+    def test_zero_limit_evicts_all_files(self):
+        self.assertEqual(self.evict(0), [])
+
+
+class ConcurrentEvictionTest(TestCase):
+    """
+    Файл, который другой воркер вытеснил сразу после открытия
+    или сохранения, отдается по уже открытому дескриптору.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(
+            SHOPPING_LIST_CACHE_DIR=directory
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.digest = get_rows_digest(INGREDIENTS)
+
+    def evict(self):
+        os.remove(get_shopping_list_path(self.digest))
+
+    def utime_after_eviction(self, path):
+        self.evict()
+        utime(path)
+
+    def replace_and_evict(self, source, destination):
+        replace(source, destination)
+        self.evict()
+
+    def test_file_evicted_after_open(self):
+        cache_shopping_list(1, "version", INGREDIENTS).close()
+        with mock.patch(
+            "api.cache.os.utime", side_effect=self.utime_after_eviction
+        ):
+            file = open_shopping_list_file(self.digest)
+        with file:
+            self.assertTrue(file.read().startswith(b"%PDF"))
+
+    def test_file_evicted_after_save(self):
+        with mock.patch(
+            "api.cache.os.replace", side_effect=self.replace_and_evict
+        ):
+            file = cache_shopping_list(1, "version", INGREDIENTS)
+        with file:
+            self.assertTrue(file.read().startswith(b"%PDF"))
+
+
+class ShoppingCartVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cart_version_changes_after_commit(self):
+        version = get_cart_version(1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            invalidate_shopping_carts((1,))
+            self.assertEqual(get_cart_version(1), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_cart_version(1), version)
+
+    def test_all_carts_version_changes_after_commit(self):
+        version = get_cart_version(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_all_shopping_carts()
+            self.assertEqual(get_cart_version(1), version)
+        self.assertNotEqual(get_cart_version(1), version)
+
+
+class ConcurrentShoppingCartTest(TransactionTestCase):
+    """
+    Массовое и одиночные добавления в список покупок одного
+    пользователя одновременно: запросы не падают, а строки списка
+    покупок совпадают с продуктами рецептов в нем.
+
+    Тестовая база SQLite в памяти не допускает одновременной записи
+    из разных соединений, поэтому на ней запросы потоков чередуются
+    под блокировкой. На PostgreSQL они выполняются одновременно.
+    """
+
+    def setUp(self):
+        self.lock = (
+            Lock() if connection.vendor == "sqlite" else nullcontext()
+        )
+        cache.clear()
+        get_membership_cache().clear()
+        self.user = ApiTestCase.create_user("user")
+        author = ApiTestCase.create_user("author")
+        base_ingredients = ApiTestCase.create_base_ingredients(3)
+        self.recipes = [
+            ApiTestCase.create_recipe(
+                author,
+                name=f"Рецепт {number}",
+                ingredients=base_ingredients[number % 2:],
+            )
+            for number in range(6)
+        ]
+        self.clients = [ApiTestCase.get_client(self.user) for _ in range(2)]
+        self.barrier = Barrier(2, timeout=10)
+
+    def add_in_bulk(self, client, recipes):
+        try:
+            self.barrier.wait()
+            with self.lock:
+                return [
+                    client.post(
+                        "/api/recipes/shopping_cart/",
+                        {"recipes": [recipe.pk for recipe in recipes]},
+                        format="json",
+                    ).status_code
+                ]
+        finally:
+            connection.close()
+
+    def add_one_by_one(self, client, recipes):
+        statuses = []
+        try:
+            self.barrier.wait()
+            for recipe in recipes:
+                with self.lock:
+                    statuses.append(
+                        client.post(
+                            f"/api/recipes/{recipe.pk}/shopping_cart/"
+                        ).status_code
+                    )
+        finally:
+            connection.close()
+        return statuses
+
+    def test_bulk_and_single_add(self):
+        with ThreadPoolExecutor(2) as executor:
+            bulk = executor.submit(
+                self.add_in_bulk, self.clients[0], self.recipes[:4]
+            )
+            single = executor.submit(
+                self.add_one_by_one, self.clients[1], self.recipes[2:]
+            )
+            statuses = bulk.result() + single.result()
+        self.assertTrue(all(code < 500 for code in statuses), statuses)
+        self.assertEqual(
+            set(
+                ShoppingList.objects.filter(subscriber=self.user)
+                .values_list("subscribed_recipe", flat=True)
+            ),
+            {recipe.pk for recipe in self.recipes},
+        )
+        expected = Counter()
+        for ingredient_id, amount in Ingredient.objects.filter(
+            to_recipe__in=self.recipes
+        ).values_list("ingredient", "amount"):
+            expected[ingredient_id] += amount
+        self.assertEqual(
+            dict(
+                ShoppingListItem.objects.filter(
+                    user=self.user, total_amount__gt=0
+                ).values_list("ingredient", "total_amount")
+            ),
+            dict(expected),
+        )
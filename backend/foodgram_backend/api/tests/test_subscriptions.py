@@ -0,0 +1,97 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import ApiTestCase
+from api.serializers import RECIPES_LIMIT_DEFAULT
+from users.models import Subscription
+
+URLS = ("/api/users/subscriptions/", "/api/async/users/subscriptions/")
+
+
+class SubscriptionListTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("user")
+        cls.recipes = {}
+        for number, count in enumerate((8, 2, 0)):
+            author = cls.create_user(f"author{number}")
+            cls.recipes[author.pk] = [
+                cls.create_recipe(author, name=f"Рецепт {recipe}").pk
+                for recipe in range(count)
+            ][::-1]
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def get_list(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def get_recipes(self, url, **params):
+        return {
+            item["id"]: (
+                [recipe["id"] for recipe in item["recipes"]],
+                item["recipes_count"],
+            )
+            for item in self.get_list(url, **params)["results"]
+        }
+
+    def test_recipes_window(self):
+        for url in URLS:
+            for limit in (None, 1, 3, 20):
+                with self.subTest(url=url, recipes_limit=limit):
+                    params = {} if limit is None else {"recipes_limit": limit}
+                    self.assertEqual(
+                        self.get_recipes(url, **params),
+                        {
+                            author_id: (
+                                recipes[:limit or RECIPES_LIMIT_DEFAULT],
+                                len(recipes),
+                            )
+                            for author_id, recipes in self.recipes.items()
+                        },
+                    )
+
+    def test_zero_recipes_limit(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                recipes = self.get_recipes(url, recipes_limit=0)
+                self.assertEqual(
+                    [count for _, count in recipes.values()], [8, 2, 0]
+                )
+                self.assertTrue(all(not ids for ids, _ in recipes.values()))
+
+    def test_invalid_recipes_limit(self):
+        for url in URLS:
+            for limit in ("-1", "a", "1.5"):
+                with self.subTest(url=url, recipes_limit=limit):
+                    response = self.client.get(url, {"recipes_limit": limit})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("recipes_limit", response.json())
+
+    def test_pagination(self):
+        authors = list(self.recipes)
+        for url in URLS:
+            with self.subTest(url=url):
+                data = self.get_list(url, limit=2, offset=1)
+                self.assertEqual(data["count"], 3)
+                self.assertEqual(
+                    [item["id"] for item in data["results"]],
+                    authors[1:],
+                )
+                self.assertTrue(
+                    all(item["is_subscribed"] for item in data["results"])
+                )
+
+    def test_query_count_does_not_depend_on_authors(self):
+        url = URLS[0]
+        self.get_list(url)
+        counts = []
+        for limit in (1, 3):
+            with CaptureQueriesContext(connection) as queries:
+                self.get_list(url, limit=limit)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
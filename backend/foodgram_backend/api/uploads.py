@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "upload_too_large"
+
+    def __init__(self, max_size):
+        super().__init__(
+            detail={
+                "errors": (
+                    "Размер файла не должен превышать "
+                    f"{round(max_size / (1024 * 1024), 1):g} МБ."
+                )
+            }
+        )
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Прерывает загрузку, как только тело запроса или файл превышают
+    max_size байт. Ставится первым обработчиком, поэтому проверка
+    выполняется до того, как следующие обработчики запишут очередной
+    фрагмент в память или во временный файл.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length and content_length > self.max_size:
+            raise UploadTooLarge(self.max_size)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            raise UploadTooLarge(self.max_size)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -4,10 +4,12 @@ from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (
     AuthorSubscriptionViewSet,
     BaseIngredientsViewSet,
     GetAuthorSubscriptionViewSet,
+    MetricsView,
     RecipeViewSet,
     TagViewSet,
 )
@@ -40,8 +42,40 @@ v1_router.register(
     basename="ingredients",
 )
 
+async_urlpatterns = [
+    path(
+        "recipes/", async_views.recipe_list, name="async-recipe-list"
+    ),
+    path(
+        "recipes/<int:pk>/",
+        async_views.recipe_detail,
+        name="async-recipe-detail",
+    ),
+    path("tags/", async_views.tag_list, name="async-tag-list"),
+    path(
+        "tags/<int:pk>/", async_views.tag_detail, name="async-tag-detail"
+    ),
+    path(
+        "ingredients/",
+        async_views.ingredient_list,
+        name="async-ingredients-list",
+    ),
+    path(
+        "ingredients/<int:pk>/",
+        async_views.ingredient_detail,
+        name="async-ingredients-detail",
+    ),
+    path(
+        "users/subscriptions/",
+        async_views.subscription_list,
+        name="async-subscriptions-list",
+    ),
+]
+
 urlpatterns = [
     path("", include(v1_router.urls)),
+    path("async/", include(async_urlpatterns)),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
     re_path(
@@ -1,8 +1,12 @@
-import io
-from datetime import datetime
+import csv
+import json
+import os
+from functools import cache
+from itertools import islice
+from tempfile import SpooledTemporaryFile
 
 from django.conf import settings
-from django.http import FileResponse
+from django.http import FileResponse, StreamingHttpResponse
 from reportlab.lib.colors import black, white
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -16,28 +20,60 @@ COORD_LAST_CELL = (-1, -1)
 COORD_X_TITLE = 200
 COORD_Y_TITLE = 770
 COORD_X_TABLE = 100
+COORD_Y_TABLE_BOTTOM = 80
 COORD_X_FOOTER = 250
 SIZE_TITLE = 24
 SIZE_TEXT = 20
 SIZE_FOOTER = 14
+ROW_HEIGHT = SIZE_TEXT + 4
+ROWS_PER_PAGE = (
+    (COORD_Y_TITLE - SIZE_TEXT - COORD_Y_TABLE_BOTTOM) // ROW_HEIGHT
+)
+FONT_NAME = "my_font"
+FONT_PATH = os.path.join(settings.BASE_DIR, "data", "font.ttf")
+SPOOL_MAX_SIZE = 1024 * 1024
+STREAM_CHUNK_ROWS = 500
+
+
+@cache
+def register_font():
+    """
+    Функция регистрирует шрифт для PDF-документов.
+    Файл шрифта разбирается один раз за время жизни процесса.
+    """
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
 
 
 def create_data_for_table(ingredients_list=None):
     """
-    Функция преобразует список ингредиентов в список
-    списков для дальнейшего использования в создании таблицы.
+    Функция преобразует список ингредиентов в строки
+    для дальнейшего использования в создании таблицы.
 
     Возвращает:
-    data - данные с названием ингредиента,
+    генератор строк с названием ингредиента,
     его количеством и единицей измерения.
     """
-    data = []
     for ingredient in ingredients_list:
         name = str(ingredient.get("name"))
         amount = str(ingredient.get("total_amount"))
         unit = str(ingredient.get("measurement_unit"))
-        data.append([name.lower(), amount.lower(), unit.lower()])
-    return data
+        yield [name.lower(), amount.lower(), unit.lower()]
+
+
+def split_data_by_pages(data, rows_per_page=ROWS_PER_PAGE):
+    """
+    Функция разбивает строки таблицы на страницы.
+
+    Возвращает:
+    генератор списков строк, каждый из которых помещается
+    на одну страницу. Для пустого списка возвращается одна
+    пустая страница.
+    """
+    data = iter(data)
+    page = list(islice(data, rows_per_page))
+    yield page
+    while page := list(islice(data, rows_per_page)):
+        yield page
 
 
 def create_table(pdf, data=None):
@@ -48,50 +84,152 @@ def create_table(pdf, data=None):
     bottom_coord_table - координаты
     нижнего левого угла таблицы.
     """
-    table = Table(data)
+    y_table = COORD_Y_TITLE - SIZE_TEXT - len(data) * ROW_HEIGHT
+    if not data:
+        return COORD_X_TABLE, y_table
+    table = Table(data, rowHeights=ROW_HEIGHT)
     table.setStyle(
         TableStyle(
             [
                 ("BACKGROUND", COORD_FIRST_CELL, COORD_LAST_CELL, white),
                 ("TEXTCOLOR", COORD_FIRST_CELL, COORD_LAST_CELL, black),
                 ("ALIGN", COORD_FIRST_CELL, COORD_LAST_CELL, "LEFT"),
-                ("FONTNAME", COORD_FIRST_CELL, COORD_LAST_CELL, "my_font"),
+                ("FONTNAME", COORD_FIRST_CELL, COORD_LAST_CELL, FONT_NAME),
                 ("FONTSIZE", COORD_FIRST_CELL, COORD_LAST_CELL, SIZE_TEXT),
             ]
         )
     )
-    y_table = COORD_Y_TITLE - (len(data) + 1) * SIZE_TEXT
     table.wrapOn(pdf, START_X_COORD, START_Y_COORD)
     table.drawOn(pdf, COORD_X_TABLE, y_table)
     bottom_coord_table = (COORD_X_TABLE, y_table)
     return bottom_coord_table
 
 
-def start_download_shopping_cart(ingredients_list=None):
+def render_shopping_list(ingredients_list, file):
     """
-    Функция start_download_shopping_cart генерирует PDF-файл
-    со списком покупок на основе переданного списка ингредиентов,
-    сохраняет его в буфер и возвращает HTTP-ответ с
-    файлом во вложении.
-    """
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer)
-    pdfmetrics.registerFont(TTFont(
-        "my_font", f"{settings.BASE_DIR}/data/font.ttf")
-    )
-    pdf.setFont("my_font", SIZE_TITLE)
+    Функция записывает PDF-документ со списком покупок в файл.
+    Таблица ингредиентов разбивается на страницы, поэтому
+    длинный список не выходит за пределы листа. Документ не содержит
+    времени создания, поэтому одинаковые списки дают одинаковые файлы.
+    """
+    register_font()
+    pdf = canvas.Canvas(file, invariant=True)
     pdf.setTitle("Список покупок!")
-    pdf.drawString(COORD_X_TITLE, COORD_Y_TITLE, "Список покупок!")
-    _, y_table = create_table(pdf, create_data_for_table(ingredients_list))
-    pdf.setFont("my_font", SIZE_FOOTER)
+    pages = split_data_by_pages(create_data_for_table(ingredients_list))
+    for number, page in enumerate(pages):
+        if number:
+            pdf.showPage()
+        pdf.setFont(FONT_NAME, SIZE_TITLE)
+        pdf.drawString(COORD_X_TITLE, COORD_Y_TITLE, "Список покупок!")
+        _, y_table = create_table(pdf, page)
+    pdf.setFont(FONT_NAME, SIZE_FOOTER)
     pdf.drawString(
         COORD_X_FOOTER,
         y_table - SIZE_TEXT * 2,
-        "Список покупок создан при помощи FoodGram в "
-        f"{datetime.now().strftime('%H:%M:%S')}",
+        "Список покупок создан при помощи FoodGram",
     )
     pdf.save()
-    buffer.seek(0)
+
+
+def send_shopping_list_file(file):
+    """
+    Функция возвращает HTTP-ответ с уже сгенерированным
+    файлом списка покупок во вложении.
+    """
     return FileResponse(
-        buffer, as_attachment=True, filename='shopping_list.pdf'
+        file, as_attachment=True, filename="shopping_list.pdf"
+    )
+
+
+def start_download_shopping_cart(ingredients_list=None):
+    """
+    Функция start_download_shopping_cart генерирует PDF-файл
+    со списком покупок на основе переданного списка ингредиентов
+    и возвращает HTTP-ответ с файлом во вложении.
+
+    Документ пишется во временный файл, который держится в памяти
+    до SPOOL_MAX_SIZE байт и затем переносится на диск, а ответ
+    отдается клиенту частями.
+    """
+    buffer = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    render_shopping_list(ingredients_list, buffer)
+    buffer.seek(0)
+    return send_shopping_list_file(buffer)
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: возвращает записанную строку
+    вместо того, чтобы ее сохранять.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_shopping_list_txt(ingredients_list):
+    for name, amount, unit in create_data_for_table(ingredients_list):
+        yield f"{name} ({unit}) - {amount}\n"
+
+
+def iter_shopping_list_csv(ingredients_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for ingredient in ingredients_list:
+        yield writer.writerow(
+            (
+                ingredient["name"],
+                ingredient["measurement_unit"],
+                ingredient["total_amount"],
+            )
+        )
+
+
+def iter_shopping_list_json(ingredients_list):
+    separator = "["
+    for ingredient in ingredients_list:
+        yield separator + json.dumps(
+            {
+                "id": ingredient["ingredient"],
+                "name": ingredient["name"],
+                "measurement_unit": ingredient["measurement_unit"],
+                "amount": ingredient["total_amount"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+SHOPPING_LIST_STREAMS = {
+    "txt": (iter_shopping_list_txt, "text/plain; charset=utf-8"),
+    "csv": (iter_shopping_list_csv, "text/csv; charset=utf-8"),
+    "json": (iter_shopping_list_json, "application/json"),
+}
+
+
+def join_chunks(lines, rows=STREAM_CHUNK_ROWS):
+    """
+    Функция склеивает строки файла в куски по rows строк,
+    чтобы сервер не отправлял каждую строку отдельной записью.
+    """
+    lines = iter(lines)
+    while chunk := "".join(islice(lines, rows)):
+        yield chunk
+
+
+def stream_shopping_list(ingredients_list, file_format):
+    """
+    Функция возвращает HTTP-ответ со списком покупок в формате
+    txt, csv или json во вложении. Строки файла формируются
+    по мере чтения ingredients_list и отдаются клиенту частями,
+    документ целиком в памяти не собирается.
+    """
+    render, content_type = SHOPPING_LIST_STREAMS[file_format]
+    response = StreamingHttpResponse(
+        join_chunks(render(ingredients_list)), content_type=content_type
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="shopping_list.{file_format}"'
     )
+    return response
@@ -62,3 +62,25 @@ def min_value_validator(value, item_name):
         raise ValidationError(
             f"{item_name} должно быть больше 0!",
         )
+
+
+def validate_recipes_limit(value, default):
+    """
+    Проверяет, что recipes_limit - неотрицательное целое число.
+    """
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = -1
+    if value < 0:
+        raise ValidationError(
+            detail={
+                "recipes_limit": (
+                    "Должно быть целым числом больше либо равным 0!"
+                )
+            },
+            code=status.HTTP_400_BAD_REQUEST,
+        )
+    return value
@@ -1,39 +1,101 @@
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Value,
+    Window,
+)
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
+from .bulk import add_recipes, remove_recipes
+from .cache import (
+    BASE_INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    cache_shopping_list,
+    get_cached_shopping_list,
+    get_cart_version,
+)
 from .filter import BaseIngredientFilter, RecipeFilter
+from .membership import FAVORITES, SHOPPING_CART, get_membership
+from .metrics import registry
+from .pagination import RecipeKeysetPagination
 from .permissions import (
     AuthorPermission,
     IsAdminOrReadOnlyPermission,
     IsNotBanPermission,
+    MetricsPermission,
+)
+from .recipe_cache import (
+    add_user_fields,
+    cache_recipe_detail,
+    get_cached_recipe_detail,
+    get_recipe_detail_key,
+    is_subscribed,
 )
+from .recipe_coverage import get_recipe_coverage
+from .renderers import (
+    CSVShoppingListRenderer,
+    MetricsJSONRenderer,
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+)
+from .replicas import read_from_primary
 from .serializers import (
+    RECIPES_LIMIT_DEFAULT,
     AuthorSubscriptionSerializer,
     BaseIngredientSerializer,
+    BulkRecipesSerializer,
     CreateRecipeSerializer,
     FavoriteSerializer,
+    RecipeCoverageQuerySerializer,
+    RecipeImageSerializer,
     RecipeSerializer,
+    ShoppingListItemSerializer,
     ShoppingListSerializer,
     TagSerializer,
+    get_recipe_prefetch_lookups,
+)
+from .shopping_cart import (
+    get_shopping_list,
+    iter_shopping_list,
+    lock_shopping_cart,
+)
+from .uploads import MaxSizeUploadHandler
+from .util import send_shopping_list_file, stream_shopping_list
+from .validators import validate_recipes_limit
+from .viewsets import (
+    CreateAndDestroyViewSet,
+    GetAuthorSubViewSet,
+    VersionedReadOnlyModelViewSet,
+)
+from recipes.models import (
+    BaseIngredient,
+    Recipe,
+    Tag,
 )
-from .util import start_download_shopping_cart
-from .viewsets import CreateAndDestroyViewSet, GetAuthorSubViewSet
-from recipes.models import BaseIngredient, Ingredient, Recipe, Tag
 from users.models import Subscription
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedReadOnlyModelViewSet):
     """
     ViewSet для просмотра списка тегов.
     """
@@ -41,14 +103,16 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_key = TAGS_VERSION_KEY
 
 
-class BaseIngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class BaseIngredientsViewSet(VersionedReadOnlyModelViewSet):
     """
     Базовый ViewSet для просмотра списка ингредиентов.
     Поддерживает фильтрацию по названию ингредиента.
     """
 
+    version_key = BASE_INGREDIENTS_VERSION_KEY
     queryset = BaseIngredient.objects.all()
     permission_classes = (IsAdminOrReadOnlyPermission,)
     pagination_class = None
@@ -56,6 +120,15 @@ class BaseIngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = BaseIngredientFilter
 
+    def filter_queryset(self, queryset):
+        """
+        Продукт по id отдается без фильтра: фильтр ограничивает
+        список срезом, после которого get_object не может искать по id.
+        """
+        if self.action == "retrieve":
+            return queryset
+        return super().filter_queryset(queryset)
+
 
 class GetAuthorSubscriptionViewSet(GetAuthorSubViewSet):
     """
@@ -67,7 +140,53 @@ class GetAuthorSubscriptionViewSet(GetAuthorSubViewSet):
     pagination_class = LimitOffsetPagination
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        return (
+            Subscription.objects.filter(user=self.request.user)
+            .select_related("author")
+            .order_by("id")
+        )
+
+    def list(self, request, *args, **kwargs):
+        recipes_limit = validate_recipes_limit(
+            request.query_params.get("recipes_limit"), RECIPES_LIMIT_DEFAULT
+        )
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        serializer.context["recipes_by_author"] = self.get_recipes_by_author(
+            [subscription.author_id for subscription in page], recipes_limit
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_recipes_by_author(author_ids, recipes_limit):
+        """
+        Возвращает не более recipes_limit последних рецептов каждого
+        автора одним запросом с оконной функцией ROW_NUMBER.
+        """
+        recipes_by_author = {author_id: [] for author_id in author_ids}
+        if not author_ids or not recipes_limit:
+            return recipes_by_author
+        ranked_sql, params = (
+            Recipe.objects.filter(author_id__in=author_ids)
+            .annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F("author_id"),
+                    order_by=(F("pub_date").desc(), F("id").desc()),
+                )
+            )
+            .order_by()
+            .query.sql_with_params()
+        )
+        recipes = Recipe.objects.raw(
+            f"SELECT * FROM ({ranked_sql}) ranked "
+            "WHERE ranked.row_number <= %s "
+            "ORDER BY ranked.author_id, ranked.row_number",
+            (*params, recipes_limit),
+        )
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
 
 
 class AuthorSubscriptionViewSet(CreateAndDestroyViewSet):
@@ -103,14 +222,104 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cursor_pagination_value = "cursor"
+    cursor_search_message = (
+        "Пагинация по курсору упорядочивает рецепты по дате публикации "
+        "и не совместима с параметром search."
+    )
+
+    @property
+    def pagination_class(self):
+        """
+        По умолчанию используется постраничная пагинация с count,
+        с параметром pagination=cursor - пагинация по курсору.
+        Курсор задает порядок по дате публикации, поэтому вместе
+        с поиском, упорядоченным по релевантности, он не принимается,
+        а в by_ingredients, упорядоченном по доле продуктов,
+        не используется.
+        """
+        request = getattr(self, "request", None)
+        if (
+            request is None
+            or self.action != "list"
+            or request.query_params.get("pagination")
+            != self.cursor_pagination_value
+        ):
+            return api_settings.DEFAULT_PAGINATION_CLASS
+        if request.query_params.get("search"):
+            raise ValidationError(
+                {"pagination": [self.cursor_search_message]}
+            )
+        return RecipeKeysetPagination
+
+    def get_queryset(self):
+        """
+        Возвращает рецепты вместе с автором, тегами и ингредиентами,
+        а флаг author_is_subscribed вычисляется подзапросом Exists,
+        поэтому количество запросов к БД не зависит от размера страницы.
+        Флаги is_favorited и is_in_shopping_cart сериализатор берет
+        из закэшированных множеств id рецептов пользователя.
+        """
+        user = self.request.user
+        queryset = (
+            super().get_queryset()
+            .select_related("author")
+            .prefetch_related(*get_recipe_prefetch_lookups())
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                author_is_subscribed=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef("author")
+                )
+            ),
+        )
+
+    def filter_queryset(self, queryset):
+        """
+        Рецепт по id отдается без фильтров списка, как и из кэша
+        в retrieve и в асинхронном recipe_detail: параметры вроде
+        is_favorited или tags в запросе рецепта игнорируются.
+        """
+        if self.action == "retrieve":
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Общая для всех пользователей часть рецепта берется из кэша
+        по версии рецепта, флаги is_favorited, is_in_shopping_cart
+        и author.is_subscribed вычисляются на каждый запрос.
+        """
+        try:
+            recipe_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        key = get_recipe_detail_key(recipe_id, request)
+        data = get_cached_recipe_detail(key)
+        if data is None:
+            with read_from_primary():
+                response = super().retrieve(request, *args, **kwargs)
+            cache_recipe_detail(key, response.data)
+            return response
+        return Response(
+            add_user_fields(
+                data,
+                get_membership(self.get_serializer_context()),
+                is_subscribed(request.user, data["author"]["id"]),
+            )
+        )
 
     def get_permissions(self):
-        if self.request.method == "GET":
+        if self.action in ("list", "retrieve", "by_ingredients"):
             return (
                 IsAuthenticatedOrReadOnly(),
                 IsNotBanPermission(),
             )
-        elif self.request.method in ("PATCH", "DELETE",):
+        elif self.action in ("partial_update", "destroy"):
             return (
                 AuthorPermission(),
                 IsNotBanPermission(),
@@ -155,33 +364,172 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def create_destroy_shopping_cart(self, request, pk=None):
-        serializer = ShoppingListSerializer(
-            context={"request": request}, data=request.data
+        """
+        Проверка и изменение выполняются под блокировкой списка покупок
+        пользователя, как и в массовых добавлении и удалении.
+        """
+        with transaction.atomic():
+            lock_shopping_cart(request.user.id)
+            serializer = ShoppingListSerializer(
+                context={"request": request}, data=request.data
+            )
+            serializer.is_valid(raise_exception=True)
+            if request.method == "POST":
+                serializer.save()
+                return Response(
+                    serializer.data, status=status.HTTP_201_CREATED
+                )
+            serializer.validated_data.delete()
+        return Response({}, status=status.HTTP_204_NO_CONTENT)
+
+    def change_recipes(self, request, kind):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_recipes if request.method == "POST" else remove_recipes
+        return Response(
+            {
+                "results": change(
+                    request.user, kind, serializer.validated_data["recipes"]
+                )
+            }
+        )
+
+    @action(
+        methods=("POST", "DELETE", ),
+        detail=False,
+        url_path="favorite",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        """
+        Добавляет в избранное или удаляет из него сразу несколько
+        рецептов из списка recipes и возвращает результат для каждого.
+        """
+        return self.change_recipes(request, FAVORITES)
+
+    @action(
+        methods=("GET", "POST", "DELETE", ),
+        detail=False,
+        url_path="shopping_cart",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request):
+        """
+        GET возвращает содержимое списка покупок: продукты с суммарным
+        количеством из заранее посчитанных строк. POST и DELETE
+        добавляют в список покупок или удаляют из него сразу несколько
+        рецептов из списка recipes и возвращают результат для каждого.
+        """
+        if request.method == "GET":
+            return Response(
+                ShoppingListItemSerializer(
+                    get_shopping_list(request.user.id), many=True
+                ).data
+            )
+        return self.change_recipes(request, SHOPPING_CART)
+
+    @action(methods=("GET", ), detail=False, url_path="by_ingredients")
+    def by_ingredients(self, request):
+        """
+        Рецепты, которые можно приготовить из продуктов пользователя
+        (параметры ingredients, exclude и min_coverage), по убыванию
+        доли продуктов рецепта, которые у пользователя есть. Рецепты
+        подбираются по обратному индексу продукт -> рецепты в памяти
+        процесса, из БД загружается только страница ответа.
+        """
+        params = RecipeCoverageQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(
+            get_recipe_coverage(**params.validated_data)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, *_ in page]
+        )
+        page = [row for row in page if row[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, *_ in page], many=True
+        )
+        data = [
+            {
+                **recipe,
+                "coverage": round(coverage, 4),
+                "ingredients_matched": count,
+                "ingredients_total": total,
+            }
+            for recipe, (_, coverage, count, total) in zip(
+                serializer.data, page
+            )
+        ]
+        return self.get_paginated_response(data)
+
+    @action(
+        methods=("POST", ),
+        detail=False,
+        url_path="images",
+        permission_classes=(IsAuthenticated, IsNotBanPermission),
+        parser_classes=(MultiPartParser, FileUploadParser),
+    )
+    def upload_image(self, request):
+        """
+        Принимает изображение рецепта в multipart/form-data (поле image)
+        или телом запроса с заголовком Content-Disposition. Файл
+        записывается во временный файл по частям и не копируется
+        в память целиком. Возвращает id для поля image_id рецепта.
+        """
+        request.upload_handlers.insert(0, MaxSizeUploadHandler(request))
+        serializer = RecipeImageSerializer(
+            data={
+                "image": request.FILES.get("image")
+                or request.FILES.get("file")
+            },
+            context={"request": request},
         )
         serializer.is_valid(raise_exception=True)
-        if request.method == "POST":
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif request.method == "DELETE":
-            serializer.validated_data.delete()
-            return Response({}, status=status.HTTP_204_NO_CONTENT)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
         methods=("GET", ),
         detail=False,
         url_path="download_shopping_cart",
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PDFShoppingListRenderer,
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            MetricsJSONRenderer,
+        ),
     )
     def download_shopping_cart(self, request):
+        """
+        Отдает список покупок в формате из параметра format: pdf
+        (по умолчанию), txt, csv или json. Текстовые форматы пишутся
+        в ответ по мере чтения строк из БД, PDF кэшируется целиком.
+        """
         user = request.user
-        ingredients_list = (
-            Ingredient.objects.prefetch_related("ingredient").filter(
-                to_recipe__shoppinglist_subscribed_recipe__subscriber=user
-            ).values(
-                "ingredient",
-                name=F("ingredient__name"),
-                measurement_unit=F("ingredient__measurement_unit"),
+        file_format = request.accepted_renderer.format
+        if file_format != "pdf":
+            return stream_shopping_list(
+                iter_shopping_list(user.id), file_format
             )
-            .annotate(total_amount=Sum("amount"))
+        version = get_cart_version(user.id)
+        file = get_cached_shopping_list(user.id, version)
+        if file:
+            return send_shopping_list_file(file)
+        with read_from_primary():
+            ingredients_list = get_shopping_list(user.id)
+        return send_shopping_list_file(
+            cache_shopping_list(user.id, version, ingredients_list)
         )
-        return start_download_shopping_cart(ingredients_list)
+
+
+class MetricsView(APIView):
+    """
+    Метрики запросов процесса в текстовом формате Prometheus.
+    """
+
+    permission_classes = (MetricsPermission,)
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type=self.content_type)
@@ -1,4 +1,11 @@
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics, mixins, viewsets
+from rest_framework.response import Response
+
+from .cache import get_version, get_version_timestamp
+from .replicas import read_from_primary
 
 
 class GetAuthorSubViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
@@ -16,3 +23,49 @@ class CreateAndDestroyViewSet(generics.DestroyAPIView,
     ViewSet для создания и удаления объектов.
     Поддерживает методы POST и DELETE.
     """
+
+
+class VersionedReadOnlyModelViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet только для чтения редко меняющихся справочников.
+
+    Версия данных хранится в кэше под ключом version_key и сбрасывается
+    сигналами при изменении модели. Из версии формируются ETag и
+    Last-Modified: на совпадающий If-None-Match или If-Modified-Since
+    отдается 304 без обращения к БД. Сериализованные данные хранятся
+    в кэше процесса "reference" по версии и полному пути запроса.
+    """
+
+    version_key = None
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def versioned_response(self, method, request, *args, **kwargs):
+        version = get_version(self.version_key)
+        etag = quote_etag(version)
+        last_modified = get_version_timestamp(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            reference_cache = caches["reference"]
+            key = f"{self.version_key}:{version}:{request.get_full_path()}"
+            data = reference_cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                with read_from_primary():
+                    response = method(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                reference_cache.set(key, response.data)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
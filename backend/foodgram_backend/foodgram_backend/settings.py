@@ -30,7 +30,6 @@ THIRD_PARTY_APPS = (
     "django_filters",
     "colorfield",
     "djoser",
-    'query_counter',
     "drf_yasg",
 )
 
@@ -43,6 +42,8 @@ LOCAL_APPS = (
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = (
+    "api.middleware.MetricsMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -50,7 +51,6 @@ MIDDLEWARE = (
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "query_counter.middleware.DjangoQueryCounterMiddleware",
 )
 
 ROOT_URLCONF = "foodgram_backend.urls"
@@ -87,6 +87,50 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: хосты через запятую, для SQLite - пути к копиям базы.
+DB_REPLICAS = tuple(filter(None, os.getenv("DB_REPLICAS", default="").split(",")))
+
+DB_REPLICA_FIELD = "NAME" if DATABASES["default"]["ENGINE"].endswith("sqlite3") else "HOST"
+
+for number, replica in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        DB_REPLICA_FIELD: replica,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_REPLICAS = tuple(f"replica_{number}" for number in range(1, len(DB_REPLICAS) + 1))
+
+DATABASE_ROUTERS = ("api.replicas.ReplicaRouter",)
+
+REPLICA_STICKY_TIMEOUT = int(os.getenv("REPLICA_STICKY_TIMEOUT", default=10))
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", default="foodgram"),
+    },
+    "reference": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "reference",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# Количество воркеров в сервисе и сервисов с бэкендом. Больше одного процесса - только с общим кэшем.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", default=1))
+
+WEB_SERVICES = int(os.getenv("WEB_SERVICES", default=1))
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+MEMBERSHIP_CACHE_ALIAS = os.getenv("MEMBERSHIP_CACHE_ALIAS", default="default")
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60 * 24
+
+RECIPE_DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -105,7 +149,11 @@ AUTH_PASSWORD_VALIDATORS = [
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.MetricsJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
@@ -132,6 +180,35 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+RECIPE_IMAGE_SIZES = {"list": 480, "detail": 1200}
+
+RECIPE_IMAGE_QUALITY = 85
+
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(os.getenv("RECIPE_IMAGE_MAX_UPLOAD_SIZE", default=10 * 1024 * 1024))
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", default=2))
+
+# Сгенерированные файлы списков покупок. Каталог не раздается nginx и в docker-compose лежит в томе var_value.
+SHOPPING_LIST_CACHE_DIR = os.getenv("SHOPPING_LIST_CACHE_DIR", default=os.path.join(BASE_DIR, "var", "shopping_lists"))
+
+SHOPPING_LIST_CACHE_MAX_FILES = int(os.getenv("SHOPPING_LIST_CACHE_MAX_FILES", default=500))
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+# Поиск по вхождению в середину названия включается с этой длины строки,
+# более короткие строки ищутся только по началу названия.
+INGREDIENT_SEARCH_SUBSTRING_MIN_LENGTH = 3
+
+BULK_RECIPES_MAX_SIZE = 100
+
+RECIPE_COVERAGE_MAX_INGREDIENTS = 100
+
+METRICS_ALLOWED_IPS = tuple(filter(None, os.getenv("METRICS_ALLOWED_IPS", default="127.0.0.1").split(",")))
+
 AUTH_USER_MODEL = "users.User"
 
 DJOSER = {
@@ -6,6 +6,7 @@ from .models import (
     Ingredient,
     Recipe,
     ShoppingList,
+    ShoppingListItem,
     Tag,
 )
 
@@ -26,7 +27,7 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = "---пусто---"
 
     def get_favorites_count(self, obj):
-        return obj.favorite_subscribed_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(BaseIngredient)
@@ -47,11 +48,23 @@ class TagAdmin(admin.ModelAdmin):
         "name",
         "slug",
         "color",
+        "bit",
     )
     list_filter = ("name",)
     empty_value_display = "---пусто---"
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "ingredient",
+        "total_amount",
+    )
+    list_filter = ("user",)
+    readonly_fields = ("user", "ingredient", "total_amount")
+
+
 admin.site.register(Favorite)
 admin.site.register(Ingredient)
 admin.site.register(ShoppingList)
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+INDEX_NAME = "recipes_baseingredient_lower_name_trgm"
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Триграммный индекс по lower(name) обслуживает поиск по вхождению
+    и по началу названия. Создается только на PostgreSQL,
+    на остальных базах автодополнение использует индекс в памяти.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        "ON recipes_baseingredient USING gin (lower(name) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
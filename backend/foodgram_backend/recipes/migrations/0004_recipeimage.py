@@ -0,0 +1,30 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='recipes/image/', verbose_name='Recipe image')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Upload Date')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_images', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Uploaded Recipe Image',
+                'verbose_name_plural': 'Uploaded Recipe Images',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
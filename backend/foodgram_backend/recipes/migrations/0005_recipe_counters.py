@@ -0,0 +1,59 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ("recipes", "Recipe", "favorites_count", "Favorite", "subscribed_recipe"),
+    ("recipes", "Recipe", "in_carts_count", "ShoppingList", "subscribed_recipe"),
+    ("users", "User", "recipes_count", "Recipe", "author"),
+    ("users", "User", "followers_count", "Subscription", "author"),
+)
+RELATED_APPS = {
+    "Favorite": "recipes",
+    "ShoppingList": "recipes",
+    "Recipe": "recipes",
+    "Subscription": "users",
+}
+
+
+def fill_counters(apps, schema_editor):
+    """
+    Заполняет новые счетчики по уже существующим данным.
+    """
+    for app_label, model_name, field, related_name, related_field in COUNTERS:
+        related_model = apps.get_model(RELATED_APPS[related_name], related_name)
+        actual = Coalesce(
+            Subquery(
+                related_model.objects.filter(**{related_field: OuterRef("pk")})
+                .order_by()
+                .values(related_field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+        apps.get_model(app_label, model_name).objects.update(**{field: actual})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipeimage'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Favorites Count'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Shopping Lists Count'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Sum
+
+
+def fill_shopping_list_items(apps, schema_editor):
+    """
+    Заполняет строки списков покупок по уже существующим данным.
+    """
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
+    rows = (
+        Ingredient.objects.filter(
+            to_recipe__shoppinglist_subscribed_recipe__isnull=False
+        )
+        .values(
+            "ingredient",
+            user=F("to_recipe__shoppinglist_subscribed_recipe__subscriber"),
+        )
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row["user"],
+                ingredient_id=row["ingredient"],
+                total_amount=row["total"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0005_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveBigIntegerField(default=0, verbose_name='Total Quantity of Product')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.baseingredient', verbose_name='Product Name')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Shopping List Item',
+                'verbose_name_plural': 'Shopping List Items',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique shopping list item'),
+        ),
+        migrations.RunPython(fill_shopping_list_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,123 @@
+from django.db import migrations
+
+SEARCH_CONFIG = "pg_catalog.russian"
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('{config}', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('{config}', coalesce({row}text, '')), 'B')"
+)
+FTS_TABLE = "recipes_recipe_fts"
+
+
+def create_postgresql_index(schema_editor):
+    """
+    Колонка search_vector заполняется триггером BEFORE INSERT/UPDATE,
+    поэтому остается актуальной и при bulk_create, и при
+    queryset.update, и при изменении рецепта в обход ORM. Название
+    весит больше текста.
+    """
+    schema_editor.execute(
+        "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector"
+    )
+    schema_editor.execute(
+        "CREATE FUNCTION recipes_recipe_search_vector_update() "
+        "RETURNS trigger AS $$ BEGIN "
+        "NEW.search_vector := "
+        f"{SEARCH_VECTOR.format(config=SEARCH_CONFIG, row='NEW.')}; "
+        "RETURN NEW; END $$ LANGUAGE plpgsql"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER recipes_recipe_search_vector "
+        "BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe "
+        "FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update()"
+    )
+    schema_editor.execute(
+        "UPDATE recipes_recipe SET search_vector = "
+        f"{SEARCH_VECTOR.format(config=SEARCH_CONFIG, row='')}"
+    )
+    schema_editor.execute(
+        "CREATE INDEX recipes_recipe_search_vector_gin "
+        "ON recipes_recipe USING gin (search_vector)"
+    )
+
+
+def create_sqlite_index(schema_editor):
+    """
+    Таблица FTS5 с внешним содержимым хранит только индекс, тексты
+    берутся из recipes_recipe. Индекс поддерживается триггерами.
+    Django пересоздает таблицу SQLite при некоторых изменениях полей,
+    и триггеры при этом теряются: такую миграцию нужно дополнить
+    повторным вызовом create_sqlite_index, как в 0008_recipe_tags_mask.
+    Наличие триггеров проверяет api.tests.test_recipe_search.
+    """
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, text, content='recipes_recipe', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert "
+        "AFTER INSERT ON recipes_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, text) "
+        "VALUES (new.id, new.name, new.text); END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete "
+        "AFTER DELETE ON recipes_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update "
+        "AFTER UPDATE OF name, text ON recipes_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, text) "
+        "VALUES (new.id, new.name, new.text); END"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+    )
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Полнотекстовый индекс рецептов по названию и тексту: tsvector
+    с GIN-индексом на PostgreSQL и FTS5 на SQLite. На остальных
+    базах поиск работает через icontains.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        create_postgresql_index(schema_editor)
+    elif vendor == "sqlite":
+        create_sqlite_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "DROP TRIGGER IF EXISTS recipes_recipe_search_vector "
+            "ON recipes_recipe"
+        )
+        schema_editor.execute(
+            "DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()"
+        )
+        schema_editor.execute(
+            "ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector"
+        )
+    elif vendor == "sqlite":
+        for action in ("insert", "delete", "update"):
+            schema_editor.execute(
+                f"DROP TRIGGER IF EXISTS recipes_recipe_fts_{action}"
+            )
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0006_shoppinglistitem"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:31
+
+from importlib import import_module
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+TAG_BITS = 63
+
+
+def fill_tag_bits(apps, schema_editor):
+    """
+    Назначает существующим тегам биты по порядку id.
+    """
+    Tag = apps.get_model("recipes", "Tag")
+    tags = list(Tag.objects.order_by("pk"))
+    if len(tags) > TAG_BITS:
+        raise RuntimeError(f"Поддерживается не больше {TAG_BITS} тегов.")
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ("bit",))
+
+
+def fill_tags_masks(apps, schema_editor):
+    """
+    Заполняет маски тегов рецептов по уже существующим связям.
+    """
+    Recipe = apps.get_model("recipes", "Recipe")
+    Recipe.objects.update(
+        tags_mask=Coalesce(
+            Subquery(
+                Recipe.tags.through.objects.filter(recipe=OuterRef("pk"))
+                .order_by()
+                .values("recipe")
+                .annotate(
+                    mask=Sum(
+                        Cast(Value(1), BigIntegerField()).bitleftshift(
+                            F("tag__bit")
+                        )
+                    )
+                )
+                .values("mask")
+            ),
+            0,
+            output_field=BigIntegerField(),
+        )
+    )
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    Добавление и удаление поля пересоздает таблицу рецептов в SQLite,
+    и триггеры полнотекстового индекса из 0007 теряются.
+    """
+    if schema_editor.connection.vendor == "sqlite":
+        import_module(
+            "recipes.migrations.0007_recipe_search_index"
+        ).create_sqlite_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_search_triggers
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, validators=[django.core.validators.MaxValueValidator(62)], verbose_name='Tag Bit'),
+        ),
+        migrations.RunPython(fill_tag_bits, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Tags Mask'),
+        ),
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+TAGS_MASK_BITS = "recipes_tags_mask_bits"
+
+
+def create_tags_mask_index(apps, schema_editor):
+    """
+    На PostgreSQL маска тегов раскладывается неизменяемой функцией
+    в массив номеров битов, и по этому выражению строится GIN-индекс:
+    условия && (хотя бы один тег) и @> (все теги) по нему используют
+    индекс. SQLite не умеет индексировать такие условия, там маска
+    проверяется просмотром таблицы рецептов (одна колонка строки).
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE FUNCTION {TAGS_MASK_BITS}(mask bigint) "
+        "RETURNS integer[] AS $$ "
+        "SELECT coalesce(array_agg(bit), '{}') "
+        "FROM generate_series(0, 62) AS bit "
+        "WHERE mask & (1::bigint << bit) <> 0 "
+        "$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE"
+    )
+    schema_editor.execute(
+        "CREATE INDEX recipes_recipe_tags_mask_gin "
+        f"ON recipes_recipe USING gin ({TAGS_MASK_BITS}(tags_mask))"
+    )
+
+
+def drop_tags_mask_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP INDEX IF EXISTS recipes_recipe_tags_mask_gin"
+    )
+    schema_editor.execute(f"DROP FUNCTION IF EXISTS {TAGS_MASK_BITS}(bigint)")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0008_recipe_tags_mask"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_tags_mask_index, drop_tags_mask_index),
+    ]
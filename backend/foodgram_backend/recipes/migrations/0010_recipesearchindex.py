@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0009_recipe_tags_mask_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSearchIndex",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="recipes.recipe",
+                        verbose_name="Recipe",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Recipe Search Index",
+                "verbose_name_plural": "Recipe Search Index",
+                "db_table": "recipes_recipe_fts",
+                "managed": False,
+            },
+        ),
+    ]
@@ -1,11 +1,16 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
-from django.core.validators import MinValueValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from users.models import DenormalizedFieldsMixin
+
 User = get_user_model()
 
+TAG_BITS = 63
+
 
 class BaseIngredient(models.Model):
     name = models.CharField(
@@ -72,6 +77,13 @@ class Tag(models.Model):
         unique=True,
         verbose_name=_("Tag Color"),
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        editable=False,
+        validators=(MaxValueValidator(TAG_BITS - 1),),
+        verbose_name=_("Tag Bit"),
+    )
 
     class Meta:
         verbose_name = _("Tag")
@@ -81,8 +93,24 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.bit is None and get_free_tag_bit() is None:
+            raise ValidationError(
+                _("No more than %(count)s tags are supported."),
+                params={"count": TAG_BITS},
+            )
+
+
+def get_free_tag_bit():
+    """
+    Возвращает наименьший номер бита, не занятый тегами, или None.
+    Бит тега используется в маске тегов рецепта Recipe.tags_mask.
+    """
+    used = set(Tag.objects.values_list("bit", flat=True))
+    return next((bit for bit in range(TAG_BITS) if bit not in used), None)
 
-class Recipe(models.Model):
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -99,6 +127,12 @@ class Recipe(models.Model):
         default=None,
         verbose_name=_("Recipe image"),
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Recipe image variants"),
+    )
     text = models.TextField(
         max_length=2048,
         verbose_name=_("Recipe Discription"),
@@ -122,6 +156,23 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name=_("Publication Date"), auto_now_add=True, db_index=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Favorites Count"),
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Shopping Lists Count"),
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Tags Mask"),
+    )
+
+    denormalized_fields = ("favorites_count", "in_carts_count", "tags_mask")
 
     class Meta:
         verbose_name = _("Recipe")
@@ -132,6 +183,57 @@ class Recipe(models.Model):
         return self.name
 
 
+class RecipeSearchIndex(models.Model):
+    """
+    Таблица FTS5 полнотекстового индекса рецептов на SQLite, ее и
+    триггеры создает миграция 0007_recipe_search_index. Модель нужна
+    только для присоединения индекса к рецептам в запросах ORM
+    по rowid, на PostgreSQL таблицы нет.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_index",
+        verbose_name=_("Recipe"),
+    )
+
+    class Meta:
+        managed = False
+        db_table = "recipes_recipe_fts"
+        verbose_name = _("Recipe Search Index")
+        verbose_name_plural = _("Recipe Search Index")
+
+
+class RecipeImage(models.Model):
+    image = models.ImageField(
+        upload_to="recipes/image/",
+        verbose_name=_("Recipe image"),
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="recipe_images",
+        verbose_name=_("User"),
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name=_("Upload Date"),
+    )
+
+    class Meta:
+        verbose_name = _("Uploaded Recipe Image")
+        verbose_name_plural = _("Uploaded Recipe Images")
+        ordering = ("-created",)
+
+    def __str__(self):
+        return self.image.name
+
+
 class Favorite(models.Model):
     subscriber = models.ForeignKey(
         User,
@@ -192,3 +294,42 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f"{self.subscriber} -> {self.subscribed_recipe}"
+
+
+class ShoppingListItem(models.Model):
+    """
+    Строка агрегированного списка покупок пользователя: общее
+    количество продукта во всех рецептах из его списка покупок.
+    Поддерживается сигналами при изменении списка покупок
+    и ингредиентов рецептов, см. api.shopping_cart.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=_("User"),
+        related_name="shopping_list_items",
+    )
+    ingredient = models.ForeignKey(
+        BaseIngredient,
+        on_delete=models.CASCADE,
+        verbose_name=_("Product Name"),
+        related_name="shopping_list_items",
+    )
+    total_amount = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_("Total Quantity of Product"),
+    )
+
+    class Meta:
+        verbose_name = _("Shopping List Item")
+        verbose_name_plural = _("Shopping List Items")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique shopping list item",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.ingredient}: {self.total_amount}"
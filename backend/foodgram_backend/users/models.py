@@ -3,7 +3,33 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 
-class User(AbstractUser):
+class DenormalizedFieldsMixin:
+    """
+    Поля из denormalized_fields меняются только запросами UPDATE
+    с F(), поэтому обычное сохранение существующего объекта их
+    не записывает: иначе объект, прочитанный раньше, вернул бы
+    в БД старые значения.
+    """
+
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(DenormalizedFieldsMixin, AbstractUser):
     first_name = models.CharField(
         max_length=150,
         verbose_name=_("Name"),
@@ -20,6 +46,18 @@ class User(AbstractUser):
         default=False,
         verbose_name=_("Ban"),
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Recipes Count"),
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Followers Count"),
+    )
+
+    denormalized_fields = ("recipes_count", "followers_count")
 
     class Meta:
         ordering = ("id",)